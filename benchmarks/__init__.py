@@ -0,0 +1,3 @@
+"""
+Benchmarks for scripturient. Run them from the repository root, e.g. `python -m benchmarks.parallel`.
+"""
@@ -0,0 +1,56 @@
+"""
+Measure the cost of stage instrumentation, with no hooks and with a Recorder listening.
+
+    python -m benchmarks.instrument [--words N] [--repeat N]
+"""
+import argparse
+import tempfile
+import time
+import timeit
+
+from scripturient import instrument
+from scripturient.scrivener import ScrivenerProject
+from scripturient.vocabulary import encode_project
+from .synthetic import make_project
+
+
+def _time_encode(project_dir: str, repeat: int) -> float:
+    # Re-read the project each time so that every run parses the RTF files itself
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode_project(ScrivenerProject(project_dir))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', type=int, default=200000, help="Approximate size of the manuscript")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of each kind, of which the fastest counts")
+    args = parser.parse_args()
+
+    # What a stage costs when nothing is listening, against the bare block it wraps
+    calls = 1000000
+    bare = timeit.timeit('pass', number=calls)
+    null_stage = timeit.timeit("with stage('tokenize'): pass", globals={'stage': instrument.stage}, number=calls)
+    per_call = (null_stage - bare) / calls
+    print("stage with no hooks: {:.0f}ns a call".format(per_call * 1e9))
+
+    with tempfile.TemporaryDirectory() as project_dir:
+        make_project(project_dir, chapters=40, scenes=5, words_per_scene=args.words // 200)
+        # Load the tokenizer before timing anything
+        encode_project(ScrivenerProject(project_dir))
+
+        disabled = _time_encode(project_dir, args.repeat)
+        with instrument.Recorder() as recorder:
+            enabled = _time_encode(project_dir, args.repeat)
+        stage_calls = sum(metrics.calls for metrics in recorder.stages.values()) // args.repeat
+
+        print("no hooks: {:.2f}s, {} stages a run, costing about {:.2f}ms ({:.3f}%)".format(
+            disabled, stage_calls, stage_calls * per_call * 1e3, 100 * stage_calls * per_call / disabled))
+        print("Recorder: {:.2f}s ({:+.1f}%)".format(enabled, 100 * (enabled / disabled - 1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Compare serial and parallel tokenization of a synthetic manuscript.
+
+    python -m benchmarks.parallel [--words N] [--jobs 1,2,4,8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from scripturient.parallel import tokenize_scrivening_parallel
+from scripturient.scrivener import ScrivenerProject, tokenize_scrivening
+from .synthetic import make_project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', type=int, default=200000, help="Approximate size of the manuscript")
+    parser.add_argument('--jobs', default='1,2,4,8', help="Comma-separated worker counts to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as project_dir:
+        make_project(project_dir, chapters=40, scenes=5, words_per_scene=args.words // 200)
+
+        # Re-read the project each time so that every run parses the RTF files itself
+        start = time.perf_counter()
+        serial = tokenize_scrivening(ScrivenerProject(project_dir).scrivenings[0])
+        serial_time = time.perf_counter() - start
+        print("serial: {} tokens in {:.2f}s".format(len(serial), serial_time))
+
+        for jobs in (int(j) for j in args.jobs.split(',')):
+            start = time.perf_counter()
+            tokens = tokenize_scrivening_parallel(ScrivenerProject(project_dir).scrivenings[0], jobs)
+            elapsed = time.perf_counter() - start
+            print("jobs={}: {:.2f}s, speed-up {:.2f}x, identical: {}".format(
+                jobs, elapsed, serial_time / elapsed, tokens == serial))
+
+    print("({} CPUs available)".format(os.cpu_count()))
+
+
+if __name__ == '__main__':
+    main()
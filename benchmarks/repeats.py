@@ -0,0 +1,46 @@
+"""
+Time building the suffix array of a synthetic manuscript and finding its repeated phrases.
+
+    python -m benchmarks.repeats [--tokens N] [--min-length N] [--tokenizer NAME]
+"""
+import argparse
+import tempfile
+import time
+
+from scripturient.repeats import SuffixArray, iter_repeated_phrases
+from scripturient.scrivener import ScrivenerProject
+from scripturient.vocabulary import encode_project
+from .synthetic import make_project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=1000000, help="Approximate size of the manuscript")
+    parser.add_argument('--min-length', type=int, default=8, help="Shortest phrase to report, in tokens")
+    parser.add_argument('--tokenizer', default='regex', help="Tokenizer backend")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as project_dir:
+        # The synthetic text averages about 1.15 tokens per word
+        make_project(project_dir, chapters=40, scenes=5, words_per_scene=int(args.tokens / 1.15) // 200)
+
+        start = time.perf_counter()
+        stream = encode_project(ScrivenerProject(project_dir), tokenizer=args.tokenizer)
+        print("Tokenized {} tokens in {:.2f}s".format(len(stream), time.perf_counter() - start))
+
+    start = time.perf_counter()
+    suffix_array = SuffixArray(stream)
+    print("Built suffix and LCP arrays in {:.2f}s".format(time.perf_counter() - start))
+
+    start = time.perf_counter()
+    phrases = list(iter_repeated_phrases(suffix_array, args.min_length))
+    print("Found {} maximal repeated phrases of at least {} tokens in {:.2f}s".format(
+        len(phrases), args.min_length, time.perf_counter() - start))
+
+    phrases.sort(key=lambda phrase: (-len(phrase.tokens), -phrase.count))
+    for phrase in phrases[:5]:
+        print("  {} x{}: {}".format(len(phrase.tokens), phrase.count, " ".join(phrase.tokens)))
+
+
+if __name__ == '__main__':
+    main()
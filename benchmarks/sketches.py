@@ -0,0 +1,70 @@
+"""
+Compare approximate heavy-hitter phrase counting with exact counting over several synthetic projects, in
+memory and accuracy.
+
+    python -m benchmarks.sketches [--projects N] [--tokens N] [--k N] [--epsilon E]
+"""
+import argparse
+from collections import Counter
+import os
+import tempfile
+import time
+import tracemalloc
+
+from scripturient.ngrams import count_ngrams
+from scripturient.scrivener import ScrivenerProject
+from scripturient.sketches import HeavyHitters
+from scripturient.vocabulary import encode_project
+from .synthetic import make_project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--projects', type=int, default=4, help="Number of projects in the corpus")
+    parser.add_argument('--tokens', type=int, default=250000, help="Approximate size of each project")
+    parser.add_argument('--k', type=int, default=20, help="Number of phrases of each length to compare")
+    parser.add_argument('--epsilon', type=float, default=0.0001, help="Count-Min error bound")
+    args = parser.parse_args()
+
+    streams = []
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for seed in range(args.projects):
+            project_dir = os.path.join(corpus_dir, str(seed))
+            os.mkdir(project_dir)
+            # The synthetic text averages about 1.15 tokens per word
+            make_project(project_dir, chapters=20, scenes=5, words_per_scene=int(args.tokens / 1.15) // 100,
+                         seed=seed)
+            streams.append(encode_project(ScrivenerProject(project_dir), tokenizer='regex'))
+    print("Corpus: {} projects, {} tokens".format(len(streams), sum(len(stream) for stream in streams)))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    exact = {n: Counter() for n in range(4, 9)}
+    for stream in streams:
+        for n, counts in count_ngrams(stream, 8, 4).items():
+            exact[n].update(dict(counts.top()))
+    exact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("Exact: {:.2f}s, {:.1f} MB of counters".format(time.perf_counter() - start, exact_bytes / 2 ** 20))
+
+    # Count each project separately and merge, as separate processes would
+    start = time.perf_counter()
+    approximate = HeavyHitters(k=args.k, epsilon=args.epsilon)
+    for stream in streams:
+        counter = HeavyHitters(k=args.k, epsilon=args.epsilon)
+        counter.update(stream)
+        approximate.merge(counter)
+    print("Approximate: {:.2f}s, {:.1f} MB of sketches".format(time.perf_counter() - start,
+                                                              approximate.nbytes / 2 ** 20))
+
+    for n, hitters in approximate.top().items():
+        true_top = {phrase for phrase, _ in exact[n].most_common(args.k)}
+        recall = len(true_top & {hitter.phrase for hitter in hitters}) / max(len(true_top), 1)
+        overestimates = [hitter.count - exact[n][hitter.phrase] for hitter in hitters]
+        print("  {}-grams: top-{} recall {:.0%}, overestimate mean {:.1f} max {} (bound {})".format(
+            n, args.k, recall, sum(overestimates) / max(len(overestimates), 1), max(overestimates, default=0),
+            hitters[0].error if hitters else 0))
+
+
+if __name__ == '__main__':
+    main()
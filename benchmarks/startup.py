@@ -0,0 +1,38 @@
+"""
+Time `import scripturient.scrivener` in fresh interpreters.
+
+    python -m benchmarks.startup [--runs N]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import scripturient.scrivener
+print(time.perf_counter() - start, 'nltk' in sys.modules)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help="Number of interpreters to start")
+    args = parser.parse_args()
+
+    times = []
+    nltk_loaded = False
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', _SCRIPT], check=True, stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout.split()
+        times.append(float(output[0]))
+        nltk_loaded = nltk_loaded or output[1] == 'True'
+
+    print("import scripturient.scrivener: median {:.1f}ms, min {:.1f}ms over {} runs".format(
+        statistics.median(times) * 1000, min(times) * 1000, args.runs))
+    print("nltk imported at load time: {}".format(nltk_loaded))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Generate synthetic Scrivener projects to benchmark against.
+"""
+import os
+import random
+from xml.sax.saxutils import escape
+
+_WORDS = (
+    "the a an of and to in on at he she it they was were had said looked turned back toward away door house "
+    "room night morning light dark hand hands eyes face voice before after never always something nothing "
+    "could would should took deep breath felt heart quiet slowly quickly again still only just like over "
+    "under through into window street car road long short old young man woman girl boy city town"
+).split()
+_PHRASES = (
+    'Mr. Smith', 'Dr. Jones', 'Mrs. Brown\'s', 'the U.S. border', "can't", "won't", "it's", "I'd", "(maybe)",
+    'took a deep breath', 'let out a breath she didn\'t know she was holding', 'for a long moment', "etc.",
+)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(3, 20))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(_PHRASES))
+    sentence = " ".join(words)
+    sentence = sentence[0].upper() + sentence[1:] + rng.choice('...?!,')
+    if rng.random() < 0.2:
+        sentence = '"' + sentence + '"'
+    return sentence
+
+
+def _paragraph(rng: random.Random) -> str:
+    if rng.random() < 0.03:
+        return ''
+    return " ".join(_sentence(rng) for _ in range(rng.randint(1, 6)))
+
+
+def _rtf(paragraphs) -> str:
+    body = "\\par\n".join(p.replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}') for p in paragraphs)
+    return ("{\\rtf1\\ansi\\ansicpg1252\\cocoartf1038\\cocoasubrtf360\n"
+            "{\\fonttbl\\f0\\froman\\fcharset0 TimesNewRomanPSMT;}\n"
+            "{\\colortbl;\\red255\\green255\\blue255;}\n"
+            "\\pard\\tx560\\ql\\qnatural\\pardirnatural\n\n\\f0\\fs24 \\cf0 " + body + "}")
+
+
+def make_project(project_dir: str, chapters: int = 20, scenes: int = 5, words_per_scene: int = 2000,
+                 seed: int = 0) -> str:
+    """
+    Write a synthetic Scrivener project with a Draft folder of chapter folders, each holding scenes.
+
+    :param project_dir: Directory to create the project in.
+    :param chapters: Number of chapter folders.
+    :param scenes: Number of scenes per chapter.
+    :param words_per_scene: Approximate number of words in each scene.
+    :param seed: Random seed, so that the same arguments always produce the same project.
+    :return: The project directory.
+    """
+    rng = random.Random(seed)
+    docs_dir = os.path.join(project_dir, 'Files', 'Docs')
+    os.makedirs(docs_dir, exist_ok=True)
+
+    def write_doc(binder_id, words):
+        paragraphs = []
+        count = 0
+        while count < words:
+            paragraph = _paragraph(rng)
+            paragraphs.append(paragraph)
+            count += len(paragraph.split())
+        with open(os.path.join(docs_dir, '{}.rtf'.format(binder_id)), 'w', encoding='cp1252') as fh:
+            fh.write(_rtf(paragraphs))
+
+    def binder_item(binder_id, item_type, title, children=''):
+        return ('<BinderItem ID="{}" Type="{}"><Title>{}</Title><MetaData><IncludeInCompile>Yes'
+                '</IncludeInCompile></MetaData>{}</BinderItem>').format(
+            binder_id, item_type, escape(title), '<Children>{}</Children>'.format(children) if children else '')
+
+    next_id = 100
+    chapter_items = []
+    for chapter in range(chapters):
+        chapter_id = next_id
+        next_id += 1
+        write_doc(chapter_id, 20)
+
+        scene_items = []
+        for scene in range(scenes):
+            write_doc(next_id, words_per_scene)
+            scene_items.append(binder_item(next_id, 'Text', 'Scene {}'.format(scene + 1)))
+            next_id += 1
+        chapter_items.append(binder_item(chapter_id, 'Folder', 'Chapter {}'.format(chapter + 1),
+                                         ''.join(scene_items)))
+
+    with open(os.path.join(project_dir, 'Synthetic.scrivx'), 'w', encoding='utf-8') as fh:
+        fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<ScrivenerProject><Binder>')
+        fh.write(binder_item(0, 'Folder', 'Draft', ''.join(chapter_items)))
+        fh.write(binder_item(1, 'Folder', 'Research'))
+        fh.write('</Binder></ScrivenerProject>')
+
+    return project_dir
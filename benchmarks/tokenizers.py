@@ -0,0 +1,49 @@
+"""
+Compare tokenizer backends' throughput and their agreement with the nltk backend on a synthetic manuscript.
+
+    python -m benchmarks.tokenizers [--words N]
+"""
+import argparse
+import difflib
+import tempfile
+import time
+
+from scripturient.scrivener import ScrivenerProject, _get_scrivening_as_flat_text_list
+from scripturient.tokenizers import TOKENIZERS, get_tokenizer
+from .synthetic import make_project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', type=int, default=200000, help="Approximate size of the manuscript")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as project_dir:
+        make_project(project_dir, chapters=40, scenes=5, words_per_scene=args.words // 200)
+        paragraphs = _get_scrivening_as_flat_text_list(ScrivenerProject(project_dir).scrivenings[0])
+
+    reference = None
+    for name in sorted(TOKENIZERS, key=lambda name: name != 'nltk'):
+        tokenizer = get_tokenizer(name)
+        tokenizer.load()
+
+        start = time.perf_counter()
+        tokens = [tokenizer.tokenize(paragraph) for paragraph in paragraphs]
+        elapsed = time.perf_counter() - start
+        count = sum(len(paragraph_tokens) for paragraph_tokens in tokens)
+        print("{}: {} tokens in {:.2f}s ({:.0f} tokens/s)".format(name, count, elapsed, count / elapsed))
+
+        if reference is None:
+            reference = tokens
+            continue
+
+        identical = sum(a == b for a, b in zip(reference, tokens))
+        matched = sum(block.size for a, b in zip(reference, tokens)
+                      for block in difflib.SequenceMatcher(None, a, b, autojunk=False).get_matching_blocks())
+        total = sum(len(paragraph_tokens) for paragraph_tokens in reference)
+        print("  agreement with nltk: {:.2%} of paragraphs identical, {:.2%} of tokens matched".format(
+            identical / len(paragraphs), matched / total))
+
+
+if __name__ == '__main__':
+    main()
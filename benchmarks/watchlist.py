@@ -0,0 +1,61 @@
+"""
+Time scanning a synthetic manuscript for a large watch list of phrases, against checking phrases one at a
+time with regular expressions.
+
+    python -m benchmarks.watchlist [--words N] [--phrases N] [--regex-sample N]
+"""
+import argparse
+import random
+import re
+import tempfile
+import time
+
+from scripturient.scrivener import ScrivenerProject, _get_scrivening_as_flat_text_list
+from scripturient.vocabulary import encode_project
+from scripturient.watchlist import WatchList
+from .synthetic import _PHRASES, _WORDS, make_project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', type=int, default=1000000, help="Approximate size of the manuscript")
+    parser.add_argument('--phrases', type=int, default=10000, help="Number of phrases in the watch list")
+    parser.add_argument('--regex-sample', type=int, default=100,
+                        help="Number of phrases to time the one-regex-per-phrase approach on")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    phrases = list(_PHRASES)
+    seen = set(phrases)
+    while len(phrases) < args.phrases:
+        phrase = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 4)))
+        if phrase not in seen:
+            seen.add(phrase)
+            phrases.append(phrase)
+
+    with tempfile.TemporaryDirectory() as project_dir:
+        make_project(project_dir, chapters=40, scenes=5, words_per_scene=args.words // 200)
+        project = ScrivenerProject(project_dir)
+        stream = encode_project(project, tokenizer='regex')
+        text = "\n".join(_get_scrivening_as_flat_text_list(project.scrivenings[0]))
+
+    start = time.perf_counter()
+    watch_list = WatchList(phrases, tokenizer='regex')
+    print("Compiled {} phrases in {:.2f}s".format(len(watch_list), time.perf_counter() - start))
+
+    start = time.perf_counter()
+    hits = watch_list.scan(stream)
+    elapsed = time.perf_counter() - start
+    print("Scanned {} tokens in {:.2f}s: {} hits".format(len(stream), elapsed, len(hits)))
+
+    sample = phrases[:args.regex_sample]
+    start = time.perf_counter()
+    for phrase in sample:
+        re.findall(r'\b' + re.escape(phrase) + r'\b', text, re.IGNORECASE)
+    regex_elapsed = (time.perf_counter() - start) * len(phrases) / len(sample)
+    print("One regex per phrase: about {:.1f}s for all {} phrases ({:.0f}x slower)".format(
+        regex_elapsed, len(phrases), regex_elapsed / elapsed))
+
+
+if __name__ == '__main__':
+    main()
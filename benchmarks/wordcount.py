@@ -0,0 +1,50 @@
+"""
+Time counting the words in every scrivening of a synthetic project straight from the RTF, against parsing
+each file with Rtf15Reader and tokenizing it.
+
+    python -m benchmarks.wordcount [--documents N] [--words-per-document N] [--tokenize-sample N]
+"""
+import argparse
+import tempfile
+import time
+
+from scripturient.scrivener import ScrivenerProject, flatten_scrivenings, tokenize_scrivening
+from scripturient.wordcount import WordCounter
+from .synthetic import make_project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--documents', type=int, default=500, help="Number of scenes in the project")
+    parser.add_argument('--words-per-document', type=int, default=2000, help="Approximate size of each scene")
+    parser.add_argument('--tokenize-sample', type=int, default=20,
+                        help="Number of scenes to time the parse-and-tokenize approach on")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as project_dir:
+        make_project(project_dir, chapters=args.documents // 10, scenes=10,
+                     words_per_scene=args.words_per_document)
+        project = ScrivenerProject(project_dir)
+        scrivenings = flatten_scrivenings(project.scrivenings, True)
+
+        counter = WordCounter()
+        start = time.perf_counter()
+        counts = counter.count_project(project)
+        elapsed = time.perf_counter() - start
+        print("Counted {} words in {} scrivenings in {:.3f}s".format(sum(counts.values()), len(counts), elapsed))
+
+        start = time.perf_counter()
+        counter.count_project(project)
+        print("Counted again from the cache in {:.4f}s".format(time.perf_counter() - start))
+
+        sample = [scrivening for scrivening in scrivenings if scrivening.children == []][:args.tokenize_sample]
+        start = time.perf_counter()
+        for scrivening in sample:
+            tokenize_scrivening(scrivening, 'regex')
+        tokenize_elapsed = (time.perf_counter() - start) * len(scrivenings) / len(sample)
+        print("Parsing and tokenizing: about {:.1f}s for all {} scrivenings ({:.0f}x slower)".format(
+            tokenize_elapsed, len(scrivenings), tokenize_elapsed / elapsed))
+
+
+if __name__ == '__main__':
+    main()
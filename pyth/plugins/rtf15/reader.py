@@ -24,7 +24,8 @@ _CONTROLCHARS = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789
 _DIGITS = b'0123456789-'
 
 
-_CODEPAGES = {
+# Python codecs for the character sets that fonts name with \fcharset
+CODEPAGES = {
     0: "cp1252",   # ANSI
     1: "cp1252",   # Default (this is wrong, but there is no right)
 
@@ -65,14 +66,14 @@ _CODEPAGES = {
 }
 
 # All the ones named by number in my 2.6 encodings dir, and those listed above
-_CODEPAGES_BY_NUMBER = dict(
+CODEPAGES_BY_NUMBER = dict(
     (x, "cp%s" % x) for x in (37, 424, 437, 500, 737, 775, 850, 852, 855, 856, 
                               857, 860, 861, 862, 863, 864, 865, 866, 869, 874,
                               875, 932, 936, 949, 950, 1006, 1026, 1140, 1250, 
                               1251, 1252, 1253, 1254, 1255, 1256, 1257, 1258, 1361))
 
 # Miscellaneous, incomplete
-_CODEPAGES_BY_NUMBER.update({
+CODEPAGES_BY_NUMBER.update({
     10000: "mac-roman",
     10007: "mac-greek"
 })
@@ -483,8 +484,8 @@ class Group(object):
 
     def handle_ansicpg(self, codepage):
         codepage = int(codepage)
-        if codepage in _CODEPAGES_BY_NUMBER:
-            self.charset = self.reader.charset = _CODEPAGES_BY_NUMBER[codepage]
+        if codepage in CODEPAGES_BY_NUMBER:
+            self.charset = self.reader.charset = CODEPAGES_BY_NUMBER[codepage]
         else:
             raise ValueError("Unknown codepage %s" % codepage)
 
@@ -531,7 +532,7 @@ class Group(object):
             # Theoretically, \fN should always be before \fcharsetN
             # I don't really expect that will always be true, but let's crash
             # if it's not, and see if it happens in the real world.
-            charset = _CODEPAGES.get(int(charsetNum))
+            charset = CODEPAGES.get(int(charsetNum))
 
             if charset is None:
                 raise ValueError("Unsupported charset %s" % charsetNum)
@@ -0,0 +1,297 @@
+"""
+Command-line interface: run an analysis on a project and stream the results as JSON Lines or CSV.
+
+    python -m scripturient COMMAND PROJECT [options]
+
+Results go to standard output, or to the file given with --output. When the run finishes, its metrics are
+written to standard error as a JSON object, or to the file given with --timings: the wall and CPU time, bytes
+read and documents processed in each stage, cache hits and misses, and peak memory. --metrics also writes
+them in the Prometheus text format.
+"""
+import argparse
+import cProfile
+import json
+import math
+import os
+import re
+import sys
+from typing import Iterator, List
+
+from . import instrument
+from .echoes import DEFAULT_WINDOW, iter_echoes
+from .ngrams import top_ngrams
+from .parallel import iter_project_tokens_parallel
+from .prosestats import project_stats, subtree_stats
+from .repeats import SuffixArray, iter_repeated_phrases
+from .scrivener import ScrivenerProject, TaggedToken, get_binder_level
+from .sinks import ResultSink, iter_occurrence_rows, open_sink
+from .sketches import HeavyHitters
+from .store import STORE_FILE_NAME, AnalysisStore
+from .tokenizers import DEFAULT_TOKENIZER, TOKENIZERS, get_tokenizer
+from .vocabulary import TokenStream, encode_tokens
+
+# Approximate peak memory per token of the engines, measured on a million-word manuscript, used to keep
+# within --memory-limit
+_STREAM_BYTES_PER_TOKEN = 40
+_SUFFIX_ARRAY_BYTES_PER_TOKEN = 100
+_NGRAM_BYTES_PER_TOKEN = 30  # For each phrase length
+
+_MEMORY_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$', re.IGNORECASE)
+_MEMORY_UNITS = {'': 1, 'k': 2 ** 10, 'm': 2 ** 20, 'g': 2 ** 30, 't': 2 ** 40}
+
+
+def parse_memory(value: str) -> int:
+    """
+    Parse an amount of memory like 512M or 2G into bytes.
+    """
+    match = _MEMORY_RE.match(value)
+    if match is None:
+        raise argparse.ArgumentTypeError("Expected an amount of memory like 512M or 2G, not {}".format(value))
+    return int(float(match.group(1)) * _MEMORY_UNITS[match.group(2).lower()])
+
+
+def _iter_project_tokens(project: ScrivenerProject, args: argparse.Namespace) -> Iterator[TaggedToken]:
+    """
+    Tokenize a project in compile order, with a pool of args.jobs worker processes.
+    """
+    return iter_project_tokens_parallel(project, args.jobs, tokenizer=args.tokenizer)
+
+
+def _encode(project: ScrivenerProject, args: argparse.Namespace) -> TokenStream:
+    with instrument.stage('encode'):
+        stream = encode_tokens(_iter_project_tokens(project, args))
+        if args.fold_case:
+            stream = stream.folded()
+    return stream
+
+
+def _check_memory(args: argparse.Namespace, tokens: int, bytes_per_token: int, what: str):
+    if args.memory_limit is not None and tokens * bytes_per_token > args.memory_limit:
+        raise ValueError("{} needs about {} MiB for {} tokens, which is over the memory limit of {} MiB".format(
+            what, tokens * bytes_per_token >> 20, tokens, args.memory_limit >> 20))
+
+
+def _run_tokens(project: ScrivenerProject, args: argparse.Namespace, sink: ResultSink):
+    # Tokens are written as they're produced, so this takes the same memory however long the project is
+    with instrument.stage('write_tokens'):
+        sink.write_many(_iter_project_tokens(project, args))
+
+
+def _run_ngrams(project: ScrivenerProject, args: argparse.Namespace, sink: ResultSink):
+    if args.cache_dir is not None:
+        # Counts are kept per scrivening in the store, and only changed scrivenings are counted again. They're
+        # counted a scrivening at a time and added up by SQLite, which sorts on disk what doesn't fit in its cache.
+        cache_size = None if args.memory_limit is None else args.memory_limit // 2
+        with instrument.stage('count'):
+            with AnalysisStore(os.path.join(args.cache_dir, STORE_FILE_NAME), cache_size) as store:
+                store.update(project, args.max_n, args.min_n, args.words_only, args.fold_case,
+                             tokenizer=args.tokenizer)
+                results = [(n, store.top_phrases(project.project_dir, n, k=args.top))
+                           for n in range(args.min_n, args.max_n + 1)]
+        with instrument.stage('write'):
+            for n, phrases in results:
+                sink.write_many({'n': n, 'phrase': text, 'count': count} for text, count in phrases)
+        return
+
+    stream = _encode(project, args)
+    lengths = args.max_n - args.min_n + 1
+    if args.memory_limit is not None and len(stream) * _NGRAM_BYTES_PER_TOKEN * lengths > args.memory_limit:
+        # Count in fixed memory instead, with a sketch sized to fit in what's left
+        budget = max(args.memory_limit - len(stream) * _STREAM_BYTES_PER_TOKEN, 1 << 20)
+        depth = math.ceil(math.log(1 / 0.01))
+        epsilon = max(math.e * depth * 8 * lengths / budget, 1e-6)
+        with instrument.stage('count'):
+            counter = HeavyHitters(args.top, args.min_n, args.max_n, epsilon=epsilon, delta=0.01,
+                                   words_only=args.words_only)
+            counter.update(stream)
+            results = counter.top()
+        with instrument.stage('write'):
+            for n, hitters in results.items():
+                sink.write_many({'n': n, 'phrase': ' '.join(hitter.phrase), 'count': hitter.count,
+                                 'error': hitter.error} for hitter in hitters)
+        return
+
+    with instrument.stage('count'):
+        results = top_ngrams(stream, args.max_n, args.top, args.min_n, words_only=args.words_only)
+    with instrument.stage('write'):
+        for n, phrases in results.items():
+            sink.write_many({'n': n, 'phrase': ' '.join(phrase), 'count': count} for phrase, count in phrases)
+
+
+def _run_repeats(project: ScrivenerProject, args: argparse.Namespace, sink: ResultSink):
+    stream = _encode(project, args)
+    _check_memory(args, len(stream), _SUFFIX_ARRAY_BYTES_PER_TOKEN, "Finding repeated phrases")
+    with instrument.stage('suffix_array'):
+        suffix_array = SuffixArray(stream)
+    with instrument.stage('find'):
+        phrases = iter_repeated_phrases(suffix_array, args.min_length, args.min_count)
+        sink.write_many(iter_occurrence_rows(phrases) if args.occurrences else phrases)
+
+
+def _run_echoes(project: ScrivenerProject, args: argparse.Namespace, sink: ResultSink):
+    stream = _encode(project, args)
+    with instrument.stage('find'):
+        sink.write_many(iter_echoes(stream, args.window, args.min_length, args.max_length,
+                                    cross_scrivenings=args.cross_scrivenings))
+
+
+def _run_stats(project: ScrivenerProject, args: argparse.Namespace, sink: ResultSink):
+    with instrument.stage('stats'):
+        if args.depth is None:
+            rows = [dict(scrivening_id=None, title=None, **project_stats(project, args.tokenizer).summary())]
+        else:
+            rows = [dict(scrivening_id=node.id, title=node.title, **subtree_stats(node, args.tokenizer).summary())
+                    for node in get_binder_level(project.scrivenings, args.depth)]
+    with instrument.stage('write'):
+        sink.write_many(rows)
+
+
+COMMANDS = {
+    'tokens': _run_tokens,
+    'ngrams': _run_ngrams,
+    'repeats': _run_repeats,
+    'echoes': _run_echoes,
+    'stats': _run_stats,
+}
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("Expected a whole number of at least 1, not {}".format(value))
+    return number
+
+
+def _non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("Expected a whole number of at least 0, not {}".format(value))
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('project', help="The Scrivener project directory")
+    common.add_argument('--output', '-o', default='-',
+                        help="File to write the results to: .csv for CSV, anything else for JSON Lines, and a "
+                             "further .gz to compress it. Defaults to JSON Lines on standard output")
+    common.add_argument('--append', action='store_true', help="Add to the end of the output file")
+    common.add_argument('--tokenizer', choices=sorted(TOKENIZERS), default=DEFAULT_TOKENIZER,
+                        help="Tokenizer backend")
+    common.add_argument('--case-sensitive', dest='fold_case', action='store_false',
+                        help="Tell apart words that differ only in case")
+    common.add_argument('--jobs', '-j', type=_positive_int, default=1,
+                        help="Number of processes to tokenize with")
+    common.add_argument('--memory-limit', type=parse_memory,
+                        help="Approximate memory to stay within, like 512M or 2G. N-grams are counted "
+                             "approximately in fixed memory if counting them exactly would need more, or with "
+                             "--cache-dir in a database that spills to disk. Finding repeated phrases fails "
+                             "with an error if it would need more")
+    common.add_argument('--profile', metavar='PATH',
+                        help="Profile the run with cProfile and save the statistics to PATH for pstats")
+    common.add_argument('--timings', metavar='PATH',
+                        help="File to write the run's metrics to as JSON. Defaults to standard error")
+    common.add_argument('--metrics', metavar='PATH',
+                        help="File to also write the run's metrics to in the Prometheus text format")
+
+    parser = argparse.ArgumentParser(prog='python -m scripturient', description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    subparsers.add_parser('tokens', parents=[common], help="Every token with its location")
+
+    ngrams = subparsers.add_parser('ngrams', parents=[common], help="The most frequent n-grams of each length")
+    ngrams.add_argument('--min-n', type=_positive_int, default=1, help="Length of the shortest n-grams")
+    ngrams.add_argument('--max-n', type=_positive_int, default=3, help="Length of the longest n-grams")
+    ngrams.add_argument('--top', '-k', type=_positive_int, default=20, help="Number of n-grams of each length")
+    ngrams.add_argument('--include-punctuation', dest='words_only', action='store_false',
+                        help="Let n-grams include punctuation")
+    ngrams.add_argument('--cache-dir',
+                        help="Directory to keep counts in between runs, so that n-grams are only counted again "
+                             "in scrivenings that have changed")
+
+    repeats = subparsers.add_parser('repeats', parents=[common], help="Every maximal repeated phrase")
+    repeats.add_argument('--min-length', type=_positive_int, default=4, help="Shortest phrase, in tokens")
+    repeats.add_argument('--min-count', type=_positive_int, default=2, help="Fewest occurrences")
+    repeats.add_argument('--occurrences', action='store_true',
+                         help="Write a row for each occurrence rather than each phrase")
+
+    echoes = subparsers.add_parser('echoes', parents=[common],
+                                   help="Words and phrases that appear again soon after they were used")
+    echoes.add_argument('--window', type=_positive_int, default=DEFAULT_WINDOW,
+                        help="Largest distance in words that counts as an echo")
+    echoes.add_argument('--min-length', type=_positive_int, default=1, help="Shortest phrase, in words")
+    echoes.add_argument('--max-length', type=_positive_int, default=1, help="Longest phrase, in words")
+    echoes.add_argument('--cross-scrivenings', action='store_true',
+                        help="Let a phrase echo one in the previous scrivening")
+
+    stats = subparsers.add_parser('stats', parents=[common], help="Prose statistics and readability")
+    stats.add_argument('--depth', type=_non_negative_int,
+                       help="Report each binder node at this depth, 0 being the top level, rather than the "
+                            "whole project")
+    return parser
+
+
+def run(args: argparse.Namespace) -> dict:
+    """
+    Run a command, recording its metrics.
+
+    :param args: The parsed command line.
+    :return: The metrics report as a dictionary, along with the command, project and number of rows written.
+    """
+    if getattr(args, 'cache_dir', None) is not None:
+        os.makedirs(args.cache_dir, exist_ok=True)
+
+    with instrument.Recorder() as recorder:
+        # Load the tokenizer's models up front, so that the time isn't counted against the first stage to use it
+        with instrument.stage('load_tokenizer'):
+            get_tokenizer(args.tokenizer).load()
+        project = ScrivenerProject(args.project)
+
+        with open_sink(args.output, args.append) as sink:
+            COMMANDS[args.command](project, args, sink)
+
+    report = recorder.report()
+    if args.metrics is not None:
+        report.write_prometheus(args.metrics, {'command': args.command})
+    result = report.to_dict()
+    result.update(command=args.command, project=os.path.abspath(args.project), rows=sink.rows)
+    return result
+
+
+def main(argv: List[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'min_n', 1) > getattr(args, 'max_n', 1):
+        parser.error("--min-n can't be more than --max-n")
+    if getattr(args, 'min_length', 1) > getattr(args, 'max_length', math.inf):
+        parser.error("--min-length can't be more than --max-length")
+
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            report = run(args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+    except BrokenPipeError:
+        # The reader, like head, stopped early
+        return 0
+    except (OSError, ValueError) as e:
+        print("error: {}".format(e), file=sys.stderr)
+        return 1
+    except Exception as e:
+        # Such as a binder or RTF file that doesn't parse
+        print("error: {}: {}".format(type(e).__name__, e), file=sys.stderr)
+        return 1
+
+    text = json.dumps(report)
+    if args.timings is None:
+        print(text, file=sys.stderr)
+    else:
+        with open(args.timings, 'w', encoding='utf-8') as fh:
+            fh.write(text + '\n')
+    return 0
@@ -0,0 +1,236 @@
+"""
+Score collocations in token streams with NumPy.
+
+Every candidate bigram or trigram is counted at once, and each association measure is computed for all of
+them from their contingency tables in a handful of array operations. The measures are the same as nltk's
+BigramAssocMeasures and TrigramAssocMeasures.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from .ngrams import excluded_ids, iter_ngram_keys
+from .scrivener import Scrivening
+from .vocabulary import TokenStream, Vocabulary
+
+MEASURES = ('pmi', 'likelihood_ratio', 'student_t', 'chi_sq')
+
+# Keeps logarithms and divisions finite when a contingency table cell is empty
+_SMALL = 1e-20
+
+
+class Collocations(object):
+    """
+    Candidate collocations of one length and their association scores.
+    """
+    def __init__(self, vocabulary: Vocabulary, ngrams: np.ndarray, counts: np.ndarray,
+                 scores: Dict[str, np.ndarray]):
+        """
+        :param vocabulary: Vocabulary the token IDs come from.
+        :param ngrams: Array of token IDs with one row per candidate.
+        :param counts: Number of times each candidate occurs.
+        :param scores: Array of each candidate's scores keyed by measure name.
+        """
+        self.vocabulary = vocabulary
+        self.ngrams = ngrams
+        self.counts = counts
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.counts)
+
+    def top(self, measure: str = 'likelihood_ratio', k: int = 20) -> List[Tuple[Tuple[str, ...], float]]:
+        """
+        Get the highest-scoring collocations.
+
+        :param measure: Name of the measure to rank by, from MEASURES.
+        :param k: Number of collocations to get.
+        :return: List of (collocation, score) tuples, best first. Ties go to the more frequent collocation.
+        """
+        try:
+            scores = self.scores[measure]
+        except KeyError:
+            raise ValueError("Unknown measure {}; expected one of {}".format(measure, ", ".join(MEASURES))) \
+                from None
+        order = np.lexsort((-self.counts, -scores))[:k]
+        decode = self.vocabulary.decode
+        return [(tuple(decode(self.ngrams[index])), float(scores[index])) for index in order.tolist()]
+
+
+def _contingency_scores(observed: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Compute the likelihood ratio and chi-square of a stack of 2x2 or 2x2x2 contingency tables.
+
+    :param observed: Array with one contingency table per candidate. Index 0 of each axis means the word in
+    that position is present and index 1 that it's absent.
+    """
+    dimensions = observed.ndim - 1
+    total = observed.sum(axis=tuple(range(1, dimensions + 1)))
+    expected = np.ones_like(observed)
+    for axis in range(1, dimensions + 1):
+        other_axes = tuple(other for other in range(1, dimensions + 1) if other != axis)
+        marginal = observed.sum(axis=other_axes, keepdims=True)
+        expected = expected * marginal
+    expected /= total.reshape((-1,) + (1,) * dimensions) ** (dimensions - 1)
+
+    cell_axes = tuple(range(1, dimensions + 1))
+    likelihood = np.where(observed > 0, observed * np.log(observed / (expected + _SMALL) + _SMALL), 0)
+    chi_sq = (observed - expected) ** 2 / (expected + _SMALL)
+    return {'likelihood_ratio': 2 * likelihood.sum(axis=cell_axes), 'chi_sq': chi_sq.sum(axis=cell_axes)}
+
+
+def _word_counts(stream: TokenStream, excluded: np.ndarray) -> Tuple[np.ndarray, int]:
+    ids = stream.ids[~excluded[stream.ids]] if len(excluded) else stream.ids
+    return np.bincount(ids, minlength=len(stream.vocabulary)).astype(np.float64), len(ids)
+
+
+def _pair_counts(stream: TokenStream, excluded: np.ndarray, distances: Iterable[int]) -> \
+        Tuple[np.ndarray, np.ndarray]:
+    """
+    Count pairs of tokens the given distances apart in the same scrivening, neither of them excluded.
+
+    :return: Tuple of the pairs' unique keys, first token ID * vocabulary size + second token ID, and counts.
+    """
+    ids = stream.ids.astype(np.int64)
+    valid = ~excluded[stream.ids] if len(excluded) else np.ones(len(ids), dtype=bool)
+    scrivening_index = stream.scrivening_index()
+    vocabulary_size = max(len(stream.vocabulary), 1)
+
+    keys = []
+    for distance in distances:
+        if distance >= len(ids):
+            break
+        pair_valid = valid[:-distance] & valid[distance:] & \
+            (scrivening_index[:-distance] == scrivening_index[distance:])
+        keys.append(ids[:-distance][pair_valid] * vocabulary_size + ids[distance:][pair_valid])
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(keys), return_counts=True)
+
+
+def _lookup(keys: np.ndarray, counts: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    # Count of each query key, or 0 if it isn't in keys
+    index = np.minimum(np.searchsorted(keys, queries), max(len(keys) - 1, 0))
+    found = keys[index] == queries if len(keys) else np.zeros(len(queries), dtype=bool)
+    return np.where(found, counts[index] if len(keys) else 0, 0)
+
+
+def score_bigrams(stream: TokenStream, window: int = 2, min_count: int = 1, min_word_count: int = 1,
+                  exclude: Iterable[str] = None, words_only: bool = False) -> Collocations:
+    """
+    Score every pair of words that occur within a window of each other.
+
+    As in nltk's BigramCollocationFinder, pair counts are divided by window - 1 before scoring so that
+    larger windows don't inflate them.
+
+    :param stream: The token stream. Case-fold it first to count "The end" and "the end" together.
+    :param window: Size of the window in tokens. 2 only pairs adjacent tokens.
+    :param min_count: Leave out pairs that occur fewer times than this.
+    :param min_word_count: Leave out pairs with a word that occurs fewer times than this.
+    :param exclude: Tokens that can't be part of a pair.
+    :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of a pair.
+    :return: The scored pairs.
+    """
+    if window < 2:
+        raise ValueError("The window must be at least 2 tokens, not {}".format(window))
+
+    excluded = excluded_ids(stream.vocabulary, exclude, words_only)
+    word_counts, total = _word_counts(stream, excluded)
+    keys, counts = _pair_counts(stream, excluded, range(1, window))
+
+    vocabulary_size = max(len(stream.vocabulary), 1)
+    first, second = keys // vocabulary_size, keys % vocabulary_size
+    selected = (counts >= min_count) & (word_counts[first] >= min_word_count) & \
+        (word_counts[second] >= min_word_count)
+    first, second, counts = first[selected], second[selected], counts[selected]
+
+    n_ii = counts / (window - 1)
+    n_ix = word_counts[first]
+    n_xi = word_counts[second]
+    n_io = np.maximum(n_ix - n_ii, 0)
+    n_oi = np.maximum(n_xi - n_ii, 0)
+    n_oo = np.maximum(total - n_ii - n_io - n_oi, 0)
+    observed = np.stack((np.stack((n_ii, n_io), axis=1), np.stack((n_oi, n_oo), axis=1)), axis=1)
+
+    scores = _contingency_scores(observed)
+    scores['pmi'] = np.log2(n_ii * total + _SMALL) - np.log2(n_ix * n_xi + _SMALL)
+    scores['student_t'] = (n_ii - n_ix * n_xi / max(total, 1)) / np.sqrt(n_ii + _SMALL)
+
+    ngrams = np.stack((first, second), axis=1).astype(np.uint32)
+    return Collocations(stream.vocabulary, ngrams, counts.astype(np.int64), scores)
+
+
+def score_trigrams(stream: TokenStream, min_count: int = 1, min_word_count: int = 1,
+                   exclude: Iterable[str] = None, words_only: bool = False) -> Collocations:
+    """
+    Score every run of three words.
+
+    :param stream: The token stream. Case-fold it first to count "The end" and "the end" together.
+    :param min_count: Leave out trigrams that occur fewer times than this.
+    :param min_word_count: Leave out trigrams with a word that occurs fewer times than this.
+    :param exclude: Tokens that can't be part of a trigram.
+    :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of a
+    trigram.
+    :return: The scored trigrams.
+    """
+    excluded = excluded_ids(stream.vocabulary, exclude, words_only)
+    word_counts, total = _word_counts(stream, excluded)
+    vocabulary_size = max(len(stream.vocabulary), 1)
+
+    trigram_counts = positions = None
+    for _, _, counts, first in iter_ngram_keys(stream, 3, 3, excluded):
+        trigram_counts, positions = counts, first
+    if trigram_counts is None:
+        trigram_counts = positions = np.zeros(0, dtype=np.int64)
+
+    ids = stream.ids.astype(np.int64)
+    w1, w2, w3 = ids[positions], ids[positions + 1], ids[positions + 2]
+    selected = (trigram_counts >= min_count) & (word_counts[w1] >= min_word_count) & \
+        (word_counts[w2] >= min_word_count) & (word_counts[w3] >= min_word_count)
+    w1, w2, w3, trigram_counts = w1[selected], w2[selected], w3[selected], trigram_counts[selected]
+
+    # Marginal counts of each trigram's pairs: adjacent pairs, and pairs with one token between them
+    adjacent_keys, adjacent_counts = _pair_counts(stream, excluded, (1,))
+    gapped_keys, gapped_counts = _pair_counts(stream, excluded, (2,))
+    n_iii = trigram_counts.astype(np.float64)
+    n_iix = _lookup(adjacent_keys, adjacent_counts, w1 * vocabulary_size + w2).astype(np.float64)
+    n_xii = _lookup(adjacent_keys, adjacent_counts, w2 * vocabulary_size + w3).astype(np.float64)
+    n_ixi = _lookup(gapped_keys, gapped_counts, w1 * vocabulary_size + w3).astype(np.float64)
+    n_ixx, n_xix, n_xxi = word_counts[w1], word_counts[w2], word_counts[w3]
+
+    n_oii = n_xii - n_iii
+    n_ioi = n_ixi - n_iii
+    n_iio = n_iix - n_iii
+    n_ooi = n_xxi - n_iii - n_oii - n_ioi
+    n_oio = n_xix - n_iii - n_oii - n_iio
+    n_ioo = n_ixx - n_iii - n_ioi - n_iio
+    n_ooo = total - n_iii - n_oii - n_ioi - n_iio - n_ooi - n_oio - n_ioo
+    cells = [np.maximum(cell, 0) for cell in (n_iii, n_iio, n_ioi, n_ioo, n_oii, n_oio, n_ooi, n_ooo)]
+    observed = np.stack(cells, axis=1).reshape(-1, 2, 2, 2)
+
+    scores = _contingency_scores(observed)
+    scores['pmi'] = np.log2(n_iii * total ** 2 + _SMALL) - np.log2(n_ixx * n_xix * n_xxi + _SMALL)
+    scores['student_t'] = (n_iii - n_ixx * n_xix * n_xxi / max(total, 1) ** 2) / np.sqrt(n_iii + _SMALL)
+
+    ngrams = np.stack((w1, w2, w3), axis=1).astype(np.uint32)
+    return Collocations(stream.vocabulary, ngrams, trigram_counts.astype(np.int64), scores)
+
+
+def score_by_binder_node(stream: TokenStream, nodes: Iterable[Scrivening], n: int = 2, **kwargs) -> \
+        List[Tuple[Scrivening, Collocations]]:
+    """
+    Score collocations separately in each of several parts of the manuscript, such as each chapter.
+
+    Each part is scored against its own word counts, so a collocation that's typical of one chapter ranks
+    highly there even if it's rare in the book as a whole.
+
+    :param stream: Token stream of the whole project or of a scrivening that contains the nodes.
+    :param nodes: Scrivenings to score, each along with its children, such as from get_binder_level.
+    :param n: 2 to score bigrams or 3 to score trigrams.
+    :param kwargs: Other arguments to score_bigrams or score_trigrams.
+    :return: List of (scrivening, collocations) tuples.
+    """
+    if n not in (2, 3):
+        raise ValueError("Can only score collocations of 2 or 3 words, not {}".format(n))
+    score = score_bigrams if n == 2 else score_trigrams
+    return [(node, score(stream.subtree(node), **kwargs)) for node in nodes]
@@ -0,0 +1,166 @@
+"""
+Keyword-in-context concordances: every occurrence of a word or phrase, with the text around it.
+
+Occurrences are found in a token stream, and the keyword and its context are sliced out of the scrivenings'
+paragraphs using the tokens' stored character offsets, so nothing is tokenized again.
+"""
+from collections import namedtuple
+from typing import Iterator, List, Sequence, Union
+
+import numpy as np
+
+from .scrivener import ScrivenerProject, flatten_scrivenings
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import Location, TokenStream, encode_project
+
+ConcordanceLine = namedtuple('ConcordanceLine', ['left', 'keyword', 'right', 'location'])
+ConcordanceLine.__doc__ = """
+One occurrence of a keyword: the text before it, the keyword as it appears in the text, the text after
+it, and the keyword's location. The context doesn't include the whitespace next to the keyword.
+"""
+
+
+class Concordance(object):
+    """
+    Finds occurrences of words and phrases in a project and shows them in context.
+    """
+    def __init__(self, project: ScrivenerProject, stream: TokenStream = None,
+                 tokenizer: Union[str, Tokenizer] = None, fold_case: bool = True):
+        """
+        :param project: The project.
+        :param stream: The project's token stream, if it's already been encoded. Otherwise the project is
+        encoded and its text is kept in memory, so that lines can be generated without reading any files.
+        :param tokenizer: Tokenizer backend or its name, used to encode the project and to split phrases into
+        tokens. It should be the backend the stream was encoded with. Defaults to the nltk backend.
+        :param fold_case: If True, ignore case when matching.
+        """
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.fold_case = fold_case
+        self._scrivenings = {scrivening.id: scrivening
+                             for scrivening in flatten_scrivenings(project.scrivenings, True)}
+        if stream is None:
+            # Loading each scrivening's text first caches it, and encoding reuses the cached text
+            for scrivening in self._scrivenings.values():
+                self._text(scrivening.id)
+            stream = encode_project(project, tokenizer=self.tokenizer)
+        self.stream = stream
+        self._matched = stream.folded() if fold_case else stream
+
+        # Label each position with its paragraph, numbered through the whole stream
+        new_paragraph = np.ones(len(stream), dtype=bool)
+        new_paragraph[1:] = stream.paragraphs[1:] != stream.paragraphs[:-1]
+        new_paragraph[stream.offsets[:-1]] = True
+        self._paragraph_labels = np.cumsum(new_paragraph) - 1
+        paragraph_starts = np.flatnonzero(new_paragraph)
+        self._paragraph_starts = paragraph_starts
+        self._paragraph_ends = np.append(paragraph_starts[1:], len(stream))
+
+    def _text(self, scrivening_id) -> List[str]:
+        try:
+            return self._scrivenings[scrivening_id].text()
+        except FileNotFoundError:
+            return []
+
+    def _encode_phrase(self, phrase: Union[str, Sequence[str]]) -> List[int]:
+        tokens = self.tokenizer.tokenize(phrase) if isinstance(phrase, str) else list(phrase)
+        if self.fold_case:
+            tokens = [token.casefold() for token in tokens]
+        return [self._matched.vocabulary.get(token) for token in tokens]
+
+    def find(self, phrase: Union[str, Sequence[str]]) -> np.ndarray:
+        """
+        Find where a phrase occurs. Occurrences that run from one paragraph into the next aren't found.
+
+        :param phrase: The phrase, either as text to tokenize or as a sequence of tokens.
+        :return: Array of the stream positions where the phrase starts.
+        """
+        ids = self._encode_phrase(phrase)
+        if not ids or None in ids or len(ids) > len(self.stream):
+            return np.zeros(0, dtype=np.int64)
+
+        stream_ids = self._matched.ids
+        starts = np.flatnonzero(stream_ids[:len(stream_ids) - len(ids) + 1] == ids[0])
+        for offset, token_id in enumerate(ids[1:], 1):
+            starts = starts[stream_ids[starts + offset] == token_id]
+        labels = self._paragraph_labels
+        return starts[labels[starts] == labels[starts + len(ids) - 1]]
+
+    def lines(self, phrase: Union[str, Sequence[str]], width: int = 5) -> Iterator[ConcordanceLine]:
+        """
+        Show every occurrence of a phrase in context.
+
+        :param phrase: The phrase, either as text to tokenize or as a sequence of tokens.
+        :param width: Number of tokens of context on each side. The context stops at the edges of the
+        keyword's paragraph.
+        :return: Iterator of concordance lines in compile order.
+        """
+        length = len(self._encode_phrase(phrase))
+        return self.lines_at(self.find(phrase), length, width)
+
+    def lines_at(self, starts: np.ndarray, length: int, width: int = 5) -> Iterator[ConcordanceLine]:
+        """
+        Show the text at given stream positions in context, such as the occurrences of a repeated phrase.
+
+        :param starts: Stream positions where the keywords start. Each keyword must be within one paragraph.
+        :param length: Number of tokens in each keyword.
+        :param width: Number of tokens of context on each side, stopping at the edges of the paragraph.
+        :return: Iterator of concordance lines, one per position.
+        """
+        if width < 0:
+            raise ValueError("The context width can't be negative: {}".format(width))
+        starts = np.asarray(starts, dtype=np.int64)
+        if length < 1:
+            starts = starts[:0]
+        return self._iter_lines(starts, starts + length, width)
+
+    def _iter_lines(self, starts: np.ndarray, ends: np.ndarray, width: int) -> Iterator[ConcordanceLine]:
+        # Work out every line's token bounds up front, then slice the text one line at a time
+        stream = self.stream
+        labels = self._paragraph_labels[starts]
+        lefts = np.maximum(starts - width, self._paragraph_starts[labels])
+        rights = np.minimum(ends + width, self._paragraph_ends[labels])
+        scrivening_index = stream.scrivening_index()[starts]
+
+        token_starts, token_ends = stream.starts, stream.ends
+        current_index, paragraphs = None, []  # type: object, List[str]
+        for index, left, start, end, right in zip(scrivening_index.tolist(), lefts.tolist(), starts.tolist(),
+                                                  ends.tolist(), rights.tolist()):
+            scrivening_id = stream.scrivening_ids[index]
+            if index != current_index:
+                current_index, paragraphs = index, self._text(scrivening_id)
+            paragraph = int(stream.paragraphs[start])
+            text = paragraphs[paragraph] if paragraph < len(paragraphs) else ''
+
+            keyword_start, keyword_end = int(token_starts[start]), int(token_ends[end - 1])
+            left_text = text[token_starts[left]:token_ends[start - 1]] if left < start else ''
+            right_text = text[token_starts[end]:token_ends[right - 1]] if right > end else ''
+            yield ConcordanceLine(left_text, text[keyword_start:keyword_end], right_text,
+                                  Location(scrivening_id, paragraph, keyword_start, keyword_end))
+
+
+def format_lines(lines: Iterator[ConcordanceLine], chars: int = 40) -> Iterator[str]:
+    """
+    Lay out concordance lines in the traditional way, with the keywords lined up in a column.
+
+    :param lines: The concordance lines.
+    :param chars: Number of characters of context to show on each side.
+    :return: Iterator of formatted lines.
+    """
+    for line in lines:
+        yield "{} {} {}".format(line.left[-chars:].rjust(chars), line.keyword, line.right[:chars])
+
+
+def concordance(project: ScrivenerProject, phrase: Union[str, Sequence[str]], width: int = 5,
+                tokenizer: Union[str, Tokenizer] = None, fold_case: bool = True) -> Iterator[ConcordanceLine]:
+    """
+    Show every occurrence of a phrase in a project in context. To look up several phrases, build a
+    Concordance once instead.
+
+    :param project: The project.
+    :param phrase: The phrase, either as text to tokenize or as a sequence of tokens.
+    :param width: Number of tokens of context on each side.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :param fold_case: If True, ignore case when matching.
+    :return: Iterator of concordance lines in compile order.
+    """
+    return Concordance(project, tokenizer=tokenizer, fold_case=fold_case).lines(phrase, width)
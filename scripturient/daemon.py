@@ -0,0 +1,482 @@
+"""
+A long-running analysis server that keeps projects loaded, so that queries don't pay for importing nltk,
+parsing the binder and reading every RTF file each time.
+
+The server holds each project it's asked about along with its scrivenings' text, its phrase index and
+per-scrivening token streams, and a background thread re-reads scrivenings whose files change. Clients
+connect over a Unix domain socket, or over TCP on localhost, and send requests as JSON Lines: one JSON object
+per line, each answered by one line. A request names a command and its arguments:
+
+    {"command": "count", "project": "/path/to/Novel.scriv", "phrase": "took a deep breath"}
+
+and the response is either {"ok": true, "result": ...} or {"ok": false, "error": "..."}. Use DaemonClient to
+talk to a server from Python.
+"""
+import inspect
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from typing import Dict, List, Tuple, Union
+
+from .echoes import DEFAULT_WINDOW, iter_echoes
+from .index import PhraseIndex, index_path, open_index
+from .prosestats import project_stats, subtree_stats
+from .scrivener import Scrivening, ScrivenerProject, flatten_scrivenings, scrivening_mtime
+from .sinks import as_dict
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import TokenStream, encode_scrivening
+
+# Seconds between checks for changed files
+DEFAULT_REFRESH_INTERVAL = 2.0
+
+# Longest request line the server reads, in bytes
+_MAX_REQUEST_SIZE = 1 << 20
+
+
+class DaemonError(Exception):
+    """
+    A request that the server couldn't answer. The message is the server's error.
+    """
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """
+    Parse a server address: host:port or :port for TCP, or otherwise the path of a Unix domain socket.
+
+    :param address: The address.
+    :return: A (host, port) tuple for TCP, or the socket path.
+    """
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit() and '/' not in address:
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+class _LoadedProject(object):
+    """
+    A project held in memory, with its phrase index and the token streams of its scrivenings.
+    """
+    def __init__(self, project_dir: str, tokenizer: Tokenizer, fold_case: bool, index_dir: str):
+        self.project_dir = project_dir
+        self.tokenizer = tokenizer
+        self.fold_case = fold_case
+        self.index_path = index_path(index_dir, project_dir) if index_dir is not None else None
+        # Held while the project is queried or refreshed
+        self.lock = threading.RLock()
+        self.project = None  # type: ScrivenerProject
+        self.index = None  # type: PhraseIndex
+        self.changed = False
+        self._project_mtime = None
+        self._mtimes = {}  # type: Dict[str, int]
+        self._scrivenings = {}  # type: Dict[str, Scrivening]
+        self._streams = {}  # type: Dict[str, TokenStream]
+        self._load()
+
+    def _load(self):
+        self.project = ScrivenerProject(self.project_dir)
+        self._project_mtime = os.stat(self.project.project_file).st_mtime_ns
+        scrivenings = flatten_scrivenings(self.project.scrivenings, True)
+        self._scrivenings = {str(scrivening.id): scrivening for scrivening in scrivenings}
+        self._mtimes = {str(scrivening.id): scrivening_mtime(scrivening) for scrivening in scrivenings}
+        self._streams = {}
+        # Loading each scrivening's text caches it, and indexing and encoding reuse the cached text
+        for scrivening in scrivenings:
+            self._preload(scrivening)
+        if self.index is None:
+            if self.index_path is not None:
+                self.index = open_index(self.project, self.index_path, self.tokenizer, self.fold_case)
+            else:
+                self.index = PhraseIndex(self.tokenizer, self.fold_case)
+                self.index.update(self.project)
+        elif self.index.update(self.project):
+            self.changed = True
+
+    def refresh(self) -> int:
+        """
+        Re-read the binder if it's changed, and any scrivenings whose files have changed.
+
+        :return: Number of scrivenings that were re-read or removed.
+        """
+        with self.lock:
+            if os.stat(self.project.project_file).st_mtime_ns != self._project_mtime:
+                # The binder has changed, so start over, keeping index entries for unchanged scrivenings
+                old = set(self._mtimes.items())
+                self._load()
+                return len(old.symmetric_difference(self._mtimes.items()))
+
+            changed = 0
+            for scrivening_id, scrivening in self._scrivenings.items():
+                mtime = scrivening_mtime(scrivening)
+                if mtime != self._mtimes[scrivening_id]:
+                    self._mtimes[scrivening_id] = mtime
+                    # The cached RTF and text are stale. Prose statistics check the mtime themselves.
+                    scrivening.invalidate()
+                    self._preload(scrivening)
+                    self._streams.pop(scrivening_id, None)
+                    changed += 1
+            if changed and self.index.update(self.project):
+                self.changed = True
+            return changed
+
+    @staticmethod
+    def _preload(scrivening: Scrivening):
+        try:
+            scrivening.text()
+        except FileNotFoundError:
+            pass
+
+    def scrivening(self, scrivening_id) -> Scrivening:
+        try:
+            return self._scrivenings[str(scrivening_id)]
+        except KeyError:
+            raise ValueError("The project has no scrivening with ID {}".format(scrivening_id)) from None
+
+    def stream(self, scrivening: Scrivening) -> TokenStream:
+        """
+        Get the token stream of a scrivening, not including its children, case-folded if the project is.
+        """
+        stream = self._streams.get(str(scrivening.id))
+        if stream is None:
+            stream = encode_scrivening(scrivening, recursive=False, tokenizer=self.tokenizer)
+            if self.fold_case:
+                stream = stream.folded()
+            self._streams[str(scrivening.id)] = stream
+        return stream
+
+    def parts(self, scrivening_id=None) -> List[Scrivening]:
+        """
+        Get the scrivenings in a subtree, or in the whole project.
+        """
+        if scrivening_id is None:
+            return list(self._scrivenings.values())
+        return flatten_scrivenings([self.scrivening(scrivening_id)], True)
+
+
+class AnalysisDaemon(object):
+    """
+    The state of an analysis server: the projects it has loaded and the commands it answers.
+    """
+    def __init__(self, tokenizer: Union[str, Tokenizer] = None, fold_case: bool = True,
+                 refresh_interval: float = DEFAULT_REFRESH_INTERVAL, index_dir: str = None):
+        """
+        :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+        :param fold_case: If True, ignore case in phrase queries and echoes.
+        :param refresh_interval: Seconds between checks for changed files, or None to only refresh when asked.
+        :param index_dir: Directory to keep the projects' phrase indexes in. Each project starts from its saved
+        index, which is saved again on close if it's changed. If None, indexes are built in memory and not
+        saved.
+        """
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.fold_case = fold_case
+        self.refresh_interval = refresh_interval
+        self.index_dir = index_dir
+        if index_dir is not None:
+            os.makedirs(index_dir, exist_ok=True)
+        self._projects = {}  # type: Dict[str, _LoadedProject]
+        # Held while _projects is read or changed, but not while a project loads
+        self._lock = threading.Lock()
+        # Held while a project loads, so that requests for it wait for one load instead of each starting one
+        self._loading = {}  # type: Dict[str, threading.Lock]
+        self._stopped = threading.Event()
+        self._refresher = None
+        if refresh_interval is not None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name='scripturient-refresh', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self.refresh_interval):
+            self.refresh()
+
+    def project(self, project_dir: str) -> _LoadedProject:
+        """
+        Get a loaded project, loading it first if it's new.
+        """
+        if not isinstance(project_dir, str):
+            raise ValueError("Requests need the path of a project")
+        project_dir = os.path.abspath(project_dir)
+        with self._lock:
+            loaded = self._projects.get(project_dir)
+            if loaded is not None:
+                return loaded
+            loading = self._loading.setdefault(project_dir, threading.Lock())
+        # Load without the daemon's lock, so that a cold load doesn't hold up other projects or the refresher
+        with loading:
+            with self._lock:
+                loaded = self._projects.get(project_dir)
+            if loaded is None:
+                loaded = _LoadedProject(project_dir, self.tokenizer, self.fold_case, self.index_dir)
+                with self._lock:
+                    self._projects[project_dir] = loaded
+                    self._loading.pop(project_dir, None)
+            return loaded
+
+    def refresh(self) -> int:
+        """
+        Re-read any changed scrivenings in every loaded project.
+
+        :return: Number of scrivenings that were re-read or removed.
+        """
+        with self._lock:
+            projects = list(self._projects.values())
+        changed = 0
+        for loaded in projects:
+            try:
+                changed += loaded.refresh()
+            except Exception:
+                # The project may be half-saved, so its binder or RTF doesn't parse; try again next time. A
+                # refresh request for the project itself reports the error.
+                pass
+        return changed
+
+    def close(self):
+        """
+        Stop refreshing, and save the phrase indexes that have changed.
+        """
+        self._stopped.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        for loaded in self._projects.values():
+            with loaded.lock:
+                if loaded.changed and loaded.index_path is not None:
+                    loaded.index.save(loaded.index_path)
+                    loaded.changed = False
+
+    def handle(self, request: dict) -> dict:
+        """
+        Answer a request.
+
+        :param request: The request, with the command and its arguments.
+        :return: The response.
+        """
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Requests must be JSON objects")
+            arguments = dict(request)
+            command = arguments.pop('command', None)
+            method = getattr(self, '_command_' + command, None) if isinstance(command, str) else None
+            if method is None:
+                raise ValueError("Unknown command {}; expected one of {}".format(command, ", ".join(COMMANDS)))
+            # Check the arguments first, so that a TypeError from inside the command isn't blamed on them
+            try:
+                inspect.signature(method).bind(**arguments)
+            except TypeError as e:
+                raise ValueError("Bad arguments to {}: {}".format(command, e)) from None
+            return {'ok': True, 'result': method(**arguments)}
+        except (OSError, ValueError, KeyError) as e:
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:
+            # Such as a binder or RTF file that doesn't parse
+            return {'ok': False, 'error': "{}: {}".format(type(e).__name__, e)}
+
+    def _command_ping(self):
+        return 'pong'
+
+    def _command_load(self, project: str):
+        loaded = self.project(project)
+        with loaded.lock:
+            return {'scrivenings': len(loaded.parts()), 'tokens': len(loaded.index)}
+
+    def _command_refresh(self, project: str = None):
+        if project is None:
+            return self.refresh()
+        return self.project(project).refresh()
+
+    def _command_count(self, project: str, phrase: Union[str, List[str]]):
+        loaded = self.project(project)
+        with loaded.lock:
+            return len(loaded.index.find(phrase))
+
+    def _command_occurrences(self, project: str, phrase: Union[str, List[str]], limit: int = None):
+        loaded = self.project(project)
+        with loaded.lock:
+            return [as_dict(location) for location in loaded.index.find_locations(phrase)[:limit]]
+
+    def _command_echoes(self, project: str, scrivening: str = None, window: int = DEFAULT_WINDOW,
+                        min_length: int = 1, max_length: int = 1, limit: int = None):
+        loaded = self.project(project)
+        results = []
+        with loaded.lock:
+            for part in loaded.parts(scrivening):
+                for echo in iter_echoes(loaded.stream(part), window, min_length, max_length):
+                    if limit is not None and len(results) >= limit:
+                        return results
+                    results.append(as_dict(echo))
+        return results
+
+    def _command_stats(self, project: str, scrivening: str = None):
+        loaded = self.project(project)
+        with loaded.lock:
+            if scrivening is None:
+                return project_stats(loaded.project, self.tokenizer).summary()
+            return subtree_stats(loaded.scrivening(scrivening), self.tokenizer).summary()
+
+
+# Commands the server answers
+COMMANDS = tuple(sorted(name[len('_command_'):] for name in vars(AnalysisDaemon) if name.startswith('_command_')))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline(_MAX_REQUEST_SIZE)
+            if not line:
+                return
+            if len(line) == _MAX_REQUEST_SIZE and not line.endswith(b'\n'):
+                # The rest of the line can't be told apart from a new request, so give up on the connection
+                self._respond({'ok': False, 'error': "Requests can't be longer than {} bytes".format(
+                    _MAX_REQUEST_SIZE)})
+                return
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'ok': False, 'error': "Requests must be JSON: {}".format(e)}
+            else:
+                response = self.server.analysis_daemon.handle(request)
+            self._respond(response)
+
+    def _respond(self, response: dict):
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class DaemonServer(object):
+    """
+    Serves an AnalysisDaemon's commands on a Unix domain socket or a localhost TCP port.
+    """
+    def __init__(self, address: Union[str, Tuple[str, int]], daemon: AnalysisDaemon = None, **kwargs):
+        """
+        :param address: Path of the Unix domain socket, or a (host, port) tuple for TCP. Port 0 picks a free
+        port, which is then in the address attribute.
+        :param daemon: The daemon to serve. Defaults to a new one.
+        :param kwargs: Arguments to AnalysisDaemon, if there's no daemon.
+        """
+        self.daemon = daemon if daemon is not None else AnalysisDaemon(**kwargs)
+        if isinstance(address, str):
+            # A socket left behind by a server that didn't shut down cleanly would stop this one binding, but
+            # anything else at the path is left alone
+            try:
+                mode = os.lstat(address).st_mode
+            except FileNotFoundError:
+                pass
+            else:
+                if not stat.S_ISSOCK(mode):
+                    raise FileExistsError("{} exists and isn't a socket".format(address))
+                os.unlink(address)
+            self._server = _UnixServer(address, _RequestHandler)
+        else:
+            self._server = _TcpServer(tuple(address), _RequestHandler)
+        self._server.analysis_daemon = self.daemon
+        self.address = self._server.server_address
+
+    def serve_forever(self):
+        """
+        Answer requests until shutdown is called from another thread, or the process is interrupted.
+        """
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def start(self) -> threading.Thread:
+        """
+        Answer requests in a background thread.
+
+        :return: The thread.
+        """
+        thread = threading.Thread(target=self._server.serve_forever, name='scripturient-server', daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        """
+        Stop answering requests and close the server.
+        """
+        self._server.shutdown()
+        self.close()
+
+    def close(self):
+        if self._server.socket.fileno() >= 0:
+            self._server.server_close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+        self.daemon.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+class DaemonClient(object):
+    """
+    Sends requests to an analysis server over one connection.
+    """
+    def __init__(self, address: Union[str, Tuple[str, int]], timeout: float = None):
+        """
+        :param address: Path of the server's Unix domain socket, or its (host, port) tuple.
+        :param timeout: Seconds to wait for a response, or None to wait as long as it takes.
+        """
+        if isinstance(address, str):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(address if isinstance(address, str) else tuple(address))
+        self._file = self._socket.makefile('rwb')
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, command: str, **arguments):
+        """
+        Send a request and wait for the response.
+
+        :param command: The command, one of COMMANDS.
+        :param arguments: The command's arguments. Arguments that are None are left out.
+        :return: The result.
+        :raises DaemonError: If the server couldn't answer the request.
+        """
+        request = {name: value for name, value in arguments.items() if value is not None}
+        request['command'] = command
+        self._file.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("The server closed the connection")
+        response = json.loads(line.decode('utf-8'))
+        if not response.get('ok'):
+            raise DaemonError(response.get('error', "Unknown error"))
+        return response['result']
+
+    def count(self, project: str, phrase: Union[str, List[str]]) -> int:
+        return self.request('count', project=project, phrase=phrase)
+
+    def occurrences(self, project: str, phrase: Union[str, List[str]], limit: int = None) -> List[dict]:
+        return self.request('occurrences', project=project, phrase=phrase, limit=limit)
+
+    def echoes(self, project: str, scrivening: str = None, **kwargs) -> List[dict]:
+        return self.request('echoes', project=project, scrivening=scrivening, **kwargs)
+
+    def stats(self, project: str, scrivening: str = None) -> dict:
+        return self.request('stats', project=project, scrivening=scrivening)
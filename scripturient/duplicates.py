@@ -0,0 +1,207 @@
+"""
+Find paragraphs that are nearly the same as each other, such as a scene that was copied and reworked.
+
+Each paragraph becomes the set of its word shingles, runs of a few consecutive words. Paragraphs get MinHash
+signatures, and locality-sensitive hashing of bands of those signatures finds candidate pairs that are
+likely to be similar without comparing every pair. Candidates are then checked by their exact Jaccard
+similarity.
+"""
+from collections import namedtuple
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from .ngrams import excluded_ids
+from .scrivener import ScrivenerProject
+from .sketches import PHRASE_MULTIPLIER, mix_hashes, token_hashes
+from .tokenizers import Tokenizer
+from .vocabulary import TokenStream, encode_project
+
+NearDuplicate = namedtuple('NearDuplicate', ['first', 'second', 'similarity'])
+NearDuplicate.__doc__ = """
+Two nearly identical paragraphs, each given as a (scrivening ID, paragraph index) tuple, and the Jaccard
+similarity of their shingles.
+"""
+
+
+class ParagraphShingles(object):
+    """
+    The distinct shingle hashes of each paragraph in a token stream: the shingles of paragraphs[i] are
+    hashes[indptr[i]:indptr[i+1]], sorted.
+    """
+    def __init__(self, paragraphs: List[Tuple[object, int]], indptr: np.ndarray, hashes: np.ndarray):
+        self.paragraphs = paragraphs
+        self.indptr = indptr
+        self.hashes = hashes
+
+    def __len__(self):
+        return len(self.paragraphs)
+
+    def shingles(self, index: int) -> np.ndarray:
+        return self.hashes[self.indptr[index]:self.indptr[index + 1]]
+
+    @classmethod
+    def from_stream(cls, stream: TokenStream, shingle_size: int = 3, min_words: int = 10) -> \
+            'ParagraphShingles':
+        """
+        Shingle every paragraph in a token stream. Punctuation is ignored.
+
+        :param stream: The token stream. Case-fold it first to ignore case.
+        :param shingle_size: Number of words in each shingle.
+        :param min_words: Leave out paragraphs with fewer words than this, which are too short to compare.
+        """
+        if shingle_size < 1:
+            raise ValueError("Shingles must have at least 1 word, not {}".format(shingle_size))
+
+        words = ~excluded_ids(stream.vocabulary, words_only=True)[stream.ids] if len(stream) else \
+            np.zeros(0, dtype=bool)
+        ids = stream.ids[words]
+        scrivening_index = stream.scrivening_index()[words]
+        paragraph_index = stream.paragraphs[words]
+
+        # Number the paragraphs in stream order
+        new_paragraph = np.ones(len(ids), dtype=bool)
+        new_paragraph[1:] = (scrivening_index[1:] != scrivening_index[:-1]) | \
+            (paragraph_index[1:] != paragraph_index[:-1])
+        labels = np.cumsum(new_paragraph) - 1
+        starts = np.flatnonzero(new_paragraph)
+        lengths = np.diff(np.append(starts, len(ids)))
+
+        # Hash every run of shingle_size words, keeping those within one paragraph of at least min_words
+        hashes = token_hashes(stream.vocabulary)[ids] if len(ids) else np.zeros(0, dtype=np.uint64)
+        rolling = hashes
+        for offset in range(1, shingle_size):
+            rolling = rolling[:-1] * PHRASE_MULTIPLIER + hashes[offset:]
+        count = len(rolling)
+        valid = (labels[:count] == labels[shingle_size - 1:shingle_size - 1 + count]) & \
+            (lengths[labels[:count]] >= max(min_words, shingle_size))
+        shingle_labels, shingle_hashes = labels[:count][valid], mix_hashes(rolling[valid])
+
+        # Sort by paragraph, then hash, and drop repeated shingles within a paragraph
+        order = np.lexsort((shingle_hashes, shingle_labels))
+        shingle_labels, shingle_hashes = shingle_labels[order], shingle_hashes[order]
+        distinct = np.ones(len(order), dtype=bool)
+        distinct[1:] = (shingle_labels[1:] != shingle_labels[:-1]) | (shingle_hashes[1:] != shingle_hashes[:-1])
+        shingle_labels, shingle_hashes = shingle_labels[distinct], shingle_hashes[distinct]
+
+        kept, counts = np.unique(shingle_labels, return_counts=True)
+        paragraphs = [(stream.scrivening_ids[scrivening], paragraph) for scrivening, paragraph in
+                      zip(scrivening_index[starts[kept]].tolist(), paragraph_index[starts[kept]].tolist())]
+        return cls(paragraphs, np.concatenate(([0], np.cumsum(counts))), shingle_hashes)
+
+
+def minhash_signatures(shingles: ParagraphShingles, num_perm: int = 128, seed: int = 0) -> np.ndarray:
+    """
+    Compute the MinHash signature of every paragraph.
+
+    :param shingles: The paragraphs' shingles.
+    :param num_perm: Number of hash functions, which is the length of each signature.
+    :param seed: Seed for the hash functions. Only signatures with the same seed can be compared.
+    :return: Array with one row of num_perm 64-bit values per paragraph.
+    """
+    signatures = np.empty((len(shingles), num_perm), dtype=np.uint64)
+    if not len(shingles):
+        return signatures
+
+    row_seeds = np.random.default_rng(seed).integers(0, 2 ** 63, size=num_perm, dtype=np.int64).astype(np.uint64)
+    starts = shingles.indptr[:-1]
+    for column, row_seed in enumerate(row_seeds):
+        signatures[:, column] = np.minimum.reduceat(mix_hashes(shingles.hashes ^ row_seed), starts)
+    return signatures
+
+
+def lsh_parameters(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Choose how to split signatures into bands. Pairs below the threshold are weeded out by checking their
+    Jaccard similarity, so the bands are chosen to find pairs at the threshold rather than to avoid
+    candidates below it.
+
+    :param threshold: Lowest Jaccard similarity of the pairs to find.
+    :param num_perm: Length of each signature.
+    :return: Tuple of the number of bands and the number of rows in each.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("The threshold must be between 0 and 1, not {}".format(threshold))
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+
+    # Pairs more similar than about (1 / bands) ** (1 / rows) are likely to share a band, so take the
+    # highest such similarity that's still no more than the threshold
+    def steepest(option):
+        return (1 / option[0]) ** (1 / option[1])
+
+    below = [option for option in options if steepest(option) <= threshold]
+    if not below:
+        return min(options, key=steepest)
+    return max(below, key=steepest)
+
+
+def lsh_candidates(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """
+    Find pairs of paragraphs whose signatures are identical in at least one band.
+
+    :param signatures: MinHash signatures, one row per paragraph.
+    :param bands: Number of bands.
+    :param rows: Number of signature values in each band.
+    :return: Array of distinct (i, j) index pairs with i < j.
+    """
+    count = len(signatures)
+    pairs = []
+    for band in range(bands):
+        keys = np.zeros(count, dtype=np.uint64)
+        for column in range(band * rows, (band + 1) * rows):
+            keys = mix_hashes(keys * PHRASE_MULTIPLIER + signatures[:, column])
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        bucket_starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        bucket_sizes = np.diff(np.append(bucket_starts, count))
+        for start, size in zip(bucket_starts[bucket_sizes > 1].tolist(), bucket_sizes[bucket_sizes > 1].tolist()):
+            members = np.sort(order[start:start + size])
+            first, second = np.triu_indices(size, 1)
+            pairs.append(members[first] * count + members[second])
+
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    keys = np.unique(np.concatenate(pairs))
+    return np.stack((keys // count, keys % count), axis=1)
+
+
+def _jaccard(shingles: ParagraphShingles, first: int, second: int) -> float:
+    a, b = shingles.shingles(first), shingles.shingles(second)
+    common = len(np.intersect1d(a, b, assume_unique=True))
+    return common / (len(a) + len(b) - common)
+
+
+def find_near_duplicates(source: Union[TokenStream, ScrivenerProject], threshold: float = 0.8,
+                         shingle_size: int = 3, num_perm: int = 128, min_words: int = 10,
+                         same_scrivening: bool = True, seed: int = 0,
+                         tokenizer: Union[str, Tokenizer] = None) -> List[NearDuplicate]:
+    """
+    Find pairs of nearly identical paragraphs.
+
+    :param source: The token stream or project to search.
+    :param threshold: Lowest Jaccard similarity of two paragraphs' shingles to report.
+    :param shingle_size: Number of words in each shingle.
+    :param num_perm: Length of the MinHash signatures. Longer signatures miss fewer pairs but take longer.
+    :param min_words: Leave out paragraphs with fewer words than this.
+    :param same_scrivening: If False, only report pairs of paragraphs in different scrivenings.
+    :param seed: Seed for the MinHash functions.
+    :param tokenizer: Tokenizer backend or its name, used if source is a project. Defaults to the nltk backend.
+    :return: List of near-duplicate paragraphs, most similar first.
+    """
+    stream = encode_project(source, tokenizer=tokenizer) if isinstance(source, ScrivenerProject) else source
+    shingles = ParagraphShingles.from_stream(stream.folded(), shingle_size, min_words)
+    bands, rows = lsh_parameters(threshold, num_perm)
+    candidates = lsh_candidates(minhash_signatures(shingles, num_perm, seed), bands, rows)
+
+    duplicates = []
+    for first, second in candidates.tolist():
+        a, b = shingles.paragraphs[first], shingles.paragraphs[second]
+        if not same_scrivening and a[0] == b[0]:
+            continue
+        similarity = _jaccard(shingles, first, second)
+        if similarity >= threshold:
+            duplicates.append(NearDuplicate(a, b, similarity))
+
+    duplicates.sort(key=lambda duplicate: -duplicate.similarity)
+    return duplicates
@@ -0,0 +1,145 @@
+"""
+Find echoes: a word or phrase that appears again soon after it was last used.
+"""
+from collections import namedtuple
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+from .ngrams import excluded_ids, iter_ngram_keys
+from .vocabulary import Location, TokenStream
+
+# Number of words after a word or phrase in which its reappearance counts as an echo
+DEFAULT_WINDOW = 50
+
+# Words too common to be worth flagging when they echo. A phrase is only skipped if all of its words are
+# stopwords.
+DEFAULT_STOPWORDS = frozenset((
+    'a', 'about', 'above', 'after', 'again', 'against', 'all', 'am', 'an', 'and', 'any', 'are', 'as', 'at',
+    'be', 'because', 'been', 'before', 'being', 'below', 'between', 'both', 'but', 'by', 'ca', 'can', 'could',
+    'did', 'do', 'does', 'doing', 'down', 'during', 'each', 'few', 'for', 'from', 'further', 'had', 'has',
+    'have', 'having', 'he', 'her', 'here', 'hers', 'herself', 'him', 'himself', 'his', 'how', 'i', 'if', 'in',
+    'into', 'is', 'it', 'its', 'itself', 'just', 'me', 'more', 'most', 'my', 'myself', 'no', 'nor', 'not',
+    'now', 'of', 'off', 'on', 'once', 'only', 'or', 'other', 'our', 'ours', 'ourselves', 'out', 'over', 'own',
+    'said', 'same', 'she', 'should', 'so', 'some', 'such', 'than', 'that', 'the', 'their', 'theirs', 'them',
+    'themselves', 'then', 'there', 'these', 'they', 'this', 'those', 'through', 'to', 'too', 'under', 'until',
+    'up', 'very', 'was', 'we', 'were', 'what', 'when', 'where', 'which', 'while', 'who', 'whom', 'why', 'will',
+    'with', 'wo', 'would', 'you', 'your', 'yours', 'yourself', 'yourselves',
+    "n't", "'s", "'m", "'d", "'ll", "'re", "'ve",
+))
+
+Echo = namedtuple('Echo', ['phrase', 'distance', 'first', 'second'])
+Echo.__doc__ = """
+A phrase that reappears within the window. distance is the number of words from the start of the phrase's
+first appearance to the start of the echo, and first and second are the locations of the two appearances.
+"""
+
+
+def iter_echoes(stream: TokenStream, window: int = DEFAULT_WINDOW, min_length: int = 1, max_length: int = 1,
+                stopwords: Iterable[str] = DEFAULT_STOPWORDS, cross_scrivenings: bool = False) -> Iterator[Echo]:
+    """
+    Find echoes in a token stream.
+
+    Each appearance of a phrase is compared with the phrase's previous appearance, so a phrase used three
+    times in quick succession gives two echoes. Distances are counted in words, ignoring punctuation, and
+    phrases are runs of words in the same paragraph that aren't interrupted by punctuation.
+
+    :param stream: The token stream. Case-fold it first to treat "The" and "the" as the same word.
+    :param window: Largest distance in words between two appearances that counts as an echo.
+    :param min_length: Length in words of the shortest phrases to look for.
+    :param max_length: Length in words of the longest phrases to look for.
+    :param stopwords: Words that don't echo on their own. Compared case-insensitively.
+    :param cross_scrivenings: If True, a phrase can echo one in the previous scrivening.
+    :return: Iterator of echoes in order of where the echo appears, longest phrases first.
+    """
+    if min_length < 1 or max_length < min_length:
+        raise ValueError("Can't look for phrases of lengths {} to {}".format(min_length, max_length))
+    if window < 1:
+        raise ValueError("The window must be at least 1 word, not {}".format(window))
+
+    vocabulary = stream.vocabulary
+    ids = stream.ids
+    not_words = excluded_ids(vocabulary, words_only=True)
+    stopword_ids = np.zeros(len(vocabulary), dtype=bool)
+    if stopwords:
+        stopwords = {stopword.casefold() for stopword in stopwords}
+        stopword_ids[:] = [token.casefold() in stopwords for token in vocabulary]
+
+    is_word = ~not_words[ids] if len(vocabulary) else np.zeros(0, dtype=bool)
+    word_index = np.cumsum(is_word) - 1
+    # Number of non-stopwords before each position, to skip phrases made up only of stopwords
+    content_words = np.concatenate(([0], np.cumsum(is_word & ~stopword_ids[ids])))
+    scrivening_index = stream.scrivening_index()
+
+    # Find the positions where a phrase that occurs more than once starts, and which could echo
+    lengths = []
+    candidate = np.zeros(len(ids), dtype=bool)
+    for n, keys, counts in _iter_keys(stream, min_length, max_length, not_words):
+        positions = np.flatnonzero(keys >= 0)
+        last = positions + n - 1
+        positions = positions[(counts[keys[positions]] > 1) &
+                              (content_words[last + 1] > content_words[positions]) &
+                              (stream.paragraphs[positions] == stream.paragraphs[last])]
+        phrase_keys = np.full(len(ids), -1, dtype=np.int64)
+        phrase_keys[positions] = keys[positions]
+        candidate[positions] = True
+        lengths.append((n, phrase_keys, len(counts)))
+    lengths.sort(key=lambda length: -length[0])
+    positions = np.flatnonzero(candidate)
+    if len(positions) == 0:
+        return
+
+    # Plain lists of what's needed at each candidate position, which are much faster to index one at a time
+    # than arrays
+    tokens = [vocabulary.token(token_id) for token_id in range(len(vocabulary))]
+    scrivening_ids = stream.scrivening_ids
+    scrivenings = scrivening_index[positions].tolist()
+    words = word_index[positions].tolist()
+    paragraphs = stream.paragraphs[positions].tolist()
+    starts = stream.starts[positions].tolist()
+    lengths = [(n, phrase_keys[positions].tolist(),
+                stream.ends[np.minimum(positions + n - 1, len(ids) - 1)].tolist(),
+                # The candidate at which each phrase was last seen, or -1
+                [-1] * key_count)
+               for n, phrase_keys, key_count in lengths]
+    positions = positions.tolist()
+
+    def location(index, ends):
+        return Location(scrivening_ids[scrivenings[index]], paragraphs[index], starts[index], ends[index])
+
+    # One pass over the stream, comparing each appearance of a phrase with the last one
+    for index, (word, scrivening) in enumerate(zip(words, scrivenings)):
+        for n, keys, ends, last_seen in lengths:
+            key = keys[index]
+            if key < 0:
+                continue
+            previous = last_seen[key]
+            last_seen[key] = index
+            if previous < 0:
+                continue
+            distance = word - words[previous]
+            # Overlapping appearances, like the two "la la"s in "la la la", aren't echoes
+            if distance < n or distance > window:
+                continue
+            if not cross_scrivenings and scrivenings[previous] != scrivening:
+                continue
+            position = positions[index]
+            yield Echo(tuple(tokens[token_id] for token_id in ids[position:position + n].tolist()), distance,
+                       location(previous, ends), location(index, ends))
+
+
+def _iter_keys(stream: TokenStream, min_length: int, max_length: int,
+               not_words: np.ndarray) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Give every phrase in a token stream a dense integer key, one phrase length at a time.
+
+    :return: Iterator of (n, keys, counts) tuples, as from iter_ngram_keys.
+    """
+    if max_length == 1:
+        # Token IDs are already dense keys for single words
+        keys = np.where(not_words[stream.ids], -1, stream.ids.astype(np.int64)) if len(stream.vocabulary) else \
+            np.zeros(0, dtype=np.int64)
+        yield 1, keys, np.bincount(stream.ids, minlength=len(stream.vocabulary))
+        return
+    for n, keys, counts, _ in iter_ngram_keys(stream, max_length, min_length, not_words):
+        yield n, keys, counts
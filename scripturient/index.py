@@ -0,0 +1,266 @@
+"""
+Positional inverted index of a project's tokens, for finding phrases without re-reading the project.
+
+Each scrivening has its own postings, stored as compressed sparse rows: the positions of token ID
+token_ids[i] in the scrivening are positions[indptr[i]:indptr[i+1]]. Positions and character offsets are
+stored in the narrowest unsigned integer type that holds them, which for a typical scene is 16 bits.
+Keeping scrivenings separate lets one scrivening be re-indexed when its file changes.
+"""
+from hashlib import sha1
+import json
+import os
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from . import instrument
+from .scrivener import Scrivening, ScrivenerProject, iter_tokens, flatten_scrivenings, scrivening_mtime
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import Location, Vocabulary, encode_tokens
+
+# Suffix of the file an index is saved to
+INDEX_FILE_SUFFIX = '.index.npz'
+
+# Bump when the saved format changes so that old indexes are rebuilt rather than misread
+_FORMAT_VERSION = 1
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """
+    Convert non-negative integers to the narrowest unsigned type that holds them.
+    """
+    if len(values) and values.max() >= 2 ** 16:
+        return values.astype(np.uint32)
+    return values.astype(np.uint16)
+
+
+class _Postings(object):
+    """
+    Positional postings of one scrivening, with the paragraph and character offsets of each token.
+    """
+    _ARRAYS = ('token_ids', 'indptr', 'positions', 'paragraphs', 'starts', 'ends')
+
+    def __init__(self, mtime: int, token_ids: np.ndarray, indptr: np.ndarray, positions: np.ndarray,
+                 paragraphs: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+        self.mtime = mtime
+        self.token_ids = token_ids
+        self.indptr = indptr
+        self.positions = positions
+        self.paragraphs = paragraphs
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def from_tokens(cls, mtime: int, ids: np.ndarray, paragraphs: np.ndarray, starts: np.ndarray,
+                    ends: np.ndarray) -> '_Postings':
+        # A stable sort keeps each token's positions in increasing order
+        order = np.argsort(ids, kind='stable')
+        token_ids, counts = np.unique(ids, return_counts=True)
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return cls(mtime, token_ids.astype(np.uint32), _narrow(indptr), _narrow(order), _narrow(paragraphs),
+                   _narrow(starts), _narrow(ends))
+
+    def __len__(self):
+        return len(self.paragraphs)
+
+    def positions_of(self, token_id: int) -> np.ndarray:
+        index = int(np.searchsorted(self.token_ids, token_id))
+        if index == len(self.token_ids) or self.token_ids[index] != token_id:
+            return np.zeros(0, dtype=np.int64)
+        return self.positions[self.indptr[index]:self.indptr[index + 1]].astype(np.int64)
+
+    def find(self, ids: Sequence[int]) -> np.ndarray:
+        """
+        Find where a phrase starts by intersecting its tokens' positions, beginning with the rarest token.
+        """
+        postings = [self.positions_of(token_id) for token_id in ids]
+        offsets = sorted(range(len(ids)), key=lambda offset: len(postings[offset]))
+        starts = postings[offsets[0]] - offsets[0]
+        for offset in offsets[1:]:
+            if not len(starts):
+                break
+            starts = np.intersect1d(starts, postings[offset] - offset, assume_unique=True)
+        return starts
+
+
+class PhraseIndex(object):
+    """
+    Positional inverted index of the tokens in a project's scrivenings.
+    """
+    def __init__(self, tokenizer: Union[str, Tokenizer] = None, fold_case: bool = True):
+        """
+        :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+        :param fold_case: If True, index and search case-folded tokens.
+        """
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.fold_case = fold_case
+        self.vocabulary = Vocabulary()
+        self.scrivening_ids = []
+        self._postings = {}  # type: Dict[object, _Postings]
+
+    def __len__(self):
+        return sum(len(postings) for postings in self._postings.values())
+
+    def _index_scrivening(self, scrivening: Scrivening, mtime: int):
+        stream = encode_tokens(iter_tokens([scrivening], False, self.tokenizer))
+        if self.fold_case:
+            stream = stream.folded()
+        ids = self.vocabulary.encode(stream.tokens())
+        self._postings[scrivening.id] = _Postings.from_tokens(mtime, ids, stream.paragraphs, stream.starts,
+                                                              stream.ends)
+
+    def update(self, project: ScrivenerProject) -> int:
+        """
+        Bring the index up to date with a project, re-indexing only scrivenings whose files have changed.
+
+        :param project: The project.
+        :return: Number of scrivenings indexed or removed.
+        """
+        scrivenings = flatten_scrivenings(project.scrivenings, True)
+        changed = 0
+        for scrivening in scrivenings:
+            mtime = scrivening_mtime(scrivening)
+            postings = self._postings.get(scrivening.id)
+            if postings is None or postings.mtime != mtime:
+                instrument.cache_miss('index')
+                self._index_scrivening(scrivening, mtime)
+                changed += 1
+            else:
+                instrument.cache_hit('index')
+
+        self.scrivening_ids = [scrivening.id for scrivening in scrivenings]
+        for scrivening_id in set(self._postings) - set(self.scrivening_ids):
+            del self._postings[scrivening_id]
+            changed += 1
+        return changed
+
+    def _encode_phrase(self, phrase: Union[str, Sequence[str]]) -> List[int]:
+        tokens = self.tokenizer.tokenize(phrase) if isinstance(phrase, str) else list(phrase)
+        if self.fold_case:
+            tokens = [token.casefold() for token in tokens]
+        return [self.vocabulary.get(token) for token in tokens]
+
+    def find(self, phrase: Union[str, Sequence[str]]) -> List[Tuple[object, int]]:
+        """
+        Find every occurrence of a phrase.
+
+        :param phrase: The phrase, either as text to tokenize or as a sequence of tokens.
+        :return: List of (scrivening ID, token offset) tuples in compile order, where the token offset is
+        counted from the start of the scrivening's tokens.
+        """
+        return [(scrivening_id, int(start)) for scrivening_id, _, starts in self._find(self._encode_phrase(phrase))
+                for start in starts]
+
+    def find_locations(self, phrase: Union[str, Sequence[str]]) -> List[Location]:
+        """
+        Find every occurrence of a phrase.
+
+        :param phrase: The phrase, either as text to tokenize or as a sequence of tokens.
+        :return: List of the phrase's locations in compile order. If the phrase spans paragraphs, the
+        location's end is in the last paragraph.
+        """
+        ids = self._encode_phrase(phrase)
+        locations = []
+        for scrivening_id, postings, starts in self._find(ids):
+            ends = starts + len(ids) - 1
+            locations.extend(map(Location, [scrivening_id] * len(starts), postings.paragraphs[starts].tolist(),
+                                 postings.starts[starts].tolist(), postings.ends[ends].tolist()))
+        return locations
+
+    def _find(self, ids: List[int]) -> Iterator[Tuple[object, _Postings, np.ndarray]]:
+        if not ids or None in ids:
+            return
+        for scrivening_id in self.scrivening_ids:
+            postings = self._postings[scrivening_id]
+            starts = postings.find(ids)
+            if len(starts):
+                yield scrivening_id, postings, starts
+
+    def save(self, path: str):
+        """
+        Save the index.
+
+        :param path: Path of the file to save to.
+        """
+        meta = {
+            'version': _FORMAT_VERSION,
+            'tokenizer': self.tokenizer.name,
+            'fold_case': self.fold_case,
+            'vocabulary': list(self.vocabulary),
+            'scrivenings': [[scrivening_id, self._postings[scrivening_id].mtime]
+                            for scrivening_id in self.scrivening_ids],
+        }
+        arrays = {'meta': np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)}
+        for index, scrivening_id in enumerate(self.scrivening_ids):
+            postings = self._postings[scrivening_id]
+            for name in _Postings._ARRAYS:
+                arrays['{}.{}'.format(index, name)] = getattr(postings, name)
+
+        # Write to a temporary file first so that an interrupted save doesn't destroy the old index
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as fh:
+            np.savez_compressed(fh, **arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'PhraseIndex':
+        """
+        Load a saved index.
+
+        :param path: Path of the saved index.
+        :return: The index.
+        :raises ValueError: If the file was saved in an older format.
+        """
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            if meta.get('version') != _FORMAT_VERSION:
+                raise ValueError("The index at {} has an unsupported format".format(path))
+
+            index = cls(meta['tokenizer'], meta['fold_case'])
+            index.vocabulary = Vocabulary(meta['vocabulary'])
+            for position, (scrivening_id, mtime) in enumerate(meta['scrivenings']):
+                index.scrivening_ids.append(scrivening_id)
+                index._postings[scrivening_id] = _Postings(
+                    mtime, *(data['{}.{}'.format(position, name)] for name in _Postings._ARRAYS))
+
+        return index
+
+
+def index_path(cache_dir: str, project_dir: str) -> str:
+    """
+    Get where to save a project's index in a cache directory that holds the indexes of several projects.
+    Indexes are kept out of the project itself, since Scrivener and sync tools own the .scriv package.
+
+    :param cache_dir: The cache directory.
+    :param project_dir: The project's directory.
+    :return: Path of the index, named after a hash of the project's absolute path.
+    """
+    name = sha1(os.path.abspath(project_dir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, name + INDEX_FILE_SUFFIX)
+
+
+def open_index(project: ScrivenerProject, path: str, tokenizer: Union[str, Tokenizer] = None,
+               fold_case: bool = True) -> PhraseIndex:
+    """
+    Load a project's saved index, update it with any changed scrivenings, and save it again if anything
+    changed. If there's no usable saved index, build one.
+
+    :param project: The project.
+    :param path: Path of the saved index, such as from index_path.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :param fold_case: If True, index and search case-folded tokens.
+    :return: The up-to-date index.
+    """
+    tokenizer = get_tokenizer(tokenizer)
+
+    index = None
+    try:
+        index = PhraseIndex.load(path)
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    if index is None or index.tokenizer.name != tokenizer.name or index.fold_case != fold_case:
+        index = PhraseIndex(tokenizer, fold_case)
+
+    if index.update(project):
+        index.save(path)
+    return index
@@ -0,0 +1,297 @@
+"""
+Measure where the time goes in a run: binder parsing, RTF parsing, plain-text conversion, tokenization, and
+whatever stages a caller marks out itself.
+
+The pipeline reports each stage it runs to the hooks added with add_hook, as a StageEvent with its wall-clock
+and CPU time, the bytes it read, the documents it processed, and any cache hits and misses. With no hooks,
+stage() hands back a shared do-nothing context manager, so instrumentation costs next to nothing unless it's
+being used. A Recorder is a hook that adds the events up into a MetricsReport, which can be exported as JSON
+or in the Prometheus text format.
+
+Stages nest: time spent parsing RTF while encoding a project counts towards both stages. Stages that run in
+the worker processes of the parallel tokenizer aren't reported.
+"""
+from collections import namedtuple
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+StageEvent = namedtuple('StageEvent', ['stage', 'wall_seconds', 'cpu_seconds', 'bytes_read', 'documents',
+                                       'cache_hits', 'cache_misses'])
+StageEvent.__doc__ = """
+One run of a stage, or a count of cache hits and misses, which has no time.
+"""
+
+# Functions called with each StageEvent
+_hooks = []  # type: List[Callable[[StageEvent], None]]
+
+
+def add_hook(hook: Callable[[StageEvent], None]):
+    """
+    Start calling a function with every stage event. Hooks may be called from any thread.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[StageEvent], None]):
+    """
+    Stop calling a function added with add_hook.
+    """
+    _hooks.remove(hook)
+
+
+def enabled() -> bool:
+    """
+    Whether any hooks are listening.
+    """
+    return bool(_hooks)
+
+
+def record(stage: str, wall_seconds: float = 0.0, cpu_seconds: float = 0.0, bytes_read: int = 0,
+           documents: int = 0, cache_hits: int = 0, cache_misses: int = 0):
+    """
+    Report a stage event to the hooks, if there are any.
+    """
+    if _hooks:
+        event = StageEvent(stage, wall_seconds, cpu_seconds, bytes_read, documents, cache_hits, cache_misses)
+        for hook in list(_hooks):
+            hook(event)
+
+
+def cache_hit(stage: str):
+    if _hooks:
+        record(stage, cache_hits=1)
+
+
+def cache_miss(stage: str):
+    if _hooks:
+        record(stage, cache_misses=1)
+
+
+class _Stage(object):
+    __slots__ = ('name', 'bytes_read', 'documents', '_wall', '_cpu')
+
+    def __init__(self, name: str, bytes_read: int, documents: int):
+        self.name = name
+        self.bytes_read = bytes_read
+        self.documents = documents
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self._wall, time.process_time() - self._cpu, self.bytes_read,
+               self.documents)
+
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str, bytes_read: int = 0, documents: int = 0):
+    """
+    Time a stage: use the result as a context manager around the stage's work. The event is reported when the
+    stage ends, whether or not it raised.
+
+    :param name: Name of the stage.
+    :param bytes_read: Number of bytes the stage reads.
+    :param documents: Number of documents the stage processes.
+    """
+    if not _hooks:
+        return _NULL_STAGE
+    return _Stage(name, bytes_read, documents)
+
+
+def peak_memory() -> int:
+    """
+    Get the most memory this process has used so far, in bytes, or 0 if it can't be measured.
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, and macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageMetrics(object):
+    """
+    Totals of a stage's events.
+    """
+    _FIELDS = ('calls', 'wall_seconds', 'cpu_seconds', 'bytes_read', 'documents', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes_read = 0
+        self.documents = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, event: StageEvent):
+        if event.cache_hits or event.cache_misses:
+            self.cache_hits += event.cache_hits
+            self.cache_misses += event.cache_misses
+        else:
+            self.calls += 1
+        self.wall_seconds += event.wall_seconds
+        self.cpu_seconds += event.cpu_seconds
+        self.bytes_read += event.bytes_read
+        self.documents += event.documents
+
+    def copy(self) -> 'StageMetrics':
+        metrics = StageMetrics()
+        for name in self._FIELDS:
+            setattr(metrics, name, getattr(self, name))
+        return metrics
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """
+        Fraction of cache lookups that were hits, or None if there weren't any.
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else None
+
+    def to_dict(self) -> dict:
+        metrics = {name: getattr(self, name) for name in self._FIELDS}
+        metrics['cache_hit_rate'] = self.cache_hit_rate
+        return metrics
+
+
+# Prometheus metric name, type, help text and StageMetrics field of each exported stage metric
+_PROMETHEUS_METRICS = (
+    ('scripturient_stage_calls_total', 'counter', "Number of times each stage ran.", 'calls'),
+    ('scripturient_stage_wall_seconds_total', 'counter', "Wall-clock time spent in each stage.", 'wall_seconds'),
+    ('scripturient_stage_cpu_seconds_total', 'counter', "CPU time spent in each stage.", 'cpu_seconds'),
+    ('scripturient_stage_bytes_read_total', 'counter', "Bytes read by each stage.", 'bytes_read'),
+    ('scripturient_stage_documents_total', 'counter', "Documents processed by each stage.", 'documents'),
+    ('scripturient_cache_hits_total', 'counter', "Cache hits in each stage.", 'cache_hits'),
+    ('scripturient_cache_misses_total', 'counter', "Cache misses in each stage.", 'cache_misses'),
+)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape_label(str(value))) for name, value in labels.items()) + '}'
+
+
+class MetricsReport(object):
+    """
+    The metrics of a run, aggregated by stage.
+    """
+    def __init__(self, stages: Dict[str, StageMetrics], wall_seconds: float, peak_memory_bytes: int):
+        """
+        :param stages: Metrics of each stage, keyed by name, in the order they were first seen.
+        :param wall_seconds: Wall-clock time from the start of recording to the report.
+        :param peak_memory_bytes: Most memory the process had used by the time of the report.
+        """
+        self.stages = stages
+        self.wall_seconds = wall_seconds
+        self.peak_memory_bytes = peak_memory_bytes
+
+    def to_dict(self) -> dict:
+        return {
+            'stages': {name: metrics.to_dict() for name, metrics in self.stages.items()},
+            'wall_seconds': self.wall_seconds,
+            'peak_memory_bytes': self.peak_memory_bytes,
+        }
+
+    def to_json(self, **kwargs) -> str:
+        """
+        :param kwargs: Arguments to json.dumps.
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, labels: Dict[str, str] = None) -> str:
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        :param labels: Labels to add to every metric, such as the project or command.
+        :return: The metrics.
+        """
+        labels = dict(labels or {})
+        lines = []
+        for name, kind, description, field in _PROMETHEUS_METRICS:
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for stage_name, metrics in self.stages.items():
+                lines.append('{}{} {}'.format(name, _format_labels(dict(labels, stage=stage_name)),
+                                              getattr(metrics, field)))
+        for name, description, value in (
+                ('scripturient_run_wall_seconds', "Wall-clock time of the run.", self.wall_seconds),
+                ('scripturient_peak_memory_bytes', "Most memory the process used.", self.peak_memory_bytes)):
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} gauge'.format(name))
+            lines.append('{}{} {}'.format(name, _format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, labels: Dict[str, str] = None):
+        """
+        Write the metrics to a file in the Prometheus text format, such as for node_exporter's textfile
+        collector.
+
+        :param path: Path of the file.
+        :param labels: Labels to add to every metric.
+        """
+        # Write to a temporary file first so that a collector never reads a half-written file
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as fh:
+            fh.write(self.to_prometheus(labels))
+        os.replace(temporary_path, path)
+
+
+class Recorder(object):
+    """
+    A hook that adds up stage events. Use it as a context manager to add and remove the hook.
+    """
+    def __init__(self):
+        self.stages = {}  # type: Dict[str, StageMetrics]
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def __call__(self, event: StageEvent):
+        with self._lock:
+            metrics = self.stages.get(event.stage)
+            if metrics is None:
+                metrics = self.stages[event.stage] = StageMetrics()
+            metrics.add(event)
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc):
+        remove_hook(self)
+
+    def report(self) -> MetricsReport:
+        """
+        Get the metrics recorded so far.
+        """
+        with self._lock:
+            stages = {name: metrics.copy() for name, metrics in self.stages.items()}
+        return MetricsReport(stages, time.perf_counter() - self._start, peak_memory())
@@ -0,0 +1,193 @@
+"""
+Count n-grams in token streams using NumPy.
+
+N-grams are counted one length at a time. Each n-gram is given an integer key built from the key of the
+(n-1)-gram it starts with and the ID of its last token, and keys are renumbered densely after every length
+so that they never overflow.
+"""
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from .vocabulary import TokenStream, Vocabulary
+
+_WORD_CHARACTER_RE = re.compile(r'\w')
+
+
+class NgramCounts(object):
+    """
+    The distinct n-grams of one length in a token stream and how often each occurs, most frequent first.
+    Ties are broken by which n-gram appears first in the stream.
+    """
+    def __init__(self, vocabulary: Vocabulary, ngrams: np.ndarray, counts: np.ndarray, positions: np.ndarray):
+        """
+        :param vocabulary: Vocabulary the token IDs come from.
+        :param ngrams: Array of token IDs with one row per n-gram.
+        :param counts: Number of times each n-gram occurs.
+        :param positions: Position in the token stream of each n-gram's first occurrence.
+        """
+        self.vocabulary = vocabulary
+        self.ngrams = ngrams
+        self.counts = counts
+        self.positions = positions
+
+    @property
+    def n(self) -> int:
+        return self.ngrams.shape[1]
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __iter__(self) -> Iterator[Tuple[Tuple[str, ...], int]]:
+        return iter(self.top())
+
+    def top(self, k: int = None) -> List[Tuple[Tuple[str, ...], int]]:
+        """
+        Get the most frequent n-grams.
+
+        :param k: Number of n-grams to get. Defaults to all of them.
+        :return: List of (n-gram, count) tuples, where each n-gram is a tuple of tokens.
+        """
+        decode = self.vocabulary.decode
+        return [(tuple(decode(ngram)), int(count)) for ngram, count in zip(self.ngrams[:k], self.counts[:k])]
+
+
+def excluded_ids(vocabulary: Vocabulary, exclude: Iterable[str] = None, words_only: bool = False) -> np.ndarray:
+    """
+    Mark which vocabulary entries are excluded from analysis.
+
+    :param vocabulary: The vocabulary.
+    :param exclude: Tokens to exclude.
+    :param words_only: If True, also exclude tokens with no letters or digits, such as punctuation.
+    :return: Boolean array indexed by token ID.
+    """
+    excluded = np.zeros(len(vocabulary), dtype=bool)
+    if words_only:
+        excluded[:] = [not _WORD_CHARACTER_RE.search(token) for token in vocabulary]
+    if exclude:
+        excluded[[vocabulary.id(token) for token in exclude if token in vocabulary]] = True
+    return excluded
+
+
+def invalid_starts(stream: TokenStream, excluded: np.ndarray, cross_scrivenings: bool) -> Iterator[np.ndarray]:
+    """
+    For n = 1, 2, ..., yield a boolean array marking the positions where an n-gram can't start, either
+    because it would contain an excluded token or cross from one scrivening into the next.
+    """
+    invalid = excluded[stream.ids] if len(excluded) else np.zeros(len(stream), dtype=bool)
+    yield invalid
+
+    # Mark the last token of each scrivening, which can't be followed by another token of the same n-gram
+    last_tokens = np.zeros(len(stream), dtype=bool)
+    if not cross_scrivenings and len(stream):
+        last_tokens[stream.offsets[1:-1] - 1] = True
+
+    n = 1
+    while True:
+        n += 1
+        invalid = invalid[:-1] | invalid[1:] | last_tokens[:len(stream) - n + 1]
+        last_tokens = last_tokens[:-1] | last_tokens[1:]
+        yield invalid
+
+
+def iter_ngram_keys(stream: TokenStream, max_n: int, min_n: int = 1, excluded: np.ndarray = None,
+                    cross_scrivenings: bool = False) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Give every n-gram in a token stream a dense integer key, one n-gram length at a time.
+
+    Two n-grams of the same length have the same key if and only if they have the same tokens.
+
+    :param stream: The token stream.
+    :param max_n: Length of the longest n-grams.
+    :param min_n: Length of the shortest n-grams.
+    :param excluded: Boolean array indexed by token ID of tokens that can't be part of an n-gram.
+    :param cross_scrivenings: If True, count n-grams that run from one scrivening into the next.
+    :return: Iterator of (n, keys, counts, first) tuples. keys[i] is the key of the n-gram starting at
+    position i, or -1 if there's no valid n-gram there. counts[key] is the number of times that n-gram occurs
+    and first[key] is the position of its first occurrence.
+    """
+    if excluded is None:
+        excluded = np.zeros(0, dtype=bool)
+
+    ids = stream.ids.astype(np.int64)
+    vocabulary_size = max(len(stream.vocabulary), 1)
+    keys = None
+    for n, invalid in zip(range(1, max_n + 1), invalid_starts(stream, excluded, cross_scrivenings)):
+        if len(invalid) == 0:
+            return
+
+        if keys is None:
+            combined = ids.copy()
+        else:
+            combined = keys[:-1] * vocabulary_size + ids[n - 1:]
+        combined[invalid] = -1
+
+        unique, first, keys, counts = np.unique(combined, return_index=True, return_inverse=True,
+                                                return_counts=True)
+        keys = keys.reshape(-1).astype(np.int64)
+        if len(unique) and unique[0] == -1:
+            # Renumber so that invalid positions are -1 and valid n-grams are numbered from 0
+            keys -= 1
+            first = first[1:]
+            counts = counts[1:]
+
+        if n >= min_n:
+            yield n, keys, counts, first
+
+
+def count_ngrams(stream: TokenStream, max_n: int = 6, min_n: int = 1, min_count: int = 1,
+                 exclude: Iterable[str] = None, words_only: bool = False, cross_scrivenings: bool = False) -> \
+        Dict[int, NgramCounts]:
+    """
+    Count every n-gram in a token stream, for each length from min_n to max_n.
+
+    To count the n-grams of a scrivening and its children or of a whole project, use the token stream from
+    encode_scrivening or encode_project.
+
+    :param stream: The token stream.
+    :param max_n: Length of the longest n-grams to count.
+    :param min_n: Length of the shortest n-grams to count.
+    :param min_count: Leave out n-grams that occur fewer times than this.
+    :param exclude: Tokens that can't be part of an n-gram.
+    :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of an
+    n-gram.
+    :param cross_scrivenings: If True, count n-grams that run from one scrivening into the next.
+    :return: Dictionary of n-gram counts keyed by n-gram length.
+    """
+    if min_n < 1 or max_n < min_n:
+        raise ValueError("Can't count n-grams of lengths {} to {}".format(min_n, max_n))
+
+    excluded = excluded_ids(stream.vocabulary, exclude, words_only)
+    results = {}
+    for n, keys, counts, first in iter_ngram_keys(stream, max_n, min_n, excluded, cross_scrivenings):
+        selected = np.flatnonzero(counts >= min_count)
+        order = np.lexsort((first[selected], -counts[selected]))
+        selected = selected[order]
+        positions = first[selected]
+
+        ngrams = stream.ids[positions[:, np.newaxis] + np.arange(n)] if len(positions) else \
+            np.zeros((0, n), dtype=np.uint32)
+        results[n] = NgramCounts(stream.vocabulary, ngrams, counts[selected].astype(np.int64), positions)
+
+    for n in range(min_n, max_n + 1):
+        if n not in results:
+            results[n] = NgramCounts(stream.vocabulary, np.zeros((0, n), dtype=np.uint32),
+                                     np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    return results
+
+
+def top_ngrams(stream: TokenStream, max_n: int = 6, k: int = 20, min_n: int = 1, **kwargs) -> \
+        Dict[int, List[Tuple[Tuple[str, ...], int]]]:
+    """
+    Find the most frequent n-grams in a token stream for each length from min_n to max_n.
+
+    :param stream: The token stream.
+    :param max_n: Length of the longest n-grams.
+    :param k: Number of n-grams of each length to return.
+    :param min_n: Length of the shortest n-grams.
+    :param kwargs: Other arguments to count_ngrams.
+    :return: Dictionary keyed by n-gram length of lists of (n-gram, count) tuples, most frequent first.
+    """
+    return {n: counts.top(k) for n, counts in count_ngrams(stream, max_n, min_n, **kwargs).items()}
@@ -0,0 +1,200 @@
+"""
+Normalize tokens, such as by stemming or lemmatizing them, so that variants like "walked" and "walking"
+are counted together.
+
+Stemmers and lemmatizers are slow, and a manuscript uses the same words over and over, so normalization
+works on distinct tokens: each token is normalized once and remembered in a bounded least-recently-used
+cache that can be saved between runs, and token streams are normalized through their vocabularies.
+"""
+import json
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from .vocabulary import TokenStream, Vocabulary
+
+# Bump when the saved format changes so that old caches are ignored rather than misread
+_FORMAT_VERSION = 1
+
+
+def _porter() -> Callable[[str], str]:
+    from nltk.stem import PorterStemmer
+    return PorterStemmer().stem
+
+
+def _snowball() -> Callable[[str], str]:
+    from nltk.stem import SnowballStemmer
+    return SnowballStemmer('english').stem
+
+
+def _lancaster() -> Callable[[str], str]:
+    from nltk.stem import LancasterStemmer
+    return LancasterStemmer().stem
+
+
+def _wordnet() -> Callable[[str], str]:
+    # Needs the wordnet corpus from nltk
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer().lemmatize
+
+
+def _casefold() -> Callable[[str], str]:
+    return str.casefold
+
+
+# Functions that create each named normalization step. nltk is only imported when a step that needs it is
+# used.
+STEPS = {
+    'casefold': _casefold,
+    'porter': _porter,
+    'snowball': _snowball,
+    'lancaster': _lancaster,
+    'wordnet': _wordnet,
+}
+
+# A normalization step: the name of one in STEPS, a (name, function) tuple, or an unnamed function
+_Step = Union[str, Tuple[str, Callable[[str], str]], Callable[[str], str]]
+
+
+class Normalizer(object):
+    """
+    A pipeline of normalization steps with a cache of the tokens it's normalized.
+    """
+    def __init__(self, steps: Sequence[_Step] = ('casefold', 'porter'), max_size: int = 100000, path: str = None):
+        """
+        :param steps: The steps to apply in order, each either the name of a step in STEPS, a (name, function)
+        tuple of a function from token to normalized token, or just the function. A saved cache is only used
+        by a normalizer with steps of the same names, so a function's name should change when what it does
+        does.
+        :param max_size: Most tokens to keep in the cache. The least recently used are dropped first.
+        :param path: Path to save the cache to. If the file exists and was saved by a normalizer with the same
+        steps, the cache starts with its contents. Every step must have a name.
+        """
+        if max_size < 1:
+            raise ValueError("The cache must hold at least 1 token, not {}".format(max_size))
+
+        self.names = []
+        self._steps = []
+        for step in steps:
+            if isinstance(step, str):
+                try:
+                    self._steps.append(STEPS[step]())
+                except KeyError:
+                    raise ValueError("Unknown normalization step {}; expected one of {}".format(
+                        step, ", ".join(sorted(STEPS)))) from None
+                self.names.append(step)
+            elif isinstance(step, tuple):
+                name, function = step
+                if name in STEPS:
+                    raise ValueError("Custom normalization steps can't be named {}, like a built-in step".format(
+                        name))
+                self._steps.append(function)
+                self.names.append(name)
+            else:
+                # Functions' own names, like <lambda>, don't tell them apart, so a cache of an unnamed step
+                # can't be saved
+                if path is not None:
+                    raise ValueError("Custom normalization steps need a name to save their cache; pass them as "
+                                     "(name, function) tuples")
+                self._steps.append(step)
+                self.names.append(None)
+
+        self.max_size = max_size
+        self.path = path
+        self.hits = self.misses = 0
+        self._cache = OrderedDict()  # type: Dict[str, str]
+        if path is not None:
+            self._load(path)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __call__(self, token: str) -> str:
+        """
+        Normalize a token.
+        """
+        cache = self._cache
+        try:
+            normalized = cache[token]
+        except KeyError:
+            pass
+        else:
+            cache.move_to_end(token)
+            self.hits += 1
+            return normalized
+
+        self.misses += 1
+        normalized = token
+        for step in self._steps:
+            normalized = step(normalized)
+        cache[token] = normalized
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+        return normalized
+
+    def map_vocabulary(self, vocabulary: Vocabulary) -> Tuple[Vocabulary, np.ndarray]:
+        """
+        Normalize every token in a vocabulary.
+
+        :param vocabulary: The vocabulary.
+        :return: Tuple of the vocabulary of normalized tokens and an array that converts the vocabulary's IDs
+        to the normalized vocabulary's IDs.
+        """
+        return vocabulary.map(self)
+
+    def normalize_stream(self, stream: TokenStream) -> TokenStream:
+        """
+        Normalize every token in a token stream. Each distinct token is normalized once, and the stream's IDs
+        are converted with a single array lookup.
+
+        :param stream: The token stream.
+        :return: View of the stream with normalized tokens.
+        """
+        return stream.view(self)
+
+    def normalize_tokens(self, tokens: Iterable[str]) -> List[str]:
+        """
+        Normalize a list of tokens, such as from tokenize_scrivening.
+
+        :param tokens: The tokens.
+        :return: List of normalized tokens.
+        """
+        vocabulary = Vocabulary()
+        ids = vocabulary.encode(tokens)
+        normalized, mapping = vocabulary.map(self)
+        return normalized.decode(mapping[ids])
+
+    def _load(self, path: str):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                saved = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return
+        if saved.get('version') != _FORMAT_VERSION or saved.get('steps') != self.names:
+            return
+        # Entries are saved least recently used first, so the most recent survive if max_size is smaller
+        for token, normalized in saved['entries'][-self.max_size:]:
+            self._cache[token] = normalized
+
+    def save(self, path: str = None):
+        """
+        Save the cache.
+
+        :param path: Path of the file to save to. Defaults to the path the normalizer was created with.
+        """
+        if path is None:
+            path = self.path
+        if path is None:
+            raise ValueError("No path to save the normalization cache to")
+        if None in self.names:
+            raise ValueError("Custom normalization steps need a name to save their cache; pass them as "
+                             "(name, function) tuples")
+
+        saved = {'version': _FORMAT_VERSION, 'steps': self.names, 'entries': list(self._cache.items())}
+        # Write to a temporary file first so that an interrupted save doesn't destroy the old cache
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as fh:
+            json.dump(saved, fh, ensure_ascii=False)
+        os.replace(temporary_path, path)
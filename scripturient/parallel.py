@@ -0,0 +1,218 @@
+"""
+Tokenize scrivenings across a pool of worker processes.
+"""
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from pyth.plugins.rtf15.reader import Rtf15Reader
+from .plaintextify import Plaintextifier
+from .scrivener import Scrivening, ScrivenerProject, TaggedToken, SentenceBuffer, iter_tokens, rebase_segments, \
+    tag_sentence, flatten_scrivenings
+from .tokenizers import Tokenizer, get_tokenizer
+
+# Paragraphs of already-loaded text are sent to the workers in batches of this size
+DEFAULT_BATCH_SIZE = 200
+# Shards in flight per worker process. More keeps the workers busy; fewer holds fewer results in memory.
+SHARDS_PER_JOB = 2
+
+
+def _get_shards(scrivenings: List[Scrivening], batch_size: int) -> \
+        Iterator[Tuple[object, str, int, Optional[List[str]]]]:
+    """
+    Split scrivenings into units of work for the worker processes.
+
+    Scrivenings whose text hasn't been loaded are sent as a file path so that the workers parse the RTF.
+    Loaded text is sent in batches of paragraphs.
+
+    :return: Iterator of (scrivening ID, file path, index of first paragraph, paragraphs or None) tuples.
+    """
+    for scrivening in scrivenings:
+        paragraphs = scrivening.loaded_paragraphs()
+        if not paragraphs:
+            yield scrivening.id, scrivening.file_path, 0, None
+            continue
+
+        for first in range(0, len(paragraphs), batch_size):
+            yield scrivening.id, scrivening.file_path, first, paragraphs[first:first + batch_size]
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer: Tokenizer):
+    # Load the tokenizer's models once per worker rather than once per shard
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+    _worker_tokenizer.load()
+
+
+def _tokenize_shard(shard: Tuple[object, str, int, Optional[List[str]]]):
+    """
+    Tokenize one shard in a worker process.
+
+    Sentences at the edges of a shard may run into its neighbors, so the shard's first and last sentences
+    are returned as raw text for the parent process to re-split once it knows what surrounds them.
+
+    :param shard: The shard to tokenize, as returned by _get_shards.
+    :return: None if the shard has no text. Otherwise a (head, middle, tail) tuple, where head and tail are
+    (text, segments) pieces and middle is a list of sentences of (token, scrivening ID, paragraph, start,
+    end) tuples. If the shard holds less than two sentences, middle and tail are None and head is the whole
+    shard.
+    """
+    scrivening_id, file_path, first, paragraphs = shard
+    if paragraphs is None:
+        try:
+            with open(file_path, 'rb') as fh:
+                paragraphs = Plaintextifier.convert(Rtf15Reader.read(fh))
+        except FileNotFoundError:
+            return None
+    if not paragraphs:
+        return None
+
+    buffer = SentenceBuffer(_worker_tokenizer)
+    for index, paragraph in enumerate(paragraphs):
+        if index:
+            buffer.add('\n')
+        buffer.add(paragraph, [(0, scrivening_id, first + index, 0)])
+
+    sentences = buffer.pop_sentences()
+    if not sentences:
+        return buffer.pop_raw(), None, None
+
+    head_text, head_offset, head_segments = sentences[0]
+    middle = [[tuple(token[:-1]) for token in tag_sentence(sentence, offset, segments, 0, _worker_tokenizer)]
+              for sentence, offset, segments in sentences[1:]]
+    head_segments = [segment for segment in rebase_segments(head_segments, head_offset)
+                     if segment[0] < len(head_text)]
+    return (head_text, head_segments), middle, buffer.pop_raw()
+
+
+def _merge_shards(results, tokenizer: Tokenizer) -> Iterator[TaggedToken]:
+    """
+    Stitch tokenized shards back together in compile order, re-splitting the sentences at their edges.
+    """
+    buffer = SentenceBuffer(tokenizer)
+    sentence_index = 0
+    started = False
+
+    for result in results:
+        if result is None:
+            continue
+        head, middle, tail = result
+
+        if started:
+            buffer.add('\n')
+        started = True
+        buffer.add(*head)
+
+        if middle is None:
+            for sentence, offset, segments in buffer.pop_sentences():
+                yield from tag_sentence(sentence, offset, segments, sentence_index, tokenizer)
+                sentence_index += 1
+            continue
+
+        # The break after the head sentence was decided by the worker and can't change
+        for sentence, offset, segments in buffer.pop_all():
+            yield from tag_sentence(sentence, offset, segments, sentence_index, tokenizer)
+            sentence_index += 1
+        for sentence in middle:
+            for token in sentence:
+                yield TaggedToken(*token, sentence_index)
+            sentence_index += 1
+        buffer.add(*tail)
+
+    for sentence, offset, segments in buffer.pop_all():
+        yield from tag_sentence(sentence, offset, segments, sentence_index, tokenizer)
+        sentence_index += 1
+
+
+def _iter_results(executor: Executor, shards: Iterable, window: int) -> Iterator:
+    """
+    Tokenize shards in the executor, in order, with at most window shards submitted at a time. Shards that
+    haven't started are cancelled if the iterator is closed early.
+    """
+    pending = deque()
+    shards = iter(shards)
+    try:
+        for shard in shards:
+            pending.append(executor.submit(_tokenize_shard, shard))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _iter_tokens_parallel(scrivenings: List[Scrivening], jobs: Optional[int], recursive: bool, batch_size: int,
+                          tokenizer: Union[str, Tokenizer]) -> Iterator[TaggedToken]:
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs < 1:
+        raise ValueError("The number of jobs must be at least 1, not {}".format(jobs))
+
+    tokenizer = get_tokenizer(tokenizer)
+    if jobs == 1:
+        yield from iter_tokens(scrivenings, recursive, tokenizer)
+        return
+
+    shards = _get_shards(flatten_scrivenings(scrivenings, recursive), batch_size)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(tokenizer,)) as executor:
+        results = _iter_results(executor, shards, SHARDS_PER_JOB * jobs)
+        try:
+            yield from _merge_shards(results, tokenizer)
+        finally:
+            # Cancel the shards still waiting so that leaving the executor doesn't wait for them
+            results.close()
+
+
+def iter_scrivening_tokens_parallel(scrivening: Scrivening, jobs: int = None, recursive: bool = True,
+                                    batch_size: int = DEFAULT_BATCH_SIZE,
+                                    tokenizer: Union[str, Tokenizer] = None) -> Iterator[TaggedToken]:
+    """
+    Tokenize a scrivening using a pool of worker processes.
+
+    Work is split by scrivening, or by batches of paragraphs for scrivenings whose text is already loaded.
+    The tokens are the same, and in the same order, as those from iter_scrivening_tokens.
+
+    :param scrivening: The scrivening to tokenize.
+    :param jobs: Number of worker processes. Defaults to the number of CPUs. If 1, tokenize in this process.
+    :param recursive: If True, include the scrivening's children.
+    :param batch_size: Number of paragraphs of already-loaded text to send to a worker at a time.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: Iterator of tagged tokens in compile order.
+    """
+    return _iter_tokens_parallel([scrivening], jobs, recursive, batch_size, tokenizer)
+
+
+def iter_project_tokens_parallel(project: ScrivenerProject, jobs: int = None,
+                                 batch_size: int = DEFAULT_BATCH_SIZE,
+                                 tokenizer: Union[str, Tokenizer] = None) -> Iterator[TaggedToken]:
+    """
+    Tokenize all of a project's scrivenings using one pool of worker processes.
+
+    The tokens are the same, and in the same order, as those encode_project tokenizes.
+
+    :param project: The project to tokenize.
+    :param jobs: Number of worker processes. Defaults to the number of CPUs. If 1, tokenize in this process.
+    :param batch_size: Number of paragraphs of already-loaded text to send to a worker at a time.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: Iterator of tagged tokens in compile order.
+    """
+    return _iter_tokens_parallel(project.scrivenings, jobs, True, batch_size, tokenizer)
+
+
+def tokenize_scrivening_parallel(scrivening: Scrivening, jobs: int = None,
+                                 tokenizer: Union[str, Tokenizer] = None) -> List[str]:
+    """
+    Tokenize a scrivening and its children using a pool of worker processes.
+
+    :param scrivening: The scrivening to tokenize.
+    :param jobs: Number of worker processes. Defaults to the number of CPUs.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: The same tokens as tokenize_scrivening.
+    """
+    return [tagged.token for tagged in iter_scrivening_tokens_parallel(scrivening, jobs, tokenizer=tokenizer)]
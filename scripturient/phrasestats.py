@@ -0,0 +1,195 @@
+"""
+Phrase counts for a whole project that are kept up to date one scrivening at a time.
+
+Every scrivening's phrase counts are stored as a sparse vector over global phrase IDs, and the project
+totals are the sum of those vectors. When a scrivening changes, its old vector is subtracted from the
+totals and its new one added, so an update only tokenizes and counts the changed scrivening. Phrases don't
+cross scrivenings, which is what makes each scrivening's contribution independent of the others.
+
+Each scrivening is tokenized on its own, so where a sentence runs from one scrivening into the next, the
+counts can differ slightly from count_ngrams over the whole project's token stream. verify() recounts the
+project from scratch the same way, which the running totals always equal.
+"""
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from .ngrams import excluded_ids, iter_ngram_keys
+from .scrivener import Scrivening, ScrivenerProject, iter_tokens, flatten_scrivenings, scrivening_mtime
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import Vocabulary, encode_tokens
+
+
+class PhraseStatistics(object):
+    """
+    Counts of every phrase of each length from min_n to max_n in a project, updated per scrivening.
+    """
+    def __init__(self, max_n: int = 4, min_n: int = 1, words_only: bool = False, fold_case: bool = True,
+                 tokenizer: Union[str, Tokenizer] = None):
+        """
+        :param max_n: Length of the longest phrases to count.
+        :param min_n: Length of the shortest phrases to count.
+        :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of a
+        phrase.
+        :param fold_case: If True, ignore case.
+        :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+        """
+        if min_n < 1 or max_n < min_n:
+            raise ValueError("Can't count phrases of lengths {} to {}".format(min_n, max_n))
+        self.min_n = min_n
+        self.max_n = max_n
+        self.words_only = words_only
+        self.fold_case = fold_case
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.vocabulary = Vocabulary()
+
+        lengths = range(min_n, max_n + 1)
+        # Global phrase IDs of each length, keyed by their token IDs, and the reverse
+        self._phrase_ids = {n: {} for n in lengths}  # type: Dict[int, Dict[Tuple[int, ...], int]]
+        self._phrases = {n: [] for n in lengths}  # type: Dict[int, List[Tuple[int, ...]]]
+        self._totals = {n: np.zeros(0, dtype=np.int64) for n in lengths}
+        # Each scrivening's file mtime and its (phrase IDs, counts) for each length
+        self._contributions = {}  # type: Dict[object, Tuple[int, Dict[int, Tuple[np.ndarray, np.ndarray]]]]
+        self._excluded = np.zeros(0, dtype=bool)
+
+    def _excluded_ids(self) -> np.ndarray:
+        # Only look at tokens added since the last update
+        if len(self._excluded) < len(self.vocabulary):
+            new_tokens = Vocabulary(self.vocabulary.decode(np.arange(len(self._excluded), len(self.vocabulary))))
+            self._excluded = np.concatenate((self._excluded, excluded_ids(new_tokens, words_only=self.words_only)))
+        return self._excluded
+
+    def _count(self, scrivening: Scrivening) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Count the phrases in one scrivening, not including its children.
+
+        :return: Dictionary keyed by phrase length of (global phrase IDs, counts) tuples.
+        """
+        tagged_tokens = iter_tokens([scrivening], False, self.tokenizer)
+        if self.fold_case:
+            tagged_tokens = (tagged._replace(token=tagged.token.casefold()) for tagged in tagged_tokens)
+        stream = encode_tokens(tagged_tokens, self.vocabulary)
+
+        contribution = {}
+        for n, keys, counts, first in iter_ngram_keys(stream, self.max_n, self.min_n, self._excluded_ids()):
+            phrase_ids = self._phrase_ids[n]
+            phrases = self._phrases[n]
+            ngrams = stream.ids[first[:, np.newaxis] + np.arange(n)] if len(first) else np.zeros((0, n))
+            ids = np.empty(len(first), dtype=np.int64)
+            for index, ngram in enumerate(map(tuple, ngrams.tolist())):
+                try:
+                    ids[index] = phrase_ids[ngram]
+                except KeyError:
+                    ids[index] = phrase_ids[ngram] = len(phrases)
+                    phrases.append(ngram)
+            contribution[n] = (ids, counts.astype(np.int64))
+        return contribution
+
+    def _apply(self, contribution: Dict[int, Tuple[np.ndarray, np.ndarray]], sign: int):
+        for n, (ids, counts) in contribution.items():
+            totals = self._totals[n]
+            if len(totals) < len(self._phrases[n]):
+                totals = self._totals[n] = np.concatenate(
+                    (totals, np.zeros(max(len(self._phrases[n]), 2 * len(totals)) - len(totals), dtype=np.int64)))
+            # Phrase IDs within a contribution are distinct, so fancy indexing adds each count once
+            totals[ids] += sign * counts
+
+    def update_scrivening(self, scrivening: Scrivening, mtime: int = None):
+        """
+        Replace a scrivening's contribution to the totals with its current text, whether or not it changed.
+
+        :param scrivening: The scrivening. Its children aren't updated.
+        :param mtime: Modification time of the scrivening's file to record. Defaults to reading it.
+        """
+        if mtime is None:
+            mtime = scrivening_mtime(scrivening)
+        self.remove_scrivening(scrivening.id)
+        contribution = self._count(scrivening)
+        self._apply(contribution, 1)
+        self._contributions[scrivening.id] = (mtime, contribution)
+
+    def remove_scrivening(self, scrivening_id):
+        """
+        Subtract a scrivening's contribution from the totals.
+
+        :param scrivening_id: ID of the scrivening. Does nothing if it hasn't been counted.
+        """
+        try:
+            _, contribution = self._contributions.pop(scrivening_id)
+        except KeyError:
+            return
+        self._apply(contribution, -1)
+
+    def update(self, project: ScrivenerProject) -> int:
+        """
+        Bring the counts up to date with a project, recounting only scrivenings whose files have changed.
+
+        :param project: The project.
+        :return: Number of scrivenings counted or removed.
+        """
+        scrivenings = flatten_scrivenings(project.scrivenings, True)
+        changed = 0
+        for scrivening in scrivenings:
+            mtime = scrivening_mtime(scrivening)
+            counted = self._contributions.get(scrivening.id)
+            if counted is None or counted[0] != mtime:
+                self.update_scrivening(scrivening, mtime)
+                changed += 1
+
+        for scrivening_id in set(self._contributions) - {scrivening.id for scrivening in scrivenings}:
+            self.remove_scrivening(scrivening_id)
+            changed += 1
+        return changed
+
+    def count(self, phrase: Iterable[str]) -> int:
+        """
+        Get the total count of a phrase.
+
+        :param phrase: The phrase's tokens.
+        :return: Number of times the phrase occurs.
+        """
+        tokens = [token.casefold() for token in phrase] if self.fold_case else list(phrase)
+        phrase_ids = self._phrase_ids.get(len(tokens), {})
+        try:
+            return int(self._totals[len(tokens)][phrase_ids[tuple(self.vocabulary.id(token) for token in tokens)]])
+        except KeyError:
+            return 0
+
+    def counts(self, n: int) -> Dict[Tuple[str, ...], int]:
+        """
+        Get the total count of every phrase of one length.
+
+        :param n: The phrase length.
+        :return: Dictionary of counts keyed by phrase, leaving out phrases that no longer occur.
+        """
+        totals = self._totals[n]
+        decode = self.vocabulary.decode
+        return {tuple(decode(self._phrases[n][phrase_id])): int(totals[phrase_id])
+                for phrase_id in np.flatnonzero(totals).tolist()}
+
+    def top(self, n: int, k: int = 20) -> List[Tuple[Tuple[str, ...], int]]:
+        """
+        Get the most frequent phrases of one length.
+
+        :param n: The phrase length.
+        :param k: Number of phrases to get.
+        :return: List of (phrase, count) tuples, most frequent first. Ties are broken by which phrase was
+        counted first.
+        """
+        totals = self._totals[n]
+        phrase_ids = np.flatnonzero(totals)
+        phrase_ids = phrase_ids[np.lexsort((phrase_ids, -totals[phrase_ids]))][:k]
+        decode = self.vocabulary.decode
+        return [(tuple(decode(self._phrases[n][phrase_id])), int(totals[phrase_id]))
+                for phrase_id in phrase_ids.tolist()]
+
+    def verify(self, project: ScrivenerProject) -> bool:
+        """
+        Check the running totals against a full recount of the project.
+
+        :param project: The project.
+        :return: True if every phrase count matches the recount.
+        """
+        recount = PhraseStatistics(self.max_n, self.min_n, self.words_only, self.fold_case, self.tokenizer)
+        recount.update(project)
+        return all(self.counts(n) == recount.counts(n) for n in self._totals)
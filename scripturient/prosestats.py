@@ -0,0 +1,273 @@
+"""
+Prose statistics from one pass over each scrivening's tokens: sentence and paragraph lengths, how much of
+the text is dialogue, and readability scores, per scrivening and per binder subtree, plus pacing curves
+across the manuscript.
+
+Each scrivening is tokenized once, on its own, and everything is computed from its token stream with array
+operations. The results are cached per scrivening and recomputed only when its file changes.
+"""
+import re
+from typing import Dict, Iterable, List, Union
+import weakref
+
+import numpy as np
+
+from . import instrument
+from .scrivener import Scrivening, ScrivenerProject, iter_tokens, flatten_scrivenings, scrivening_mtime
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import TokenStream, Vocabulary, encode_tokens
+
+# Quote tokens that open and close dialogue. The tokenizers rewrite straight double quotes as `` and ''.
+_OPENING_QUOTES = frozenset(('``', '“'))
+_CLOSING_QUOTES = frozenset(("''", '”'))
+
+_WORD_RE = re.compile(r'\w')
+_VOWEL_GROUP_RE = re.compile(r'[aeiouy]+')
+
+PACING_MEASURES = ('sentence_length', 'dialogue')
+
+
+def _is_word(token: str) -> bool:
+    # Clitics split off by the tokenizers, like 's and n't, are part of the word before them
+    return bool(_WORD_RE.search(token)) and not token.startswith("'") and token.casefold() != "n't"
+
+
+def _syllables(token: str) -> int:
+    """
+    Estimate the number of syllables in a word by counting its groups of vowels.
+    """
+    word = token.casefold()
+    count = len(_VOWEL_GROUP_RE.findall(word))
+    # A final e is usually silent, except in endings like -le
+    if count > 1 and word.endswith('e') and not word.endswith(('le', 'ee', 'ye')):
+        count -= 1
+    return max(count, 1)
+
+
+class ProseStats(object):
+    """
+    Prose statistics of a scrivening or a group of scrivenings.
+    """
+    def __init__(self, sentence_lengths: np.ndarray, sentence_dialogue: np.ndarray, paragraph_lengths: np.ndarray,
+                 syllables: int):
+        """
+        :param sentence_lengths: Number of words in each sentence, in order. Sentences with no words, such as
+        a line of asterisks, are left out.
+        :param sentence_dialogue: Number of each sentence's words that are in dialogue.
+        :param paragraph_lengths: Number of words in each paragraph that has any.
+        :param syllables: Estimated total number of syllables.
+        """
+        self.sentence_lengths = sentence_lengths
+        self.sentence_dialogue = sentence_dialogue
+        self.paragraph_lengths = paragraph_lengths
+        self.syllables = syllables
+
+    @classmethod
+    def from_stream(cls, stream: TokenStream) -> 'ProseStats':
+        """
+        Compute the statistics of a token stream.
+
+        :param stream: The token stream.
+        """
+        vocabulary = stream.vocabulary
+        words = np.array([_is_word(token) for token in vocabulary], dtype=bool)
+        syllables = np.array([_syllables(token) if word else 0 for token, word in zip(vocabulary, words)],
+                             dtype=np.int64)
+        opening = np.array([token in _OPENING_QUOTES for token in vocabulary], dtype=np.int64)
+        closing = np.array([token in _CLOSING_QUOTES for token in vocabulary], dtype=np.int64)
+        if not len(stream):
+            return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0)
+
+        ids = stream.ids
+        is_word = words[ids]
+
+        # Label each position with its paragraph
+        new_paragraph = np.ones(len(stream), dtype=bool)
+        new_paragraph[1:] = stream.paragraphs[1:] != stream.paragraphs[:-1]
+        new_paragraph[stream.offsets[:-1]] = True
+        paragraph_labels = np.cumsum(new_paragraph) - 1
+
+        # A token is in dialogue if more quotes have opened than closed before it in its paragraph
+        depth = np.cumsum(opening[ids] - closing[ids])
+        depth -= (depth - opening[ids] + closing[ids])[new_paragraph][paragraph_labels]
+        in_dialogue = is_word & (depth > 0)
+
+        sentence_starts = stream.sentence_offsets[:-1]
+        sentence_lengths = np.add.reduceat(is_word.astype(np.int64), sentence_starts)
+        sentence_dialogue = np.add.reduceat(in_dialogue.astype(np.int64), sentence_starts)
+        paragraph_lengths = np.bincount(paragraph_labels, weights=is_word).astype(np.int64)
+
+        has_words = sentence_lengths > 0
+        return cls(sentence_lengths[has_words], sentence_dialogue[has_words],
+                   paragraph_lengths[paragraph_lengths > 0], int(syllables[ids].sum()))
+
+    @classmethod
+    def combine(cls, stats: Iterable['ProseStats']) -> 'ProseStats':
+        """
+        Combine the statistics of several parts of the manuscript, such as the scrivenings in a chapter.
+
+        :param stats: The statistics of each part, in compile order.
+        """
+        stats = list(stats)
+        if not stats:
+            return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0)
+        return cls(np.concatenate([part.sentence_lengths for part in stats]),
+                   np.concatenate([part.sentence_dialogue for part in stats]),
+                   np.concatenate([part.paragraph_lengths for part in stats]),
+                   sum(part.syllables for part in stats))
+
+    @property
+    def words(self) -> int:
+        return int(self.sentence_lengths.sum())
+
+    @property
+    def sentences(self) -> int:
+        return len(self.sentence_lengths)
+
+    @property
+    def paragraphs(self) -> int:
+        return len(self.paragraph_lengths)
+
+    @property
+    def dialogue_ratio(self) -> float:
+        """
+        Fraction of words that are in dialogue.
+        """
+        return int(self.sentence_dialogue.sum()) / self.words if self.words else 0.0
+
+    @property
+    def mean_sentence_length(self) -> float:
+        return self.words / self.sentences if self.sentences else 0.0
+
+    @property
+    def mean_paragraph_length(self) -> float:
+        return self.words / self.paragraphs if self.paragraphs else 0.0
+
+    @property
+    def flesch_reading_ease(self) -> float:
+        """
+        Flesch reading ease: higher is easier, and most fiction scores between 70 and 90.
+        """
+        if not self.words:
+            return 0.0
+        return 206.835 - 1.015 * self.mean_sentence_length - 84.6 * self.syllables / self.words
+
+    @property
+    def flesch_kincaid_grade(self) -> float:
+        """
+        Flesch-Kincaid grade level: roughly the US school grade needed to follow the text.
+        """
+        if not self.words:
+            return 0.0
+        return 0.39 * self.mean_sentence_length + 11.8 * self.syllables / self.words - 15.59
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Get the totals, averages and readability scores as a dictionary, such as for a report.
+        """
+        return {
+            'words': self.words,
+            'sentences': self.sentences,
+            'paragraphs': self.paragraphs,
+            'syllables': self.syllables,
+            'dialogue_ratio': self.dialogue_ratio,
+            'mean_sentence_length': self.mean_sentence_length,
+            'mean_paragraph_length': self.mean_paragraph_length,
+            'flesch_reading_ease': self.flesch_reading_ease,
+            'flesch_kincaid_grade': self.flesch_kincaid_grade,
+        }
+
+    def sentence_length_histogram(self, max_length: int = 60) -> np.ndarray:
+        """
+        Count the sentences of each length.
+
+        :param max_length: Longest length to count separately. Longer sentences are counted as this long.
+        :return: Array of the number of sentences of each length from 0 to max_length.
+        """
+        return np.bincount(np.minimum(self.sentence_lengths, max_length), minlength=max_length + 1)
+
+    def pacing_curve(self, window: int = 50, measure: str = 'sentence_length') -> np.ndarray:
+        """
+        Follow how the prose changes through the text with a rolling average over sentences.
+
+        :param window: Number of sentences to average over.
+        :param measure: 'sentence_length' for the mean number of words per sentence, or 'dialogue' for the
+        fraction of words in dialogue.
+        :return: Array with the average over each run of window consecutive sentences. If there are fewer
+        sentences than that, the array is empty.
+        """
+        if window < 1:
+            raise ValueError("The window must be at least 1 sentence, not {}".format(window))
+        if len(self.sentence_lengths) < window:
+            return np.zeros(0)
+
+        kernel = np.ones(window)
+        words = np.convolve(self.sentence_lengths, kernel, mode='valid')
+        if measure == 'sentence_length':
+            return words / window
+        if measure == 'dialogue':
+            return np.convolve(self.sentence_dialogue, kernel, mode='valid') / words
+        raise ValueError("Unknown measure {}; expected one of {}".format(measure, ", ".join(PACING_MEASURES)))
+
+
+# Prose statistics of each scrivening keyed by tokenizer name, along with the file mtime they were computed at.
+# Entries go away with their scrivenings.
+_stats_cache = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary[Scrivening, Dict[str, tuple]]
+
+
+def scrivening_stats(scrivening: Scrivening, tokenizer: Union[str, Tokenizer] = None) -> ProseStats:
+    """
+    Get the prose statistics of a scrivening, not including its children. They're cached until the
+    scrivening's file changes.
+
+    :param scrivening: The scrivening.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: The statistics.
+    """
+    tokenizer = get_tokenizer(tokenizer)
+    mtime = scrivening_mtime(scrivening)
+    cache = _stats_cache.setdefault(scrivening, {})
+    cached = cache.get(tokenizer.name)
+    if cached is not None and cached[0] == mtime:
+        instrument.cache_hit('prose_stats')
+        return cached[1]
+
+    instrument.cache_miss('prose_stats')
+    stats = ProseStats.from_stream(encode_tokens(iter_tokens([scrivening], False, tokenizer), Vocabulary()))
+    cache[tokenizer.name] = (mtime, stats)
+    return stats
+
+
+def subtree_stats(scrivening: Scrivening, tokenizer: Union[str, Tokenizer] = None) -> ProseStats:
+    """
+    Get the prose statistics of a scrivening and its children, such as a chapter.
+
+    :param scrivening: The scrivening.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: The combined statistics.
+    """
+    return ProseStats.combine(scrivening_stats(part, tokenizer) for part in flatten_scrivenings([scrivening], True))
+
+
+def project_stats(project: ScrivenerProject, tokenizer: Union[str, Tokenizer] = None) -> ProseStats:
+    """
+    Get the prose statistics of a whole project. Sentences are in compile order, so the pacing curve runs
+    through the whole manuscript.
+
+    :param project: The project.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: The combined statistics.
+    """
+    return ProseStats.combine(scrivening_stats(scrivening, tokenizer)
+                              for scrivening in flatten_scrivenings(project.scrivenings, True))
+
+
+def binder_stats(scrivenings: Iterable[Scrivening], tokenizer: Union[str, Tokenizer] = None) -> List[ProseStats]:
+    """
+    Get the prose statistics of each of several binder nodes, such as from get_binder_level.
+
+    :param scrivenings: The scrivenings, each counted along with its children.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: List of the statistics of each node.
+    """
+    return [subtree_stats(scrivening, tokenizer) for scrivening in scrivenings]
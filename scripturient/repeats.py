@@ -0,0 +1,167 @@
+"""
+Find phrases that are repeated anywhere in a manuscript using a suffix array.
+
+The suffix array is built over the token IDs of a token stream, with a unique separator between
+scrivenings so that no phrase runs from one scrivening into the next. It's built by prefix doubling: each
+round sorts the suffixes by their first 2^k tokens with np.unique, which is O(n log n), and the number of
+rounds is the log of the longest repeated phrase. The LCP array is then computed from the ranks kept from
+each round, so that no step loops over the tokens in Python.
+"""
+from collections import namedtuple
+from typing import Iterator, List, Tuple, Union
+
+import numpy as np
+
+from .scrivener import ScrivenerProject
+from .tokenizers import Tokenizer
+from .vocabulary import TokenStream, encode_project
+
+RepeatedPhrase = namedtuple('RepeatedPhrase', ['tokens', 'count', 'occurrences'])
+RepeatedPhrase.__doc__ = """
+A phrase that appears more than once. occurrences is a list of (scrivening ID, token offset) tuples, where
+the token offset is counted from the start of the scrivening's tokens.
+"""
+
+
+class SuffixArray(object):
+    """
+    Suffix array and LCP array of a token stream.
+
+    suffixes[i] is the position in the separated sequence of the i-th smallest suffix, and lcp[i] is the
+    number of tokens that suffix shares with the one before it (lcp[0] is 0).
+    """
+    def __init__(self, stream: TokenStream):
+        self.stream = stream
+
+        # Separate scrivenings with IDs that don't appear anywhere else in the sequence
+        scrivening_count = len(stream.scrivening_ids)
+        separators = np.asarray(stream.offsets[1:-1], dtype=np.int64)
+        self.sequence = np.insert(stream.ids.astype(np.int64), separators,
+                                  len(stream.vocabulary) + np.arange(max(scrivening_count - 1, 0)))
+        # Position in the sequence of each scrivening's first token
+        self.starts = np.asarray(stream.offsets[:-1], dtype=np.int64) + np.arange(scrivening_count)
+
+        self.suffixes, ranks = self._sort_suffixes(self.sequence)
+        self.lcp = self._longest_common_prefixes(self.suffixes, ranks)
+
+    @staticmethod
+    def _sort_suffixes(sequence: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """
+        Sort suffixes by prefix doubling.
+
+        :return: The suffix array, and the rank of every suffix's first 2^k tokens for each round k.
+        """
+        length = len(sequence)
+        ranks = [np.unique(sequence, return_inverse=True)[1].reshape(-1).astype(np.int32)]
+        width = 1
+        while length and ranks[-1].max() < length - 1:
+            rank = ranks[-1].astype(np.int64)
+            following = np.full(length, -1, dtype=np.int64)
+            following[:length - width] = rank[width:]
+            ranks.append(np.unique(rank * (length + 1) + following + 1,
+                                   return_inverse=True)[1].reshape(-1).astype(np.int32))
+            width *= 2
+
+        suffixes = np.empty(length, dtype=np.int64)
+        suffixes[ranks[-1]] = np.arange(length)
+        return suffixes, ranks
+
+    @staticmethod
+    def _longest_common_prefixes(suffixes: np.ndarray, ranks: List[np.ndarray]) -> np.ndarray:
+        """
+        Compute the LCP of every pair of adjacent suffixes at once, adding 2^k tokens for each round k whose
+        ranks show that the next 2^k tokens match.
+        """
+        length = len(suffixes)
+        lcp = np.zeros(length, dtype=np.int64)
+        if length < 2:
+            return lcp
+
+        left = suffixes[:-1]
+        right = suffixes[1:]
+        matched = np.zeros(length - 1, dtype=np.int64)
+        for k in range(len(ranks) - 1, -1, -1):
+            a = left + matched
+            b = right + matched
+            in_bounds = (a < length) & (b < length)
+            same = np.zeros(length - 1, dtype=bool)
+            same[in_bounds] = ranks[k][a[in_bounds]] == ranks[k][b[in_bounds]]
+            matched[same] += 1 << k
+        lcp[1:] = matched
+        return lcp
+
+    def locate(self, position: int) -> Tuple[object, int]:
+        """
+        Convert a position in the separated sequence to a (scrivening ID, token offset) tuple.
+        """
+        index = int(np.searchsorted(self.starts, position, side='right')) - 1
+        return self.stream.scrivening_ids[index], int(position - self.starts[index])
+
+
+def iter_repeated_phrases(suffix_array: SuffixArray, min_length: int = 4, min_count: int = 2) -> \
+        Iterator[RepeatedPhrase]:
+    """
+    Find every maximal repeated phrase: one that appears at least twice and can't be extended to the left or
+    right without losing an occurrence.
+
+    :param suffix_array: Suffix array of the token stream to search.
+    :param min_length: Shortest phrase to report, in tokens.
+    :param min_count: Fewest occurrences a phrase must have to be reported.
+    :return: Iterator of repeated phrases, in no particular order.
+    """
+    sequence = suffix_array.sequence
+    suffixes = suffix_array.suffixes
+    lcp = suffix_array.lcp
+    if len(sequence) < 2:
+        return
+
+    # The phrase in an LCP interval is left maximal if its occurrences aren't all preceded by the same token
+    preceding = np.where(suffixes > 0, sequence[suffixes - 1], -1)
+    preceding_changes = np.concatenate(([0], np.cumsum(preceding[1:] != preceding[:-1])))
+
+    # Intervals of suffixes sharing at least min_length tokens fall within runs where lcp >= min_length
+    long_enough = np.concatenate(([False], lcp >= max(min_length, 1), [False]))
+    edges = np.flatnonzero(long_enough[1:] != long_enough[:-1])
+    for run_start, run_end in zip(edges[::2], edges[1::2]):
+        # Bottom-up traversal of the LCP intervals in the run, as (lcp, left bound) pairs
+        stack = []
+        for index in range(run_start, run_end + 1):
+            value = int(lcp[index]) if index < run_end else 0
+            left = index - 1
+            while stack and value < stack[-1][0]:
+                length, left = stack.pop()
+                right = index - 1
+                if right - left + 1 >= min_count and preceding_changes[right] != preceding_changes[left]:
+                    yield _repeated_phrase(suffix_array, length, suffixes[left:right + 1])
+            if value and (not stack or value > stack[-1][0]):
+                stack.append((value, left))
+
+
+def _repeated_phrase(suffix_array: SuffixArray, length: int, positions: np.ndarray) -> RepeatedPhrase:
+    positions = np.sort(positions)
+    start = int(positions[0])
+    tokens = tuple(suffix_array.stream.vocabulary.decode(suffix_array.sequence[start:start + length]))
+    return RepeatedPhrase(tokens, len(positions), [suffix_array.locate(position) for position in positions])
+
+
+def find_repeated_phrases(source: Union[TokenStream, ScrivenerProject], min_length: int = 4, min_count: int = 2,
+                          fold_case: bool = False, tokenizer: Union[str, Tokenizer] = None) -> \
+        List[RepeatedPhrase]:
+    """
+    Find every maximal repeated phrase in a token stream or a whole project.
+
+    :param source: The token stream or project to search.
+    :param min_length: Shortest phrase to report, in tokens.
+    :param min_count: Fewest occurrences a phrase must have to be reported.
+    :param fold_case: If True, ignore case when comparing phrases.
+    :param tokenizer: Tokenizer backend or its name, used if source is a project. Defaults to the nltk backend.
+    :return: List of repeated phrases, longest first, and most frequent first among phrases of the same
+    length.
+    """
+    stream = encode_project(source, tokenizer=tokenizer) if isinstance(source, ScrivenerProject) else source
+    if fold_case:
+        stream = stream.folded()
+
+    phrases = list(iter_repeated_phrases(SuffixArray(stream), min_length, min_count))
+    phrases.sort(key=lambda phrase: (-len(phrase.tokens), -phrase.count, phrase.occurrences[0]))
+    return phrases
@@ -0,0 +1,256 @@
+"""
+Approximate analysis of very large projects from a sample of their scrivenings.
+
+Scrivenings are stratified by binder section, such as by book or chapter, and each section gets a share of
+the sample in proportion to the size of its RTF files, which is read with stat() without parsing anything.
+Within a section, scrivenings are sampled uniformly at random. Totals are estimated with a ratio estimator
+that scales what's seen in the sampled scrivenings by the section's total file size, since longer files
+hold more text. Every estimate comes with a normal-approximation confidence interval.
+"""
+from collections import namedtuple
+from itertools import chain
+import math
+import os
+from statistics import NormalDist
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from .ngrams import excluded_ids, iter_ngram_keys
+from .prosestats import scrivening_stats
+from .scrivener import Scrivening, ScrivenerProject, iter_tokens, flatten_scrivenings, get_binder_level
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import TokenStream, encode_tokens
+
+Estimate = namedtuple('Estimate', ['value', 'stderr', 'low', 'high'])
+Estimate.__doc__ = """
+An estimated quantity, its standard error, and the bounds of its confidence interval.
+"""
+
+
+def _file_size(scrivening: Scrivening) -> int:
+    try:
+        return os.stat(scrivening.file_path).st_size
+    except OSError:
+        return 0
+
+
+class ScriveningSample(object):
+    """
+    A stratified random sample of a project's scrivenings.
+    """
+    def __init__(self, population: List[Scrivening], sizes: np.ndarray, strata: np.ndarray, sampled: np.ndarray):
+        """
+        :param population: Every scrivening with text, in compile order.
+        :param sizes: File size of each scrivening in the population.
+        :param strata: Stratum of each scrivening in the population.
+        :param sampled: Indices into the population of the sampled scrivenings, in compile order.
+        """
+        self.population = population
+        self.sizes = sizes
+        self.strata = strata
+        self.sampled = sampled
+
+    @classmethod
+    def from_project(cls, project: ScrivenerProject, fraction: float = 0.1, depth: int = 0,
+                     min_per_stratum: int = 2, seed: int = None) -> 'ScriveningSample':
+        """
+        Sample a project's scrivenings.
+
+        :param project: The project.
+        :param fraction: Fraction of the project's scrivenings to sample, shared out between sections by the
+        size of their text. Smaller samples are faster to analyze but give wider confidence intervals. 1 reads
+        everything, and the estimates are exact.
+        :param depth: Binder depth of the sections to stratify by: 0 for the top-level scrivenings, 1 for
+        their children, and so on. Scrivenings above that depth form a section of their own.
+        :param min_per_stratum: Fewest scrivenings to sample from each section, so that its variance can be
+        estimated. Sections with fewer scrivenings are read in full.
+        :param seed: Seed for the random sample.
+        :return: The sample.
+        """
+        if not 0 < fraction <= 1:
+            raise ValueError("The fraction must be between 0 and 1, not {}".format(fraction))
+
+        nodes = get_binder_level(project.scrivenings, depth)
+        stratum_of = {}
+        for stratum, node in enumerate(nodes):
+            for scrivening in flatten_scrivenings([node], True):
+                stratum_of[scrivening.id] = stratum
+
+        population, sizes, strata = [], [], []
+        for scrivening in flatten_scrivenings(project.scrivenings, True):
+            size = _file_size(scrivening)
+            if size:
+                population.append(scrivening)
+                sizes.append(size)
+                strata.append(stratum_of.get(scrivening.id, len(nodes)))
+        sizes = np.array(sizes, dtype=np.int64)
+        strata = np.array(strata, dtype=np.int64)
+
+        rng = np.random.default_rng(seed)
+        total_size = max(int(sizes.sum()), 1)
+        sampled = []
+        for stratum in np.unique(strata).tolist():
+            members = np.flatnonzero(strata == stratum)
+            # Allocate the sample in proportion to the stratum's share of the text. Sampling within the
+            # stratum is uniform, which is what the ratio estimator in _totals assumes.
+            target = math.ceil(fraction * len(population) * int(sizes[members].sum()) / total_size)
+            count = min(len(members), max(target, min_per_stratum))
+            sampled.append(rng.choice(members, size=count, replace=False))
+        sampled = np.sort(np.concatenate(sampled)) if sampled else np.zeros(0, dtype=np.int64)
+        return cls(population, sizes, strata, sampled)
+
+    @property
+    def scrivenings(self) -> List[Scrivening]:
+        return [self.population[index] for index in self.sampled.tolist()]
+
+    @property
+    def fraction(self) -> float:
+        """
+        Fraction of the population's text, by file size, that's in the sample.
+        """
+        total = self.sizes.sum()
+        return float(self.sizes[self.sampled].sum() / total) if total else 1.0
+
+    def _totals(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate population totals with a ratio-to-size estimator in each stratum.
+
+        :param values: Array with a row for each sampled scrivening and a column for each quantity.
+        :return: Tuple of the estimated totals and their variances.
+        """
+        values = values.astype(np.float64)
+        totals = np.zeros(values.shape[1])
+        variances = np.zeros(values.shape[1])
+        sampled_strata = self.strata[self.sampled]
+        sampled_sizes = self.sizes[self.sampled].astype(np.float64)
+        for stratum in np.unique(sampled_strata).tolist():
+            rows = sampled_strata == stratum
+            y, x = values[rows], sampled_sizes[rows]
+            population = self.strata == stratum
+            stratum_size, stratum_count, count = self.sizes[population].sum(), np.count_nonzero(population), len(x)
+
+            ratio = y.sum(axis=0) / x.sum()
+            totals += ratio * stratum_size
+            if count > 1 and count < stratum_count:
+                residuals = y - x[:, np.newaxis] * ratio
+                spread = (residuals ** 2).sum(axis=0) / (count - 1)
+                variances += stratum_count ** 2 * (1 - count / stratum_count) * spread / count
+        return totals, variances
+
+    @staticmethod
+    def _estimates(values: np.ndarray, variances: np.ndarray, confidence: float) -> List[Estimate]:
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        errors = np.sqrt(variances)
+        return [Estimate(value, error, value - z * error, value + z * error)
+                for value, error in zip(values.tolist(), errors.tolist())]
+
+    def estimate_totals(self, values: np.ndarray, confidence: float = 0.95) -> List[Estimate]:
+        """
+        Estimate the project-wide totals of quantities measured in each sampled scrivening.
+
+        :param values: Array with a row for each sampled scrivening, in the order of scrivenings, and a
+        column for each quantity.
+        :param confidence: Confidence level of the intervals.
+        :return: List of the estimate of each quantity.
+        """
+        return self._estimates(*self._totals(values), confidence)
+
+    def estimate_ratios(self, numerators: np.ndarray, denominators: np.ndarray,
+                        confidence: float = 0.95) -> List[Estimate]:
+        """
+        Estimate project-wide ratios of totals, such as words per sentence. The variance uses the usual
+        linear approximation.
+
+        :param numerators: Array with a row for each sampled scrivening and a column for each ratio.
+        :param denominators: Array of the same shape.
+        :param confidence: Confidence level of the intervals.
+        :return: List of the estimate of each ratio.
+        """
+        numerator_totals, _ = self._totals(numerators)
+        denominator_totals, _ = self._totals(denominators)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(denominator_totals > 0, numerator_totals / denominator_totals, 0.0)
+            _, variances = self._totals(numerators - denominators * ratios)
+            variances = np.where(denominator_totals > 0, variances / denominator_totals ** 2, 0.0)
+        return self._estimates(ratios, variances, confidence)
+
+    def encode(self, tokenizer: Union[str, Tokenizer] = None) -> Tuple[TokenStream, np.ndarray]:
+        """
+        Tokenize the sampled scrivenings, each on its own.
+
+        :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+        :return: Tuple of the token stream and the index of each position's scrivening in scrivenings.
+        """
+        tokenizer = get_tokenizer(tokenizer)
+        scrivenings = self.scrivenings
+        stream = encode_tokens(chain.from_iterable(iter_tokens([scrivening], False, tokenizer)
+                                                   for scrivening in scrivenings))
+        sample_index = {scrivening.id: index for index, scrivening in enumerate(scrivenings)}
+        units = np.array([sample_index[scrivening_id] for scrivening_id in stream.scrivening_ids], dtype=np.int64)
+        return stream, units[stream.scrivening_index()] if len(stream) else np.zeros(0, dtype=np.int64)
+
+
+def estimate_phrase_frequencies(sample: ScriveningSample, max_n: int = 3, min_n: int = 1, k: int = 20,
+                                words_only: bool = False, fold_case: bool = True, confidence: float = 0.95,
+                                tokenizer: Union[str, Tokenizer] = None) -> Dict[int, List[Tuple[tuple, Estimate]]]:
+    """
+    Estimate the project-wide counts of the phrases that are most frequent in a sample.
+
+    :param sample: The sample.
+    :param max_n: Length of the longest phrases.
+    :param min_n: Length of the shortest phrases.
+    :param k: Number of phrases of each length to estimate.
+    :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of a
+    phrase.
+    :param fold_case: If True, ignore case.
+    :param confidence: Confidence level of the intervals.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: Dictionary keyed by phrase length of lists of (phrase, estimated count) tuples, most frequent in
+    the sample first.
+    """
+    stream, units = sample.encode(tokenizer)
+    if fold_case:
+        stream = stream.folded()
+    excluded = excluded_ids(stream.vocabulary, words_only=words_only)
+    unit_count = len(sample.sampled)
+
+    results = {}
+    for n, keys, counts, first in iter_ngram_keys(stream, max_n, min_n, excluded):
+        top = np.argsort(-counts, kind='stable')[:k]
+        # Rank of each position's phrase among the top phrases, or -1
+        ranks = np.full(len(counts), -1, dtype=np.int64)
+        ranks[top] = np.arange(len(top))
+        position_ranks = np.where(keys >= 0, ranks[np.maximum(keys, 0)], -1)
+        valid = position_ranks >= 0
+        per_unit = np.bincount(units[:len(keys)][valid] * len(top) + position_ranks[valid],
+                               minlength=unit_count * len(top)).reshape(unit_count, len(top))
+
+        decode = stream.vocabulary.decode
+        phrases = [tuple(decode(stream.ids[position:position + n])) for position in first[top].tolist()]
+        results[n] = list(zip(phrases, sample.estimate_totals(per_unit, confidence)))
+    return results
+
+
+def estimate_prose_stats(sample: ScriveningSample, confidence: float = 0.95,
+                         tokenizer: Union[str, Tokenizer] = None) -> Dict[str, Estimate]:
+    """
+    Estimate a project's prose statistics from a sample.
+
+    :param sample: The sample.
+    :param confidence: Confidence level of the intervals.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: Dictionary of estimates: total words, sentences, paragraphs and syllables, and the
+    mean_sentence_length, mean_paragraph_length, syllables_per_word and dialogue_ratio.
+    """
+    stats = [scrivening_stats(scrivening, tokenizer) for scrivening in sample.scrivenings]
+    columns = np.array([[part.words, part.sentences, part.paragraphs, part.syllables,
+                         int(part.sentence_dialogue.sum())] for part in stats], dtype=np.float64).reshape(-1, 5)
+    words, sentences, paragraphs, syllables, dialogue = columns.T
+
+    totals = sample.estimate_totals(columns[:, :4], confidence)
+    ratios = sample.estimate_ratios(np.stack((words, words, syllables, dialogue), axis=1),
+                                    np.stack((sentences, paragraphs, words, words), axis=1), confidence)
+    names = ('words', 'sentences', 'paragraphs', 'syllables',
+             'mean_sentence_length', 'mean_paragraph_length', 'syllables_per_word', 'dialogue_ratio')
+    return dict(zip(names, totals + ratios))
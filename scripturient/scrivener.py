@@ -1,13 +1,15 @@
-from collections import OrderedDict
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
 import glob
 import os
-from typing import Callable, List
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
 from lxml import etree
-import nltk
 import pyth.document
 from pyth.plugins.rtf15.reader import Rtf15Reader
+from . import instrument
 from .plaintextify import Plaintextifier
+from .tokenizers import Tokenizer, get_tokenizer
 
 
 def _fast_iter(context: etree.iterparse, func: Callable[[str, etree.Element], bool]):
@@ -136,16 +138,27 @@ class Scrivening(object):
         :return: The RTF-formatted scrivening in pyth's Document form.
         """
         if not self._rtf:
-            try:
-                with open(self.file_path, 'rb') as fh:
-                    self._rtf = Rtf15Reader.read(fh)
-            except FileNotFoundError as e:
-                raise FileNotFoundError("Couldn't find the file for scrivening ID {} (title: {})".format(
-                    self.id, self.title
-                )) from e
+            self._rtf = self._read_rtf()
 
         return self._rtf
 
+    def _read_rtf(self) -> pyth.document.Document:
+        try:
+            with open(self.file_path, 'rb') as fh:
+                # Only stat the file if a hook is listening for the bytes read
+                size = os.fstat(fh.fileno()).st_size if instrument.enabled() else 0
+                with instrument.stage('rtf_parse', size, 1):
+                    return Rtf15Reader.read(fh)
+        except FileNotFoundError as e:
+            raise FileNotFoundError("Couldn't find the file for scrivening ID {} (title: {})".format(
+                self.id, self.title
+            )) from e
+
+    @staticmethod
+    def _convert(rtf: pyth.document.Document) -> List[str]:
+        with instrument.stage('plaintext', documents=1):
+            return Plaintextifier.convert(rtf)
+
     def text(self) -> List[str]:
         """
         Get the plain-text version of the scrivening.
@@ -153,10 +166,44 @@ class Scrivening(object):
         :return: The scrivening in plain text.
         """
         if not self._text:
-            self._text = Plaintextifier.convert(self.rtf())
+            instrument.cache_miss('text_cache')
+            self._text = self._convert(self.rtf())
+        else:
+            instrument.cache_hit('text_cache')
 
         return self._text
 
+    def loaded_paragraphs(self) -> Optional[List[str]]:
+        """
+        Get the plain-text version of the scrivening if it has already been loaded, without reading the file.
+
+        :return: The scrivening in plain text, or None if it hasn't been loaded.
+        """
+        return self._text or None
+
+    def invalidate(self):
+        """
+        Drop the cached RTF and text, so that they're read again from the file the next time they're needed.
+        """
+        self._rtf = None
+        self._text = None
+
+    def _uncached_text(self) -> List[str]:
+        """
+        Get the plain-text version of the scrivening without keeping the parsed RTF or text around, unless
+        they were already loaded.
+
+        :return: The scrivening in plain text.
+        """
+        if self._text:
+            instrument.cache_hit('text_cache')
+            return self._text
+        instrument.cache_miss('text_cache')
+        if self._rtf:
+            return self._convert(self._rtf)
+
+        return self._convert(self._read_rtf())
+
 
 def _get_scrivening_as_flat_text_list(scrivening: Scrivening) -> List[str]:
     contents = []
@@ -172,13 +219,247 @@ def _get_scrivening_as_flat_text_list(scrivening: Scrivening) -> List[str]:
     return contents
 
 
-def tokenize_scrivening(scrivening: Scrivening) -> List[str]:
-    # TODO: this requires the punkt tokenizer model from nltk. Right now it's in Appdata\Roaming\nltk_data
+def get_binder_level(scrivenings: Iterable[Scrivening], depth: int) -> List[Scrivening]:
+    """
+    Find the scrivenings at one level of the binder, such as the chapters in a project's draft.
+
+    :param scrivenings: The scrivenings at depth 0, such as a project's top-level scrivenings.
+    :param depth: How many levels below them to look.
+    :return: List of the scrivenings at that depth in compile order.
+    """
+    level = list(scrivenings)
+    for _ in range(depth):
+        level = [child for scrivening in level for child in scrivening.children]
+    return level
+
+
+def flatten_scrivenings(scrivenings: Iterable[Scrivening], recursive: bool = True) -> List[Scrivening]:
+    """
+    List scrivenings along with their descendants, in compile order.
+
+    :param scrivenings: The scrivenings, such as a project's top-level scrivenings.
+    :param recursive: If False, don't include their children.
+    :return: List of the scrivenings.
+    """
+    flat = []
+    for scrivening in scrivenings:
+        flat.append(scrivening)
+        if recursive:
+            flat.extend(flatten_scrivenings(scrivening.children, recursive))
+    return flat
+
+
+def scrivening_mtime(scrivening: Scrivening) -> int:
+    """
+    Get the modification time of a scrivening's RTF file in nanoseconds, or 0 if it has no file, for telling
+    whether cached results are stale.
+    """
+    try:
+        return os.stat(scrivening.file_path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def tokenize_scrivening(scrivening: Scrivening, tokenizer: Union[str, Tokenizer] = None) -> List[str]:
     contents = _get_scrivening_as_flat_text_list(scrivening)
-    tokens = nltk.word_tokenize("\n".join(contents))
+    tokens = get_tokenizer(tokenizer).tokenize("\n".join(contents))
     return tokens  # TODO should this be a Text() object?
 
 
+TaggedToken = namedtuple('TaggedToken', ['token', 'scrivening_id', 'paragraph', 'start', 'end', 'sentence'])
+TaggedToken.__doc__ = """
+A token along with where it came from: the ID of its scrivening, the index of its paragraph in that
+scrivening's text, its [start, end) character offsets in that paragraph, and the index of its sentence in
+the token stream.
+"""
+
+
+def _iter_scrivening_paragraphs(scrivenings: Iterable[Scrivening], recursive: bool = True) -> \
+        Iterator[Tuple[Scrivening, int, str]]:
+    """
+    Walk scrivenings in compile order, yielding their paragraphs one at a time.
+
+    Scrivenings whose text isn't already loaded are read without caching it, so only one scrivening's worth
+    of text is held at a time.
+
+    :param scrivenings: The scrivenings to walk.
+    :param recursive: If True, include each scrivening's children.
+    :return: Iterator of (scrivening, paragraph index, paragraph) tuples.
+    """
+    for scrivening in scrivenings:
+        try:
+            paragraphs = scrivening._uncached_text()
+        except FileNotFoundError:
+            paragraphs = []
+
+        for index, paragraph in enumerate(paragraphs):
+            yield scrivening, index, paragraph
+        del paragraphs
+
+        if recursive:
+            yield from _iter_scrivening_paragraphs(scrivening.children)
+
+
+def rebase_segments(segments: list, offset: int) -> list:
+    """
+    Shift buffer segments so that the given buffer offset becomes offset 0, dropping segments that end
+    before it.
+    """
+    starts = [segment[0] for segment in segments]
+    keep = max(bisect_right(starts, offset) - 1, 0)
+    rebased = []
+    for buffer_offset, scrivening_id, paragraph, paragraph_offset in segments[keep:]:
+        if buffer_offset < offset:
+            paragraph_offset += offset - buffer_offset
+            buffer_offset = offset
+        rebased.append((buffer_offset - offset, scrivening_id, paragraph, paragraph_offset))
+    return rebased
+
+
+class SentenceBuffer(object):
+    """
+    Accumulates text and hands back the sentences in it once they can no longer change.
+
+    The last sentence in the buffer can always be extended by more text, so it's held back until the
+    buffer is flushed. Segments record which scrivening paragraph each stretch of the buffer came from.
+    """
+    def __init__(self, tokenizer: Tokenizer):
+        self.tokenizer = tokenizer
+        self.text = ''
+        # Sorted (buffer offset, scrivening ID, paragraph index, paragraph offset) tuples
+        self.segments = []
+        # Whether the buffer holds the very start of the text, as opposed to text following a sentence
+        self.at_start = True
+
+    def add(self, text: str, segments: List[Tuple[int, object, int, int]] = ()):
+        shift = len(self.text)
+        self.segments.extend((offset + shift, scrivening_id, paragraph, paragraph_offset)
+                             for offset, scrivening_id, paragraph, paragraph_offset in segments)
+        self.text += text
+
+    def _split(self) -> List[Tuple[int, int]]:
+        spans = self.tokenizer.sentence_spans(self.text)
+        if spans and not self.at_start:
+            # Tokenizers start the first sentence at the start of the text, but sentences that follow a break
+            # start at their first non-whitespace character
+            start, end = spans[0]
+            while start < end and self.text[start].isspace():
+                start += 1
+            spans[0] = (start, end)
+        return spans
+
+    def _take(self, spans: List[Tuple[int, int]], cut: int) -> List[Tuple[str, int, list]]:
+        sentences = [(start, end, self.segments) for start, end in spans]
+        self.at_start = False
+
+        self.segments = rebase_segments(self.segments, cut)
+        text = self.text
+        self.text = self.text[cut:]
+
+        return [(text[start:end], start, segments) for start, end, segments in sentences]
+
+    def pop_sentences(self) -> list:
+        """
+        Remove all sentences but the last from the buffer.
+
+        :return: List of (sentence, buffer offset, segments) tuples.
+        """
+        spans = self._split()
+        if len(spans) < 2:
+            return []
+        # Keep the whitespace before the held-back sentence; the word tokenizer can depend on it
+        return self._take(spans[:-1], spans[-2][1])
+
+    def pop_all(self) -> list:
+        """
+        Remove all sentences from the buffer.
+
+        :return: List of (sentence, buffer offset, segments) tuples.
+        """
+        return self._take(self._split(), len(self.text))
+
+    def pop_raw(self) -> Tuple[str, list]:
+        """
+        Remove the buffer's text without splitting it into sentences.
+
+        :return: The (text, segments) left in the buffer.
+        """
+        text, segments = self.text, self.segments
+        self.text = ''
+        self.segments = []
+        self.at_start = False
+        return text, segments
+
+
+def tag_sentence(sentence: str, offset: int, segments: list, sentence_index: int, tokenizer: Tokenizer) -> \
+        List[TaggedToken]:
+    """
+    Tokenize a sentence taken from a SentenceBuffer and tag each token with where it came from.
+    """
+    starts = [segment[0] for segment in segments]
+    tagged = []
+    for token, start, end in tokenizer.word_spans(sentence):
+        start += offset
+        buffer_offset, scrivening_id, paragraph, paragraph_offset = segments[max(bisect_right(starts, start) - 1, 0)]
+        shift = paragraph_offset - buffer_offset
+        tagged.append(TaggedToken(token, scrivening_id, paragraph, start + shift, end + offset + shift,
+                                  sentence_index))
+    return tagged
+
+
+def iter_tokens(scrivenings: Iterable[Scrivening], recursive: bool = True,
+                tokenizer: Union[str, Tokenizer] = None) -> Iterator[TaggedToken]:
+    """
+    Tokenize scrivenings as one continuous text, tagging each token with where it came from. Sentences are
+    numbered across all the scrivenings, and can span scrivening boundaries.
+
+    :param scrivenings: The scrivenings to tokenize, in order.
+    :param recursive: Whether to include the scrivenings' children.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: Iterator of tagged tokens.
+    """
+    tokenizer = get_tokenizer(tokenizer)
+    buffer = SentenceBuffer(tokenizer)
+    sentence_index = 0
+    started = False
+
+    for scrivening, index, paragraph in _iter_scrivening_paragraphs(scrivenings, recursive):
+        if started:
+            buffer.add('\n')
+        started = True
+        buffer.add(paragraph, [(0, scrivening.id, index, 0)])
+
+        # Sentences are tagged a paragraph at a time, so that the tokenize stage doesn't time the consumer
+        with instrument.stage('tokenize'):
+            sentences = [tag_sentence(sentence, offset, segments, sentence_index + position, tokenizer)
+                         for position, (sentence, offset, segments) in enumerate(buffer.pop_sentences())]
+        sentence_index += len(sentences)
+        for tagged in sentences:
+            yield from tagged
+
+    with instrument.stage('tokenize'):
+        sentences = [tag_sentence(sentence, offset, segments, sentence_index + position, tokenizer)
+                     for position, (sentence, offset, segments) in enumerate(buffer.pop_all())]
+    for tagged in sentences:
+        yield from tagged
+
+
+def iter_scrivening_tokens(scrivening: Scrivening, recursive: bool = True,
+                           tokenizer: Union[str, Tokenizer] = None) -> Iterator[TaggedToken]:
+    """
+    Tokenize a scrivening paragraph by paragraph, as its text is read.
+
+    The tokens are the same as those returned by tokenize_scrivening, but only the tokens of the paragraph
+    currently being tokenized are held in memory, and scrivening text that wasn't already loaded isn't cached.
+
+    :param scrivening: The scrivening to tokenize.
+    :param recursive: If True, include the scrivening's children.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: Iterator of tagged tokens in compile order.
+    """
+    return iter_tokens([scrivening], recursive, tokenizer)
+
+
 class ScrivenerProject(object):
     def __init__(self, project_dir):
         self.project_dir = project_dir
@@ -187,4 +468,6 @@ class ScrivenerProject(object):
         except Exception as e:
             raise ValueError("The project directory does not appear to contain a Scrivener project file") from e
         with open(self.project_file, 'rb') as fh:
-            self.scrivenings = _get_compiled_scrivenings(project_dir, fh)
+            size = os.fstat(fh.fileno()).st_size if instrument.enabled() else 0
+            with instrument.stage('binder_parse', size, 1):
+                self.scrivenings = _get_compiled_scrivenings(project_dir, fh)
@@ -0,0 +1,389 @@
+"""
+Stream analysis results to files as they're produced, rather than building them up in lists.
+
+A report of every repeated phrase or echo in a novel can run to millions of rows. The sinks here take
+records one at a time, or any iterator of them, buffer a fixed number of rows and write them out, so memory
+use stays the same however long the report gets. Records can be dictionaries or namedtuples, like
+RepeatedPhrase, Echo, Hit and TaggedToken, and nested namedtuples like Location are written as nested
+objects in JSON Lines and as prefixed columns in CSV.
+
+Every sink can append to an existing file, so an interrupted run can be resumed and its output added to.
+JSON Lines and CSV files are gzipped if their path ends in .gz; gzip files can be appended to because a
+gzip file may hold several members one after another. Numeric tables can be written as a directory of .npy
+files, one per column, which np.load can read, including with mmap_mode.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Sequence, Union
+
+import numpy as np
+
+from .repeats import RepeatedPhrase
+
+# Rows to hold before writing them out
+DEFAULT_BUFFER_SIZE = 1000
+
+# Size of the headers of the .npy files NpyColumnSink writes. The header is rewritten with the final number
+# of rows when the sink is closed, so it's padded to a fixed size that any row count fits in.
+_NPY_HEADER_SIZE = 128
+
+
+def as_dict(record) -> dict:
+    """
+    Convert a record to a dictionary, converting nested namedtuples too.
+    """
+    if isinstance(record, dict):
+        return {key: _as_value(value) for key, value in record.items()}
+    if hasattr(record, '_asdict'):
+        return {key: _as_value(value) for key, value in record._asdict().items()}
+    raise ValueError("Records must be dictionaries or namedtuples, not {}".format(type(record).__name__))
+
+
+def _as_value(value):
+    if hasattr(value, '_asdict') or isinstance(value, dict):
+        return as_dict(value)
+    if isinstance(value, (list, tuple)):
+        return [_as_value(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _flatten(record: dict, prefix: str = '') -> dict:
+    """
+    Flatten a record's nested objects into prefixed keys, such as location_start, for a CSV row.
+    """
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + '_'))
+        elif isinstance(value, list):
+            # Phrases are joined into their text, and anything more complicated is written as JSON
+            if all(isinstance(item, (str, int, float)) for item in value):
+                flat[prefix + key] = ' '.join(str(item) for item in value)
+            else:
+                flat[prefix + key] = json.dumps(value, ensure_ascii=False)
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def _open_text(path: str, append: bool, compress: bool = None):
+    if path == '-':
+        return sys.stdout
+    if compress is None:
+        compress = path.endswith('.gz')
+    mode = 'at' if append else 'wt'
+    if compress:
+        return gzip.open(path, mode, encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def _close_text(fh):
+    if fh is sys.stdout:
+        fh.flush()
+    else:
+        fh.close()
+
+
+def _has_content(path: str) -> bool:
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+class ResultSink(object):
+    """
+    Base class of the sinks. Subclasses implement _write_rows, which is passed each full buffer.
+    """
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        :param buffer_size: Rows to hold before writing them out.
+        """
+        if buffer_size < 1:
+            raise ValueError("The buffer must hold at least 1 row, not {}".format(buffer_size))
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self._buffer = []  # type: List[dict]
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record):
+        """
+        Write a record.
+
+        :param record: Dictionary or namedtuple.
+        """
+        if self._closed:
+            raise ValueError("Can't write to a closed sink")
+        self._buffer.append(as_dict(record))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_many(self, records: Iterable) -> int:
+        """
+        Write every record from an iterable, such as the iterator from iter_repeated_phrases or iter_echoes.
+        Records are consumed as they're written, so an iterator is never held in memory.
+
+        :param records: The records.
+        :return: Number of records written.
+        """
+        count = 0
+        for record in records:
+            self.write(record)
+            count += 1
+        return count
+
+    def flush(self):
+        """
+        Write out any buffered rows.
+        """
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self.rows += len(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        """
+        Write out any buffered rows and close the file. Closing a closed sink does nothing.
+        """
+        if not self._closed:
+            self.flush()
+            self._close()
+            self._closed = True
+
+    def _write_rows(self, rows: List[dict]):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class JsonLinesSink(ResultSink):
+    """
+    Write records as JSON Lines: one JSON object per line.
+    """
+    def __init__(self, path: str, append: bool = False, compress: bool = None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        :param path: Path of the file, or - for standard output.
+        :param append: If True, add to the end of an existing file rather than replacing it.
+        :param compress: If True, gzip the file. Defaults to whether the path ends in .gz.
+        :param buffer_size: Rows to hold before writing them out.
+        """
+        super().__init__(buffer_size)
+        self.path = path
+        self._fh = _open_text(path, append, compress)
+
+    def _write_rows(self, rows: List[dict]):
+        self._fh.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+
+    def _close(self):
+        _close_text(self._fh)
+
+
+class CsvSink(ResultSink):
+    """
+    Write records as CSV with a header row. Nested records are flattened into prefixed columns, and phrases
+    are joined into their text.
+    """
+    def __init__(self, path: str, fields: Sequence[str] = None, append: bool = False, compress: bool = None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        :param path: Path of the file, or - for standard output.
+        :param fields: Columns to write, in order, after flattening. Defaults to the header of the file being
+        appended to, or else the columns of the first record. Columns missing from a record are left empty,
+        and columns that aren't in fields are dropped.
+        :param append: If True, add to the end of an existing file rather than replacing it. The header is
+        only written if the file is empty.
+        :param compress: If True, gzip the file. Defaults to whether the path ends in .gz.
+        :param buffer_size: Rows to hold before writing them out.
+        """
+        super().__init__(buffer_size)
+        self.path = path
+        self.fields = list(fields) if fields is not None else None
+        self._write_header = not (append and _has_content(path))
+        if not self._write_header and self.fields is None:
+            self.fields = self._read_header(path, compress)
+        self._fh = _open_text(path, append, compress)
+        self._writer = None
+
+    @staticmethod
+    def _read_header(path: str, compress: bool = None) -> List[str]:
+        if compress is None:
+            compress = path.endswith('.gz')
+        opener = gzip.open if compress else open
+        with opener(path, 'rt', encoding='utf-8', newline='') as fh:
+            return next(csv.reader(fh), [])
+
+    def _write_rows(self, rows: List[dict]):
+        rows = [_flatten(row) for row in rows]
+        if self._writer is None:
+            if self.fields is None:
+                self.fields = list(rows[0])
+            self._writer = csv.DictWriter(self._fh, self.fields, extrasaction='ignore')
+            if self._write_header:
+                self._writer.writeheader()
+        self._writer.writerows(rows)
+
+    def _close(self):
+        _close_text(self._fh)
+
+
+class NpyColumnSink(ResultSink):
+    """
+    Write a numeric table as a directory with a .npy file for each column, which np.load can read.
+
+    Each column's header is rewritten with its length when the sink is closed. If a run is interrupted
+    before then, appending to the directory works out the lengths from the sizes of the files, so nothing
+    that was written is lost.
+    """
+    def __init__(self, directory: str, columns: Dict[str, Union[str, np.dtype]], append: bool = False,
+                 buffer_size: int = 65536):
+        """
+        :param directory: Directory to write the columns to. It's created if it doesn't exist.
+        :param columns: Dictionary of the dtype of each column, keyed by name. Records may only have numeric
+        fields, and each column is written to name.npy.
+        :param append: If True, add to the end of existing columns rather than replacing them. Their dtypes
+        must match.
+        :param buffer_size: Rows to hold before writing them out.
+        """
+        super().__init__(buffer_size)
+        if not columns:
+            raise ValueError("A table needs at least 1 column")
+        self.directory = directory
+        self.columns = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        self._files = {}  # type: Dict[str, io.BufferedRandom]
+        self._lengths = {}  # type: Dict[str, int]
+
+        os.makedirs(directory, exist_ok=True)
+        for name, dtype in self.columns.items():
+            path = os.path.join(directory, name + '.npy')
+            if append and _has_content(path):
+                fh = open(path, 'r+b')
+                self._lengths[name] = self._check_header(fh, path, dtype)
+                fh.seek(_NPY_HEADER_SIZE + self._lengths[name] * dtype.itemsize)
+                fh.truncate()
+            else:
+                fh = open(path, 'w+b')
+                fh.write(self._header(dtype, 0))
+                self._lengths[name] = 0
+            self._files[name] = fh
+
+    @staticmethod
+    def _header(dtype: np.dtype, length: int) -> bytes:
+        header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (length,)}
+        text = repr(header).encode('latin1')
+        # Magic string, version 1.0 and the header length, then the header padded with spaces to a newline
+        prefix = np.lib.format.magic(1, 0) + np.uint16(_NPY_HEADER_SIZE - 10).tobytes()
+        return prefix + text.ljust(_NPY_HEADER_SIZE - len(prefix) - 1) + b'\n'
+
+    @staticmethod
+    def _check_header(fh, path: str, dtype: np.dtype) -> int:
+        """
+        Check the header of an existing column and work out how many complete rows it has.
+        """
+        version = np.lib.format.read_magic(fh)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else \
+            np.lib.format.read_array_header_2_0
+        shape, fortran_order, existing = read_header(fh)
+        if fh.tell() != _NPY_HEADER_SIZE or len(shape) != 1 or fortran_order:
+            raise ValueError("{} wasn't written by NpyColumnSink and can't be appended to".format(path))
+        if existing != dtype:
+            raise ValueError("Can't append {} to {}, which holds {}".format(dtype, path, existing))
+        return (os.fstat(fh.fileno()).st_size - _NPY_HEADER_SIZE) // dtype.itemsize
+
+    def write_columns(self, **arrays: np.ndarray):
+        """
+        Write a block of rows as arrays, one for each column, without converting each row to a record. This
+        is how to stream large numeric results, such as the keys from iter_ngram_keys.
+
+        :param arrays: Array of each column's values, keyed by name. They must all be the same length.
+        """
+        if set(arrays) != set(self.columns):
+            raise ValueError("Expected the columns {}, not {}".format(
+                ", ".join(self.columns), ", ".join(arrays)))
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) != 1:
+            raise ValueError("The columns must all be the same length")
+        self.flush()
+        self._append({name: np.asarray(array) for name, array in arrays.items()})
+        self.rows += lengths.pop()
+
+    def _write_rows(self, rows: List[dict]):
+        try:
+            self._append({name: np.array([row[name] for row in rows]) for name in self.columns})
+        except KeyError as e:
+            raise ValueError("Record is missing the column {}".format(e.args[0])) from None
+
+    def _append(self, arrays: Dict[str, np.ndarray]):
+        for name, array in arrays.items():
+            dtype = self.columns[name]
+            # Casting within a kind is allowed, but floats aren't silently truncated to integers
+            try:
+                array = array.astype(dtype, casting='same_kind')
+            except TypeError:
+                raise ValueError("Can't write {} values to the {} column {}".format(
+                    array.dtype, dtype, name)) from None
+            self._files[name].write(np.ascontiguousarray(array).tobytes())
+            self._lengths[name] += len(array)
+
+    def _close(self):
+        for name, fh in self._files.items():
+            fh.seek(0)
+            fh.write(self._header(self.columns[name], self._lengths[name]))
+            fh.close()
+
+
+def open_sink(path: str, append: bool = False, **kwargs) -> ResultSink:
+    """
+    Open a JSON Lines or CSV sink, depending on the file extension: .csv or .csv.gz for CSV, and anything
+    else for JSON Lines.
+
+    :param path: Path of the file.
+    :param append: If True, add to the end of an existing file rather than replacing it.
+    :param kwargs: Other arguments to the sink.
+    :return: The sink.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return CsvSink(path, append=append, **kwargs)
+    return JsonLinesSink(path, append=append, **kwargs)
+
+
+def iter_occurrence_rows(phrases: Iterable[RepeatedPhrase]) -> Iterator[dict]:
+    """
+    Expand repeated phrases into a row for each occurrence, which suits CSV better than a list per phrase.
+
+    :param phrases: The repeated phrases, such as from iter_repeated_phrases.
+    :return: Iterator of dictionaries with the phrase text, its count, and the scrivening ID and token offset
+    of the occurrence.
+    """
+    for phrase in phrases:
+        text = ' '.join(phrase.tokens)
+        for scrivening_id, offset in phrase.occurrences:
+            yield {'phrase': text, 'count': phrase.count, 'scrivening_id': scrivening_id, 'offset': offset}
+
+
+def write_results(records: Iterable, path: str, append: bool = False, **kwargs) -> int:
+    """
+    Stream records into a JSON Lines or CSV file, chosen by its extension as in open_sink.
+
+    :param records: The records, such as from iter_repeated_phrases or iter_echoes.
+    :param path: Path of the file.
+    :param append: If True, add to the end of an existing file rather than replacing it.
+    :param kwargs: Other arguments to the sink.
+    :return: Number of records written.
+    """
+    with open_sink(path, append, **kwargs) as sink:
+        return sink.write_many(records)
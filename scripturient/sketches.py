@@ -0,0 +1,547 @@
+"""
+Fixed-memory sketches for counting phrases across more text than fits in exact counters.
+
+Tokens are hashed with BLAKE2b and phrases with a rolling hash over their tokens' hashes, so a phrase hashes
+the same way in every project and process, and sketches built separately can be merged.
+
+Count-Min sketches approximate how often phrases occur, and HyperLogLog sketches approximate how many
+distinct tokens there are, such as to compare the vocabulary richness of chapters.
+"""
+from collections import namedtuple
+from hashlib import blake2b
+import json
+import math
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+import zlib
+
+import numpy as np
+
+from .ngrams import excluded_ids, invalid_starts
+from .scrivener import Scrivening, ScrivenerProject, iter_tokens, flatten_scrivenings, scrivening_mtime
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import TokenStream, Vocabulary, encode_tokens
+
+# Multiplier for the rolling phrase hash
+PHRASE_MULTIPLIER = np.uint64(0x100000001b3)
+
+# Bump when the saved format of vocabulary sketches changes so that old files are rebuilt rather than misread
+_FORMAT_VERSION = 1
+
+HeavyHitter = namedtuple('HeavyHitter', ['phrase', 'count', 'error'])
+HeavyHitter.__doc__ = """
+A frequent phrase and its estimated count. The estimate is never too low, and with the sketch's confidence
+it's at most error too high.
+"""
+
+
+def mix_hashes(values: np.ndarray) -> np.ndarray:
+    """
+    Scramble 64-bit hashes with the splitmix64 finalizer so that every output bit depends on every input bit.
+    """
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xbf58476d1ce4e5b9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def token_hashes(vocabulary: Vocabulary) -> np.ndarray:
+    """
+    Hash every token in a vocabulary.
+
+    :param vocabulary: The vocabulary.
+    :return: Array of 64-bit hashes indexed by token ID. The hashes don't depend on the vocabulary's IDs.
+    """
+    return np.array([int.from_bytes(blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+                     for token in vocabulary], dtype=np.uint64)
+
+
+def iter_phrase_hashes(stream: TokenStream, max_n: int, min_n: int = 1, excluded: np.ndarray = None) -> \
+        Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Hash every phrase in a token stream, one phrase length at a time. Phrases don't cross scrivenings.
+
+    :param stream: The token stream.
+    :param max_n: Length of the longest phrases.
+    :param min_n: Length of the shortest phrases.
+    :param excluded: Boolean array indexed by token ID of tokens that can't be part of a phrase.
+    :return: Iterator of (n, positions, hashes) tuples of the position and hash of each valid phrase.
+    """
+    if excluded is None:
+        excluded = np.zeros(0, dtype=bool)
+
+    tokens = token_hashes(stream.vocabulary)[stream.ids] if len(stream) else np.zeros(0, dtype=np.uint64)
+    hashes = None
+    for n, invalid in zip(range(1, max_n + 1), invalid_starts(stream, excluded, False)):
+        if len(invalid) == 0:
+            return
+        hashes = tokens.copy() if hashes is None else hashes[:-1] * PHRASE_MULTIPLIER + tokens[n - 1:]
+        if n >= min_n:
+            positions = np.flatnonzero(~invalid)
+            yield n, positions, mix_hashes(hashes[positions])
+
+
+class CountMinSketch(object):
+    """
+    Count-Min sketch: approximate counts of 64-bit keys in fixed memory.
+
+    Estimates are never too low. With probability 1 - delta, an estimate is at most epsilon * total too high,
+    where total is the sum of all counts added.
+    """
+    def __init__(self, epsilon: float = 0.0001, delta: float = 0.01, seed: int = 0):
+        """
+        :param epsilon: Error bound, as a fraction of the total count.
+        :param delta: Probability that an estimate exceeds the error bound.
+        :param seed: Seed for the hash functions. Only sketches with the same seed can be merged.
+        """
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon and delta must be between 0 and 1, not {} and {}".format(epsilon, delta))
+        self.epsilon = epsilon
+        self.delta = delta
+        self.seed = seed
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+        rng = np.random.default_rng(seed)
+        self._row_seeds = rng.integers(0, 2 ** 63, size=self.depth, dtype=np.int64).astype(np.uint64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    @property
+    def error(self) -> int:
+        """
+        Most an estimate can be too high, with probability 1 - delta.
+        """
+        return math.ceil(self.epsilon * self.total)
+
+    def _columns(self, keys: np.ndarray) -> Iterable[np.ndarray]:
+        width = np.uint64(self.width)
+        for row_seed in self._row_seeds:
+            yield (mix_hashes(keys ^ row_seed) % width).astype(np.intp)
+
+    def add(self, keys: np.ndarray, counts: np.ndarray = None):
+        """
+        Add keys to the sketch.
+
+        :param keys: Array of 64-bit keys. Keys may repeat.
+        :param counts: How much to add for each key. Defaults to 1 each.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        for row, columns in zip(self.table, self._columns(keys)):
+            row += np.bincount(columns, weights=counts, minlength=self.width).astype(np.int64)
+        self.total += len(keys) if counts is None else int(np.sum(counts))
+
+    def estimate(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Estimate how many times keys have been added.
+
+        :param keys: Array of 64-bit keys.
+        :return: Array of estimated counts.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        estimates = np.full(len(keys), np.iinfo(np.int64).max, dtype=np.int64)
+        for row, columns in zip(self.table, self._columns(keys)):
+            np.minimum(estimates, row[columns], out=estimates)
+        return estimates
+
+    def merge(self, other: 'CountMinSketch'):
+        """
+        Add another sketch's counts to this one.
+
+        :param other: Sketch with the same epsilon, delta, and seed.
+        """
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("Can't merge Count-Min sketches with different dimensions or seeds")
+        self.table += other.table
+        self.total += other.total
+
+
+class HeavyHitters(object):
+    """
+    Approximate the most frequent phrases of each length from min_n to max_n in fixed memory.
+
+    Each phrase length has its own Count-Min sketch, and a bounded set of candidate phrases with the highest
+    estimates is kept alongside it. Since the sketch remembers every phrase it's seen, a phrase that drops
+    out of the candidates returns with its full count the next time it appears.
+    """
+    def __init__(self, k: int = 20, min_n: int = 4, max_n: int = 8, epsilon: float = 0.0001,
+                 delta: float = 0.01, capacity: int = None, words_only: bool = False, seed: int = 0):
+        """
+        :param k: Number of phrases of each length to report by default.
+        :param min_n: Length of the shortest phrases to count.
+        :param max_n: Length of the longest phrases to count.
+        :param epsilon: Error bound of each length's sketch, as a fraction of the number of phrases of that
+        length.
+        :param delta: Probability that a count exceeds the error bound.
+        :param capacity: Number of candidate phrases of each length to keep. Defaults to 10 * k.
+        :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of a
+        phrase.
+        :param seed: Seed for the sketches' hash functions. Only counters with the same seed can be merged.
+        """
+        if min_n < 1 or max_n < min_n:
+            raise ValueError("Can't count phrases of lengths {} to {}".format(min_n, max_n))
+        self.k = k
+        self.min_n = min_n
+        self.max_n = max_n
+        self.capacity = capacity if capacity is not None else 10 * k
+        self.words_only = words_only
+        self.epsilon = epsilon
+        self.delta = delta
+        self.seed = seed
+        self.sketches = {n: CountMinSketch(epsilon, delta, seed) for n in range(min_n, max_n + 1)}
+        # Candidate phrases of each length, keyed by hash
+        self._candidates = {n: {} for n in self.sketches}
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the sketches, not counting the candidate phrases.
+        """
+        return sum(sketch.nbytes for sketch in self.sketches.values())
+
+    def update(self, stream: TokenStream):
+        """
+        Count the phrases in a token stream.
+
+        :param stream: The token stream. Case-fold it first to count "The end" and "the end" together.
+        """
+        excluded = excluded_ids(stream.vocabulary, words_only=self.words_only)
+        for n, positions, hashes in iter_phrase_hashes(stream, self.max_n, self.min_n, excluded):
+            sketch = self.sketches[n]
+            sketch.add(hashes)
+
+            # Only this stream's most frequent phrases can displace the current candidates
+            keys, first = np.unique(hashes, return_index=True)
+            estimates = sketch.estimate(keys)
+            if len(keys) > self.capacity:
+                best = np.argpartition(-estimates, self.capacity)[:self.capacity]
+                keys, first = keys[best], first[best]
+
+            candidates = self._candidates[n]
+            decode = stream.vocabulary.decode
+            for key, position in zip(keys.tolist(), positions[first].tolist()):
+                if key not in candidates:
+                    candidates[key] = tuple(decode(stream.ids[position:position + n]))
+            self._prune(n)
+
+    def update_project(self, project: ScrivenerProject, fold_case: bool = False,
+                       tokenizer: Union[str, Tokenizer] = None):
+        """
+        Count the phrases in all of a project's scrivenings. Each scrivening is tokenized on its own and
+        counted before the next is read, so memory doesn't grow with the project.
+
+        :param project: The project.
+        :param fold_case: If True, ignore case.
+        :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+        """
+        tokenizer = get_tokenizer(tokenizer)
+        # Phrases don't cross scrivenings anyway, so counting them one at a time loses nothing
+        for scrivening in flatten_scrivenings(project.scrivenings):
+            stream = encode_tokens(iter_tokens([scrivening], False, tokenizer))
+            self.update(stream.folded() if fold_case else stream)
+
+    def _prune(self, n: int):
+        candidates = self._candidates[n]
+        if len(candidates) <= self.capacity:
+            return
+        keys = np.fromiter(candidates, dtype=np.uint64, count=len(candidates))
+        estimates = self.sketches[n].estimate(keys)
+        for key in keys[np.argpartition(-estimates, self.capacity)[self.capacity:]].tolist():
+            del candidates[key]
+
+    def merge(self, other: 'HeavyHitters'):
+        """
+        Add another counter's counts to this one, such as one built in another process or from another
+        project.
+
+        :param other: Counter with the same phrase lengths, capacity, words_only setting, error bounds, and
+        seed.
+        """
+        settings = ('min_n', 'max_n', 'capacity', 'words_only', 'epsilon', 'delta', 'seed')
+        different = [name for name in settings if getattr(other, name) != getattr(self, name)]
+        if different:
+            raise ValueError("Can't merge heavy hitter counters with different settings: {}".format(", ".join(
+                "{} {} != {}".format(name, getattr(self, name), getattr(other, name)) for name in different)))
+        for n, sketch in self.sketches.items():
+            sketch.merge(other.sketches[n])
+            self._candidates[n].update(other._candidates[n])
+            self._prune(n)
+
+    def top(self, k: int = None) -> Dict[int, List[HeavyHitter]]:
+        """
+        Get the most frequent phrases of each length.
+
+        :param k: Number of phrases of each length to get. Defaults to the k the counter was created with.
+        :return: Dictionary keyed by phrase length of lists of heavy hitters, most frequent first.
+        """
+        if k is None:
+            k = self.k
+
+        results = {}
+        for n, candidates in self._candidates.items():
+            sketch = self.sketches[n]
+            keys = np.fromiter(candidates, dtype=np.uint64, count=len(candidates))
+            estimates = sketch.estimate(keys)
+            order = np.argsort(-estimates, kind='stable')[:k]
+            results[n] = [HeavyHitter(candidates[key], count, sketch.error)
+                          for key, count in zip(keys[order].tolist(), estimates[order].tolist())]
+        return results
+
+
+def _leading_zeros(values: np.ndarray) -> np.ndarray:
+    """
+    Count the leading zero bits of 64-bit values, with a binary search on each value's highest set bit.
+    """
+    zeros = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = (values >> np.uint64(64 - shift)) == 0
+        zeros += np.where(empty, shift, 0)
+        values = np.where(empty, values << np.uint64(shift), values)
+    # After the search, only a value of 0 still has a clear top bit
+    return zeros + ((values >> np.uint64(63)) == 0)
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog sketch: approximate number of distinct 64-bit keys in fixed memory.
+
+    The sketch has 2 ** precision one-byte registers, and estimates are typically within
+    1.04 / sqrt(2 ** precision) of the true count, which is 1.6% for the default precision. Sketches of
+    different parts of the manuscript can be merged to count the distinct keys in all of them.
+    """
+    def __init__(self, precision: int = 12, seed: int = 0):
+        """
+        :param precision: Number of hash bits used to choose a register, from 4 to 18.
+        :param seed: Seed for the hash function. Only sketches with the same seed can be merged.
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError("The precision must be between 4 and 18, not {}".format(precision))
+        self.precision = precision
+        self.seed = seed
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+        self._seed_hash = np.uint64(np.random.default_rng(seed).integers(0, 2 ** 63, dtype=np.int64))
+
+    @property
+    def nbytes(self) -> int:
+        return self.registers.nbytes
+
+    @property
+    def error(self) -> float:
+        """
+        Typical relative error of an estimate.
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, keys: np.ndarray):
+        """
+        Add keys to the sketch.
+
+        :param keys: Array of 64-bit keys. Keys may repeat.
+        """
+        hashes = mix_hashes(np.asarray(keys, dtype=np.uint64) ^ self._seed_hash)
+        indices = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # Rank of the first set bit after the index bits, capped for the all-zero case
+        ranks = np.minimum(_leading_zeros(hashes << np.uint64(self.precision)) + 1, 64 - self.precision + 1)
+        np.maximum.at(self.registers, indices, ranks.astype(np.uint8))
+
+    def estimate(self) -> float:
+        """
+        Estimate how many distinct keys have been added.
+        """
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty:
+            # Linear counting is more accurate for small counts
+            return m * math.log(m / empty)
+        return float(raw)
+
+    def merge(self, other: 'HyperLogLog'):
+        """
+        Add another sketch's keys to this one.
+
+        :param other: Sketch with the same precision and seed.
+        """
+        if (other.precision, other.seed) != (self.precision, self.seed):
+            raise ValueError("Can't merge HyperLogLog sketches with different precisions or seeds")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch. Sketches of short scrivenings have mostly empty registers and compress well.
+        """
+        return struct.pack('<Bq', self.precision, self.seed) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """
+        Deserialize a sketch saved with to_bytes.
+        """
+        precision, seed = struct.unpack_from('<Bq', data)
+        sketch = cls(precision, seed)
+        sketch.registers = np.frombuffer(zlib.decompress(data[struct.calcsize('<Bq'):]), dtype=np.uint8).copy()
+        return sketch
+
+
+class VocabularySketches(object):
+    """
+    A HyperLogLog sketch of the distinct tokens in each scrivening of a project, along with its number of
+    tokens, so that the vocabulary size and type-token ratio of any binder subtree can be estimated by
+    merging sketches rather than tokenizing again. Sketches are kept up to date one scrivening at a time.
+    """
+    def __init__(self, precision: int = 12, words_only: bool = True, fold_case: bool = True,
+                 tokenizer: Union[str, Tokenizer] = None, seed: int = 0):
+        """
+        :param precision: Precision of each sketch. See HyperLogLog.
+        :param words_only: If True, tokens with no letters or digits, such as punctuation, aren't counted.
+        :param fold_case: If True, ignore case.
+        :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+        :param seed: Seed for the sketches' hash function.
+        """
+        self.precision = precision
+        self.words_only = words_only
+        self.fold_case = fold_case
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.seed = seed
+        # Each scrivening's file mtime, sketch, and number of tokens
+        self._sketches = {}  # type: Dict[object, Tuple[int, HyperLogLog, int]]
+
+    def __len__(self):
+        return len(self._sketches)
+
+    def _sketch_scrivening(self, scrivening: Scrivening, mtime: int):
+        stream = encode_tokens(iter_tokens([scrivening], False, self.tokenizer))
+        if self.fold_case:
+            stream = stream.folded()
+        excluded = excluded_ids(stream.vocabulary, words_only=self.words_only)
+        counts = np.bincount(stream.ids, minlength=len(stream.vocabulary))
+        counts[excluded] = 0
+
+        # Only the distinct tokens matter to the sketch, so hash each vocabulary entry once
+        sketch = HyperLogLog(self.precision, self.seed)
+        sketch.add(token_hashes(stream.vocabulary)[counts > 0])
+        self._sketches[scrivening.id] = (mtime, sketch, int(counts.sum()))
+
+    def update(self, project: ScrivenerProject) -> int:
+        """
+        Bring the sketches up to date with a project, sketching only scrivenings whose files have changed.
+
+        :param project: The project.
+        :return: Number of scrivenings sketched or removed.
+        """
+        scrivenings = flatten_scrivenings(project.scrivenings, True)
+        changed = 0
+        for scrivening in scrivenings:
+            mtime = scrivening_mtime(scrivening)
+            saved = self._sketches.get(scrivening.id)
+            if saved is None or saved[0] != mtime:
+                self._sketch_scrivening(scrivening, mtime)
+                changed += 1
+
+        for scrivening_id in set(self._sketches) - {scrivening.id for scrivening in scrivenings}:
+            del self._sketches[scrivening_id]
+            changed += 1
+        return changed
+
+    def _parts(self, scrivening: Scrivening, recursive: bool) -> List[Tuple[int, HyperLogLog, int]]:
+        parts = [self._sketches.get(part.id) for part in flatten_scrivenings([scrivening], recursive)]
+        if None in parts:
+            raise KeyError("Scrivening ID {} hasn't been sketched; update the sketches first".format(
+                scrivening.id))
+        return parts
+
+    def sketch(self, scrivening: Scrivening, recursive: bool = True) -> HyperLogLog:
+        """
+        Get the sketch of a scrivening's distinct tokens.
+
+        :param scrivening: The scrivening.
+        :param recursive: If True, merge in the sketches of the scrivening's children.
+        :return: A new sketch.
+        """
+        merged = HyperLogLog(self.precision, self.seed)
+        for _, sketch, _ in self._parts(scrivening, recursive):
+            merged.merge(sketch)
+        return merged
+
+    def tokens(self, scrivening: Scrivening, recursive: bool = True) -> int:
+        """
+        Count the tokens in a scrivening.
+
+        :param scrivening: The scrivening.
+        :param recursive: If True, include the scrivening's children.
+        """
+        return sum(tokens for _, _, tokens in self._parts(scrivening, recursive))
+
+    def distinct(self, scrivening: Scrivening, recursive: bool = True) -> float:
+        """
+        Estimate the number of distinct tokens in a scrivening.
+
+        :param scrivening: The scrivening.
+        :param recursive: If True, include the scrivening's children.
+        """
+        return self.sketch(scrivening, recursive).estimate()
+
+    def type_token_ratio(self, scrivening: Scrivening, recursive: bool = True) -> float:
+        """
+        Estimate a scrivening's type-token ratio, its number of distinct tokens over its number of tokens.
+
+        :param scrivening: The scrivening.
+        :param recursive: If True, include the scrivening's children.
+        """
+        tokens = self.tokens(scrivening, recursive)
+        return min(self.distinct(scrivening, recursive) / tokens, 1.0) if tokens else 0.0
+
+    def save(self, path: str):
+        """
+        Save the sketches.
+
+        :param path: Path of the file to save to.
+        """
+        meta = {
+            'version': _FORMAT_VERSION,
+            'precision': self.precision,
+            'words_only': self.words_only,
+            'fold_case': self.fold_case,
+            'tokenizer': self.tokenizer.name,
+            'seed': self.seed,
+            'scrivenings': [[scrivening_id, mtime, tokens]
+                            for scrivening_id, (mtime, _, tokens) in self._sketches.items()],
+        }
+        registers = np.stack([sketch.registers for _, sketch, _ in self._sketches.values()]) if self._sketches \
+            else np.zeros((0, 2 ** self.precision), dtype=np.uint8)
+
+        # Write to a temporary file first so that an interrupted save doesn't destroy the old sketches
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as fh:
+            np.savez_compressed(fh, meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+                                registers=registers)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'VocabularySketches':
+        """
+        Load saved sketches.
+
+        :param path: Path of the saved sketches.
+        :return: The sketches.
+        :raises ValueError: If the file was saved in an older format.
+        """
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            if meta.get('version') != _FORMAT_VERSION:
+                raise ValueError("The sketches at {} have an unsupported format".format(path))
+
+            sketches = cls(meta['precision'], meta['words_only'], meta['fold_case'], meta['tokenizer'], meta['seed'])
+            for (scrivening_id, mtime, tokens), registers in zip(meta['scrivenings'], data['registers']):
+                sketch = HyperLogLog(sketches.precision, sketches.seed)
+                sketch.registers = registers.copy()
+                sketches._sketches[scrivening_id] = (mtime, sketch, tokens)
+
+        return sketches
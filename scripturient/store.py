@@ -0,0 +1,394 @@
+"""
+Store phrase-analysis results in a local SQLite database, so that later runs and other tools can query them
+without loading the project.
+
+Results are kept per scrivening, along with a hash of its RTF file, and a scrivening is analyzed again only
+when its content changes. Each scrivening also has a binder path, like /100/101/105/, so that the rows of a
+subtree are a contiguous range of an index.
+"""
+from hashlib import blake2b
+import json
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from .ngrams import excluded_ids, iter_ngram_keys
+from .prosestats import ProseStats
+from .scrivener import Scrivening, ScrivenerProject, iter_tokens
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import Location, encode_tokens
+
+# Name of the store in a cache directory. One store holds the results of any number of projects.
+STORE_FILE_NAME = 'scripturient.sqlite'
+
+# Bump when the schema changes so that old stores are rebuilt rather than misread
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scrivenings (
+    project_id INTEGER NOT NULL REFERENCES projects (id),
+    scrivening_id TEXT NOT NULL,
+    parent_id TEXT,
+    position INTEGER NOT NULL,
+    binder_path TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    words INTEGER NOT NULL,
+    sentences INTEGER NOT NULL,
+    paragraphs INTEGER NOT NULL,
+    syllables INTEGER NOT NULL,
+    dialogue_words INTEGER NOT NULL,
+    PRIMARY KEY (project_id, scrivening_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS scrivenings_by_binder_path ON scrivenings (project_id, binder_path);
+CREATE TABLE IF NOT EXISTS phrases (
+    id INTEGER PRIMARY KEY,
+    n INTEGER NOT NULL,
+    text TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS phrase_counts (
+    project_id INTEGER NOT NULL,
+    scrivening_id TEXT NOT NULL,
+    phrase_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (project_id, scrivening_id, phrase_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS phrase_counts_by_phrase ON phrase_counts (project_id, phrase_id);
+CREATE TABLE IF NOT EXISTS occurrences (
+    project_id INTEGER NOT NULL,
+    phrase_id INTEGER NOT NULL,
+    scrivening_id TEXT NOT NULL,
+    paragraph INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS occurrences_by_phrase ON occurrences (project_id, phrase_id);
+CREATE INDEX IF NOT EXISTS occurrences_by_scrivening ON occurrences (project_id, scrivening_id);
+"""
+
+_STATS_COLUMNS = ('tokens', 'words', 'sentences', 'paragraphs', 'syllables', 'dialogue_words')
+
+
+def _content_hash(scrivening: Scrivening) -> str:
+    try:
+        with open(scrivening.file_path, 'rb') as fh:
+            return blake2b(fh.read(), digest_size=16).hexdigest()
+    except FileNotFoundError:
+        return ''
+
+
+def _iter_binder(scrivenings: List[Scrivening], parent: Scrivening = None, path: str = '/') -> \
+        Iterator[Tuple[Scrivening, Scrivening, str]]:
+    """
+    Walk the binder in compile order, yielding each scrivening, its parent and its binder path.
+    """
+    for scrivening in scrivenings:
+        scrivening_path = '{}{}/'.format(path, scrivening.id)
+        yield scrivening, parent, scrivening_path
+        yield from _iter_binder(scrivening.children, scrivening, scrivening_path)
+
+
+def _subtree_bounds(binder_path: str) -> Tuple[str, str]:
+    # Every path in the subtree starts with binder_path, and '0' sorts right after '/'
+    return binder_path, binder_path[:-1] + '0'
+
+
+class AnalysisStore(object):
+    """
+    SQLite database of per-scrivening phrase counts, phrase occurrences and prose statistics for any number
+    of projects.
+    """
+    def __init__(self, path: str, cache_size: int = None):
+        """
+        :param path: Path of the database file. It's created if it doesn't exist.
+        :param cache_size: Most memory for SQLite's page cache, in bytes. Sorts and temporary tables that don't
+        fit go to disk. Defaults to SQLite's default cache size.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        if cache_size is not None:
+            # A negative cache size is in KiB rather than pages
+            self.connection.execute('PRAGMA cache_size = -{:d}'.format(max(cache_size >> 10, 1)))
+            self.connection.execute('PRAGMA temp_store = FILE')
+
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, _SCHEMA_VERSION):
+            with self.connection:
+                for (table,) in self.connection.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                    self.connection.execute('DROP TABLE {}'.format(table))
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            self.connection.execute('PRAGMA user_version = {}'.format(_SCHEMA_VERSION))
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _project_id(self, project_dir: str) -> int:
+        row = self.connection.execute('SELECT id FROM projects WHERE path = ?',
+                                      (os.path.abspath(project_dir),)).fetchone()
+        if row is None:
+            raise KeyError("No results stored for the project at {}".format(project_dir))
+        return row[0]
+
+    def update(self, project: ScrivenerProject, max_n: int = 3, min_n: int = 1, words_only: bool = True,
+               fold_case: bool = True, occurrences: bool = False, tokenizer: Union[str, Tokenizer] = None) -> int:
+        """
+        Analyze the scrivenings of a project whose content has changed since they were stored, and remove
+        scrivenings that are no longer in the project. Everything is written in one transaction.
+
+        :param project: The project.
+        :param max_n: Length of the longest phrases to count.
+        :param min_n: Length of the shortest phrases to count.
+        :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of a
+        phrase.
+        :param fold_case: If True, ignore case.
+        :param occurrences: If True, also store the location of every phrase occurrence, which makes the
+        store several times larger.
+        :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+        :return: Number of scrivenings analyzed or removed.
+        """
+        if min_n < 1 or max_n < min_n:
+            raise ValueError("Can't count phrases of lengths {} to {}".format(min_n, max_n))
+        tokenizer = get_tokenizer(tokenizer)
+        settings = json.dumps({'max_n': max_n, 'min_n': min_n, 'words_only': words_only, 'fold_case': fold_case,
+                               'occurrences': occurrences, 'tokenizer': tokenizer.name}, sort_keys=True)
+        project_dir = os.path.abspath(project.project_dir)
+
+        connection = self.connection
+        with connection:
+            row = connection.execute('SELECT id, settings FROM projects WHERE path = ?', (project_dir,)).fetchone()
+            if row is None:
+                project_id = connection.execute('INSERT INTO projects (path, settings) VALUES (?, ?)',
+                                                (project_dir, settings)).lastrowid
+                stored = {}
+            else:
+                project_id = row[0]
+                if row[1] != settings:
+                    # Results computed with other settings can't be reused
+                    self._delete_scrivenings(project_id, None)
+                    connection.execute('UPDATE projects SET settings = ? WHERE id = ?', (settings, project_id))
+                stored = dict(connection.execute(
+                    'SELECT scrivening_id, content_hash FROM scrivenings WHERE project_id = ?', (project_id,)))
+
+            binder = list(_iter_binder(project.scrivenings))
+            changed = []
+            for scrivening, _, _ in binder:
+                content_hash = _content_hash(scrivening)
+                if stored.get(str(scrivening.id)) != content_hash:
+                    changed.append((scrivening, content_hash))
+            removed = set(stored) - {str(scrivening.id) for scrivening, _, _ in binder}
+            self._delete_scrivenings(project_id, [str(scrivening.id) for scrivening, _ in changed] + list(removed))
+
+            connection.execute('CREATE TEMP TABLE IF NOT EXISTS new_counts '
+                               '(scrivening_id TEXT, n INTEGER, text TEXT, count INTEGER)')
+            connection.execute('CREATE TEMP TABLE IF NOT EXISTS new_occurrences '
+                               '(scrivening_id TEXT, text TEXT, paragraph INTEGER, start INTEGER, end INTEGER)')
+            stats = {}
+            for scrivening, _ in changed:
+                stats[scrivening.id] = self._analyze(scrivening, tokenizer, max_n, min_n, words_only, fold_case,
+                                                     occurrences)
+
+            # Everything about the binder is rewritten, since moving a scrivening changes its path and position
+            hashes = dict((str(scrivening.id), content_hash) for scrivening, content_hash in changed)
+            connection.executemany(
+                'UPDATE scrivenings SET parent_id = ?, position = ?, binder_path = ?, title = ? '
+                'WHERE project_id = ? AND scrivening_id = ?',
+                [(None if parent is None else str(parent.id), position, path, scrivening.title, project_id,
+                  str(scrivening.id)) for position, (scrivening, parent, path) in enumerate(binder)
+                 if str(scrivening.id) not in hashes])
+            connection.executemany(
+                'INSERT INTO scrivenings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(project_id, str(scrivening.id), None if parent is None else str(parent.id), position, path,
+                  scrivening.title, hashes[str(scrivening.id)]) + stats[scrivening.id]
+                 for position, (scrivening, parent, path) in enumerate(binder) if str(scrivening.id) in hashes])
+
+            connection.execute('INSERT OR IGNORE INTO phrases (n, text) SELECT DISTINCT n, text FROM new_counts')
+            connection.execute(
+                'INSERT INTO phrase_counts SELECT ?, c.scrivening_id, p.id, c.count '
+                'FROM new_counts c JOIN phrases p ON p.text = c.text', (project_id,))
+            connection.execute(
+                'INSERT INTO occurrences SELECT ?, p.id, o.scrivening_id, o.paragraph, o.start, o.end '
+                'FROM new_occurrences o JOIN phrases p ON p.text = o.text', (project_id,))
+            connection.execute('DELETE FROM new_counts')
+            connection.execute('DELETE FROM new_occurrences')
+
+        return len(changed) + len(removed)
+
+    def _delete_scrivenings(self, project_id: int, scrivening_ids: List[str] = None):
+        """
+        Delete the stored results of some of a project's scrivenings, or all of them.
+        """
+        for table in ('scrivenings', 'phrase_counts', 'occurrences'):
+            if scrivening_ids is None:
+                self.connection.execute('DELETE FROM {} WHERE project_id = ?'.format(table), (project_id,))
+            else:
+                self.connection.executemany(
+                    'DELETE FROM {} WHERE project_id = ? AND scrivening_id = ?'.format(table),
+                    [(project_id, scrivening_id) for scrivening_id in scrivening_ids])
+
+    def _analyze(self, scrivening: Scrivening, tokenizer: Tokenizer, max_n: int, min_n: int, words_only: bool,
+                 fold_case: bool, occurrences: bool) -> Tuple[int, ...]:
+        """
+        Count the phrases in one scrivening, not including its children, into the temporary tables.
+
+        :return: The scrivening's statistics, in the order of _STATS_COLUMNS.
+        """
+        stream = encode_tokens(iter_tokens([scrivening], False, tokenizer))
+        stats = ProseStats.from_stream(stream)
+        matched = stream.folded() if fold_case else stream
+        excluded = excluded_ids(matched.vocabulary, words_only=words_only)
+        scrivening_id = str(scrivening.id)
+
+        counts, located = [], []
+        for n, keys, key_counts, first in iter_ngram_keys(matched, max_n, min_n, excluded):
+            texts = [' '.join(matched.vocabulary.decode(matched.ids[position:position + n]))
+                     for position in first.tolist()]
+            counts.extend(zip([scrivening_id] * len(texts), [n] * len(texts), texts, key_counts.tolist()))
+            if occurrences:
+                positions = np.flatnonzero(keys >= 0)
+                ends = positions + n - 1
+                located.extend(zip([scrivening_id] * len(positions), [texts[key] for key in keys[positions].tolist()],
+                                   stream.paragraphs[positions].tolist(), stream.starts[positions].tolist(),
+                                   stream.ends[ends].tolist()))
+
+        self.connection.executemany('INSERT INTO new_counts VALUES (?, ?, ?, ?)', counts)
+        self.connection.executemany('INSERT INTO new_occurrences VALUES (?, ?, ?, ?, ?)', located)
+        return (len(stream), stats.words, stats.sentences, stats.paragraphs, stats.syllables,
+                int(stats.sentence_dialogue.sum()))
+
+    def _subtree_filter(self, project_id: int, scrivening_id, recursive: bool) -> Tuple[str, tuple]:
+        """
+        Build a WHERE clause on the scrivenings table, s, for a project, a scrivening, or a subtree.
+        """
+        if scrivening_id is None:
+            return 's.project_id = ?', (project_id,)
+        if not recursive:
+            return 's.project_id = ? AND s.scrivening_id = ?', (project_id, str(scrivening_id))
+
+        row = self.connection.execute('SELECT binder_path FROM scrivenings WHERE project_id = ? AND scrivening_id = ?',
+                                      (project_id, str(scrivening_id))).fetchone()
+        if row is None:
+            raise KeyError("No results stored for scrivening ID {}".format(scrivening_id))
+        return 's.project_id = ? AND s.binder_path >= ? AND s.binder_path < ?', \
+            (project_id,) + _subtree_bounds(row[0])
+
+    def top_phrases(self, project_dir: str, n: int = None, scrivening_id=None, recursive: bool = True,
+                    k: int = 20) -> List[Tuple[str, int]]:
+        """
+        Get the most frequent phrases in a project or part of it.
+
+        :param project_dir: The project's directory.
+        :param n: Length of the phrases. Defaults to every length.
+        :param scrivening_id: ID of the scrivening to look in. Defaults to the whole project.
+        :param recursive: If True, include the scrivening's children.
+        :param k: Number of phrases to get.
+        :return: List of (phrase, count) tuples, most frequent first. Tokens in a phrase are separated by
+        spaces.
+        """
+        where, parameters = self._subtree_filter(self._project_id(project_dir), scrivening_id, recursive)
+        if n is not None:
+            where += ' AND p.n = ?'
+            parameters += (n,)
+        # CROSS JOIN makes SQLite find the subtree's scrivenings by binder path first
+        return self.connection.execute(
+            'SELECT p.text, SUM(c.count) AS total FROM scrivenings s '
+            'CROSS JOIN phrase_counts c ON c.project_id = s.project_id AND c.scrivening_id = s.scrivening_id '
+            'JOIN phrases p ON p.id = c.phrase_id '
+            'WHERE {} GROUP BY p.id ORDER BY total DESC, p.text LIMIT ?'.format(where),
+            parameters + (k,)).fetchall()
+
+    def phrase_count(self, project_dir: str, phrase: str, scrivening_id=None, recursive: bool = True) -> int:
+        """
+        Count a phrase in a project or part of it.
+
+        :param project_dir: The project's directory.
+        :param phrase: The phrase, with its tokens separated by spaces, and case-folded if the store is.
+        :param scrivening_id: ID of the scrivening to look in. Defaults to the whole project.
+        :param recursive: If True, include the scrivening's children.
+        :return: Number of times the phrase occurs.
+        """
+        where, parameters = self._subtree_filter(self._project_id(project_dir), scrivening_id, recursive)
+        row = self.connection.execute(
+            'SELECT SUM(c.count) FROM phrases p '
+            'JOIN phrase_counts c ON c.phrase_id = p.id '
+            'JOIN scrivenings s ON s.project_id = c.project_id AND s.scrivening_id = c.scrivening_id '
+            'WHERE p.text = ? AND {}'.format(where), (phrase,) + parameters).fetchone()
+        return row[0] or 0
+
+    def occurrences(self, project_dir: str, phrase: str) -> List[Location]:
+        """
+        Find every occurrence of a phrase. The store must have been updated with occurrences=True.
+
+        :param project_dir: The project's directory.
+        :param phrase: The phrase, with its tokens separated by spaces, and case-folded if the store is.
+        :return: List of the phrase's locations in compile order. Scrivening IDs are strings.
+        """
+        rows = self.connection.execute(
+            'SELECT o.scrivening_id, o.paragraph, o.start, o.end FROM phrases p '
+            'JOIN occurrences o ON o.phrase_id = p.id AND o.project_id = ? '
+            'JOIN scrivenings s ON s.project_id = o.project_id AND s.scrivening_id = o.scrivening_id '
+            'WHERE p.text = ? ORDER BY s.position, o.paragraph, o.start',
+            (self._project_id(project_dir), phrase)).fetchall()
+        return [Location(*row) for row in rows]
+
+    def stats(self, project_dir: str, scrivening_id=None, recursive: bool = True) -> Dict[str, int]:
+        """
+        Get the totals of the stored prose statistics of a project or part of it.
+
+        :param project_dir: The project's directory.
+        :param scrivening_id: ID of the scrivening to look in. Defaults to the whole project.
+        :param recursive: If True, include the scrivening's children.
+        :return: Dictionary of the number of tokens, words, sentences, paragraphs, syllables and
+        dialogue_words.
+        """
+        where, parameters = self._subtree_filter(self._project_id(project_dir), scrivening_id, recursive)
+        row = self.connection.execute('SELECT {} FROM scrivenings s WHERE {}'.format(
+            ', '.join('SUM(s.{})'.format(column) for column in _STATS_COLUMNS), where), parameters).fetchone()
+        return {column: value or 0 for column, value in zip(_STATS_COLUMNS, row)}
+
+    def scrivenings(self, project_dir: str) -> List[Dict[str, object]]:
+        """
+        List a project's stored scrivenings in compile order.
+
+        :param project_dir: The project's directory.
+        :return: List of dictionaries of each scrivening's ID, parent ID, binder path, title, content hash
+        and statistics.
+        """
+        cursor = self.connection.execute(
+            'SELECT scrivening_id, parent_id, binder_path, title, content_hash, {} FROM scrivenings '
+            'WHERE project_id = ? ORDER BY position'.format(', '.join(_STATS_COLUMNS)),
+            (self._project_id(project_dir),))
+        names = [description[0] for description in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+
+def open_store(project: ScrivenerProject, path: str, **kwargs) -> AnalysisStore:
+    """
+    Open a project's store and bring it up to date.
+
+    :param project: The project.
+    :param path: Path of the database, such as STORE_FILE_NAME in a cache directory. Keep it out of the .scriv
+    package, whose files belong to Scrivener.
+    :param kwargs: Arguments to AnalysisStore.update.
+    :return: The up-to-date store.
+    """
+    store = AnalysisStore(path)
+    store.update(project, **kwargs)
+    return store
@@ -0,0 +1,198 @@
+"""
+Sparse matrices of term counts by part of the manuscript, for comparing word and phrase use between
+chapters or other binder nodes.
+
+Matrices are stored as compressed sparse rows in plain NumPy arrays: row i's terms are
+indices[indptr[i]:indptr[i+1]] and their values are data[indptr[i]:indptr[i+1]].
+"""
+from typing import Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from .ngrams import excluded_ids, iter_ngram_keys
+from .scrivener import Scrivening, ScrivenerProject, get_binder_level
+from .tokenizers import Tokenizer
+from .vocabulary import TokenStream, encode_project
+
+
+class TermMatrix(object):
+    """
+    Sparse matrix with a row for each binder node and a column for each term, a word or a phrase.
+    """
+    def __init__(self, nodes: List[Scrivening], terms: Sequence, indptr: np.ndarray, indices: np.ndarray,
+                 data: np.ndarray):
+        """
+        :param nodes: The scrivening each row counts, along with its children.
+        :param terms: The term each column counts: a token, or a tuple of tokens for phrases.
+        :param indptr: Where each row's entries start in indices and data, plus the total number of entries.
+        :param indices: Column of each entry, sorted within each row.
+        :param data: Value of each entry.
+        """
+        self.nodes = nodes
+        self.terms = terms
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.nodes), len(self.terms)
+
+    def _rows(self) -> np.ndarray:
+        # Row of each entry
+        return np.repeat(np.arange(len(self.nodes)), np.diff(self.indptr))
+
+    def _with_data(self, data: np.ndarray) -> 'TermMatrix':
+        return TermMatrix(self.nodes, self.terms, self.indptr, self.indices, data)
+
+    def row(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get one row's entries.
+
+        :param index: The row.
+        :return: Tuple of the columns and values of the row's non-zero entries.
+        """
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def _row_sums(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self._rows(), weights=values, minlength=len(self.nodes))
+
+    def row_totals(self) -> np.ndarray:
+        return self._row_sums(self.data)
+
+    def column_totals(self) -> np.ndarray:
+        return np.bincount(self.indices, weights=self.data, minlength=len(self.terms))
+
+    def document_frequencies(self) -> np.ndarray:
+        """
+        Count the rows each term appears in.
+        """
+        return np.bincount(self.indices, minlength=len(self.terms))
+
+    def to_dense(self) -> np.ndarray:
+        dense = np.zeros(self.shape, dtype=self.data.dtype)
+        dense[self._rows(), self.indices] = self.data
+        return dense
+
+    def relative_frequencies(self) -> 'TermMatrix':
+        """
+        Divide each count by its row's total, so that rows of different lengths can be compared.
+        """
+        return self._with_data(self.data / np.maximum(self.row_totals(), 1)[self._rows()])
+
+    def tfidf(self, normalize: bool = True) -> 'TermMatrix':
+        """
+        Weight each count by how few rows its term appears in, using smoothed inverse document frequency,
+        ln((1 + rows) / (1 + rows with the term)) + 1.
+
+        :param normalize: If True, scale each row to unit length.
+        """
+        idf = np.log((1 + len(self.nodes)) / (1 + self.document_frequencies())) + 1
+        data = self.data * idf[self.indices]
+        if normalize:
+            norms = np.sqrt(self._row_sums(data ** 2))
+            data = data / norms[self._rows()]
+        return self._with_data(data)
+
+    def keyness(self) -> 'TermMatrix':
+        """
+        Score how over-represented each term is in each row compared with the rest of the matrix, using
+        Dunning's log-likelihood. Under-represented terms get negative scores.
+        """
+        rows = self._rows()
+        count = self.data.astype(np.float64)
+        row_total = self.row_totals()[rows]
+        rest = self.column_totals()[self.indices] - count
+        rest_total = float(self.data.sum()) - row_total
+
+        expected = row_total * (count + rest) / np.maximum(row_total + rest_total, 1)
+        expected_rest = rest_total * (count + rest) / np.maximum(row_total + rest_total, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g2 = 2 * (np.where(count > 0, count * np.log(count / expected), 0) +
+                      np.where(rest > 0, rest * np.log(rest / expected_rest), 0))
+        over = count / np.maximum(row_total, 1) >= rest / np.maximum(rest_total, 1)
+        return self._with_data(np.where(over, g2, -g2))
+
+    def over_represented(self, k: int = 10, min_count: int = 1) -> List[List[Tuple[object, float]]]:
+        """
+        Find each row's most over-represented terms.
+
+        :param k: Number of terms to find for each row.
+        :param min_count: Leave out terms that occur fewer times than this in the row.
+        :return: List with each row's (term, log-likelihood) tuples, most over-represented first.
+        """
+        scores = self.keyness().data
+        rows = self._rows()
+        candidates = np.flatnonzero((self.data >= min_count) & (scores > 0))
+        order = candidates[np.lexsort((-scores[candidates], rows[candidates]))]
+        # Rank of each entry within its row
+        row_starts = np.searchsorted(rows[order], np.arange(len(self.nodes)))
+        ranks = np.arange(len(order)) - row_starts[rows[order]]
+        order = order[ranks < k]
+
+        results = [[] for _ in self.nodes]
+        for entry in order.tolist():
+            results[rows[entry]].append((self.terms[self.indices[entry]], float(scores[entry])))
+        return results
+
+
+def build_term_matrix(stream: TokenStream, nodes: Iterable[Scrivening], n: int = 1, exclude: Iterable[str] = None,
+                      words_only: bool = False) -> TermMatrix:
+    """
+    Count every term in each of several binder nodes.
+
+    :param stream: Token stream that contains the nodes, such as a whole project's. Case-fold it first to
+    count "The" and "the" together.
+    :param nodes: Scrivenings to count, each along with its children. They shouldn't overlap.
+    :param n: Number of tokens in each term. Phrases don't cross scrivenings.
+    :param exclude: Tokens that can't be part of a term.
+    :param words_only: If True, tokens with no letters or digits, such as punctuation, can't be part of a term.
+    :return: Matrix of counts with a row per node.
+    """
+    nodes = list(nodes)
+    excluded = excluded_ids(stream.vocabulary, exclude, words_only)
+
+    if n == 1:
+        keys = stream.ids.astype(np.int64)
+        if len(excluded):
+            keys = np.where(excluded[stream.ids], -1, keys)
+        terms = list(stream.vocabulary)
+    else:
+        keys, first = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        for _, keys, _, first in iter_ngram_keys(stream, n, n, excluded):
+            pass
+        decode = stream.vocabulary.decode
+        terms = [tuple(decode(stream.ids[position:position + n])) for position in first.tolist()]
+
+    # Row of each position, or -1 outside every node
+    rows = np.full(len(keys), -1, dtype=np.int64)
+    for row, node in enumerate(nodes):
+        start, end = stream.subtree_range(node)
+        rows[start:min(end, len(keys))] = row
+    valid = (rows >= 0) & (keys >= 0)
+
+    cells, counts = np.unique(rows[valid] * max(len(terms), 1) + keys[valid], return_counts=True)
+    entry_rows = cells // max(len(terms), 1)
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(entry_rows, minlength=len(nodes)))))
+    return TermMatrix(nodes, terms, indptr, cells % max(len(terms), 1), counts.astype(np.int64))
+
+
+def project_term_matrix(project: ScrivenerProject, depth: int = 0, n: int = 1, fold_case: bool = True,
+                        tokenizer: Union[str, Tokenizer] = None, **kwargs) -> TermMatrix:
+    """
+    Count every term in each binder node at one depth of a project.
+
+    :param project: The project.
+    :param depth: Depth of the nodes to count: 0 for the top-level scrivenings, 1 for their children, and
+    so on.
+    :param n: Number of tokens in each term.
+    :param fold_case: If True, ignore case.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :param kwargs: Other arguments to build_term_matrix.
+    :return: Matrix of counts with a row per node.
+    """
+    stream = encode_project(project, tokenizer=tokenizer)
+    if fold_case:
+        stream = stream.folded()
+    return build_term_matrix(stream, get_binder_level(project.scrivenings, depth), n, **kwargs)
@@ -0,0 +1,251 @@
+"""
+Tokenizer backends that split text into sentences and sentences into words.
+
+The nltk backend reproduces nltk.word_tokenize exactly but needs the punkt model on disk. The regex backend
+has no dependencies and matches the Treebank tokenization on ordinary prose.
+"""
+import re
+from typing import List, Tuple, Union
+
+
+class Tokenizer(object):
+    """
+    Base class for tokenizer backends.
+    """
+    name = None
+
+    def load(self):
+        """
+        Load any models the tokenizer needs. Called before tokenizing in worker processes so that models are
+        loaded once per process.
+        """
+        pass
+
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Split text into sentences.
+
+        The first sentence starts at the start of the text, and later sentences start at their first
+        non-whitespace character. No sentence ends with whitespace.
+
+        :param text: The text to split.
+        :return: List of the [start, end) character offsets of each sentence.
+        """
+        raise NotImplementedError
+
+    def word_spans(self, sentence: str) -> List[Tuple[str, int, int]]:
+        """
+        Split a sentence into words.
+
+        :param sentence: The sentence to split.
+        :return: List of (token, start, end) tuples, where [start, end) are the token's character offsets.
+        A token may differ from the text it came from, such as when double quotes are rewritten as `` or ''.
+        """
+        raise NotImplementedError
+
+    def tokenize(self, text: str) -> List[str]:
+        """
+        Split text into words.
+
+        :param text: The text to split.
+        :return: List of tokens.
+        """
+        return [token for start, end in self.sentence_spans(text)
+                for token, _, _ in self.word_spans(text[start:end])]
+
+
+class NltkTokenizer(Tokenizer):
+    """
+    Tokenize with nltk's punkt sentence tokenizer and its Treebank-derived word tokenizer, the same way
+    nltk.word_tokenize does. nltk is imported the first time the tokenizer is used.
+    """
+    name = 'nltk'
+
+    _QUOTES_RE = re.compile(r"``|'{2}|\"")
+
+    def __init__(self, language: str = 'english'):
+        self.language = language
+        self._punkt = None
+        self._words = None
+
+    def __getstate__(self):
+        # Don't ship loaded models to other processes; they load their own
+        return {'language': self.language, '_punkt': None, '_words': None}
+
+    def load(self):
+        if self._punkt is not None:
+            return
+
+        import nltk
+        from nltk.tokenize import NLTKWordTokenizer
+        try:
+            try:
+                from nltk.tokenize import PunktTokenizer
+            except ImportError:
+                # Older versions of nltk load the pickled model directly
+                self._punkt = nltk.data.load('tokenizers/punkt/{}.pickle'.format(self.language))
+            else:
+                self._punkt = PunktTokenizer(self.language)
+        except LookupError as e:
+            raise LookupError("The nltk punkt model for {} isn't installed. Install it with python -m "
+                              "nltk.downloader punkt_tab (punkt for older versions of nltk), or use the regex "
+                              "tokenizer".format(self.language)) from e
+        self._words = NLTKWordTokenizer()
+
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        self.load()
+        return list(self._punkt.span_tokenize(text))
+
+    def word_spans(self, sentence: str) -> List[Tuple[str, int, int]]:
+        self.load()
+        from nltk.tokenize.util import align_tokens
+
+        tokens = self._words.tokenize(sentence)
+
+        # The Treebank tokenizer rewrites double quotes, so align against the quotes actually in the text
+        if '"' in sentence or "''" in sentence:
+            matched = [m.group() for m in self._QUOTES_RE.finditer(sentence)]
+            originals = [matched.pop(0) if token in ('"', '``', "''") else token for token in tokens]
+        else:
+            originals = tokens
+
+        return [(token, start, end) for token, (start, end) in zip(tokens, align_tokens(originals, sentence))]
+
+    def tokenize(self, text: str) -> List[str]:
+        self.load()
+        # What nltk.word_tokenize does, with the models already loaded
+        return [token for sentence in self._punkt.tokenize(text) for token in self._words.tokenize(sentence)]
+
+
+# Abbreviations that don't end a sentence. Single-letter initials and dotted abbreviations like "U.S." are
+# handled separately.
+_ABBREVIATIONS = frozenset((
+    'mr', 'mrs', 'ms', 'dr', 'st', 'jr', 'sr', 'prof', 'rev', 'hon', 'gen', 'col', 'lt', 'sgt', 'capt', 'cmdr',
+    'adm', 'gov', 'sen', 'rep', 'pres', 'fr', 'mt', 'ft', 'ave', 'blvd', 'rd', 'co', 'corp', 'inc', 'ltd',
+    'vs', 'etc', 'cf', 'al', 'approx', 'dept', 'est', 'fig', 'no', 'vol', 'pp', 'jan', 'feb', 'mar', 'apr',
+    'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun',
+))
+_CLOSING_PUNCTUATION = ')"\'”’»]}'
+_OPENING_PUNCTUATION = '("\'“‘«[{'
+_DOTTED_ABBREVIATION_RE = re.compile(r'(?:\w\.)+\w')
+_NON_SPACE_RE = re.compile(r'\S+')
+
+# Characters the Treebank tokenizer always splits off as tokens of their own
+_SPLIT = r';@#$%&?!*\[\](){}<>‒-―«“‘„»”’'
+_CLITICS = r"'[sSmMdD]|'ll|'LL|'re|'RE|'ve|'VE|n't|N'T"
+# Where a token has to end for a clitic to be split off of it
+_END = r'(?=[\s{split}"`]|[:,](?!\d)|\.{{2,}}|--|$)'.format(split=_SPLIT)
+
+_WORD_RE = re.compile(r"""
+    (?P<dots>\.{{2,}})
+  | (?P<dashes>--)
+  | (?P<backticks>`+)
+  | (?P<dquote>"|'')
+  | (?P<clitic>(?<=[^\s'])(?:{clitics}){end})
+  | (?P<compound>(?<!\w)(?:[Cc]an(?=not\b)|[Gg]on(?=na\b)|[Gg]ot(?=ta\b)|[Ww]an(?=na\b)|[Gg]im(?=me\b)|
+                  [Ll]em(?=me\b)))
+  | (?P<squote>(?<=[^\s'])'{end}|(?<!\w)'(?!(?i:re|ve|ll|m|t|s|d|n)\b)(?=\w))
+  | (?P<punctuation>[{split}]|[:,](?!\d))
+  | (?P<word>(?:(?!(?:{clitics}){end})
+                (?:[^\s{split}"`:,.'\-]|[:,](?=\d)|\.(?!\.)|-(?!-)|(?:(?<=\w)|(?!'\w))'(?!{end})))+)
+  | (?P<other>\S)
+""".format(clitics=_CLITICS, end=_END, split=_SPLIT), re.VERBOSE)
+_FINAL_PERIOD_RE = re.compile(r'[^.](\.)[\]\)}>"\'»”’ ]*\s*$')
+_DQUOTE_OPENERS = ' ([{<«“‘„`'
+
+
+class RegexTokenizer(Tokenizer):
+    """
+    Tokenize with compiled regular expressions.
+
+    Sentences end at ? and !, and at periods that don't follow a known abbreviation, an initial, or a dotted
+    abbreviation. Words are split in a single regular expression pass that follows the Treebank rules.
+    """
+    name = 'regex'
+
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        words = list(_NON_SPACE_RE.finditer(text))
+        if not words:
+            return []
+
+        spans = []
+        start = 0
+        for word, following in zip(words, words[1:]):
+            if self._ends_sentence(word.group(), following.group()):
+                spans.append((start, word.end()))
+                start = following.start()
+        spans.append((start, words[-1].end()))
+
+        return spans
+
+    @staticmethod
+    def _ends_sentence(word: str, following: str) -> bool:
+        word = word.rstrip(_CLOSING_PUNCTUATION)
+        if word.endswith(('?', '!')):
+            return True
+        if not word.endswith('.') or word.endswith('..'):
+            return False
+
+        word = word.rstrip('.').lstrip(_OPENING_PUNCTUATION).lower()
+        if word.isdigit():
+            # A numbered list item or a number mid-sentence, unless a capitalized word follows
+            return not following.lstrip(_OPENING_PUNCTUATION)[:1].islower()
+        return not (word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha()) or
+                    _DOTTED_ABBREVIATION_RE.fullmatch(word))
+
+    def word_spans(self, sentence: str) -> List[Tuple[str, int, int]]:
+        final_period = _FINAL_PERIOD_RE.search(sentence)
+        if final_period:
+            period = final_period.start(1)
+            spans = self._words(sentence, 0, period)
+            spans.append(('.', period, period + 1))
+            spans.extend(self._words(sentence, period + 1, len(sentence)))
+            return spans
+        return self._words(sentence, 0, len(sentence))
+
+    @staticmethod
+    def _words(sentence: str, start: int, end: int) -> List[Tuple[str, int, int]]:
+        spans = []
+        for match in _WORD_RE.finditer(sentence, start, end):
+            token = match.group()
+            if match.lastgroup == 'dquote':
+                begin = match.start()
+                if (begin == 0 and token == '"') or (begin > 0 and sentence[begin - 1] in _DQUOTE_OPENERS):
+                    token = '``'
+                else:
+                    token = "''"
+            spans.append((token, match.start(), match.end()))
+        return spans
+
+
+TOKENIZERS = {
+    NltkTokenizer.name: NltkTokenizer,
+    RegexTokenizer.name: RegexTokenizer,
+}
+DEFAULT_TOKENIZER = NltkTokenizer.name
+
+_instances = {}
+
+
+def get_tokenizer(tokenizer: Union[str, Tokenizer] = None) -> Tokenizer:
+    """
+    Get a tokenizer backend.
+
+    :param tokenizer: A tokenizer, the name of a backend in TOKENIZERS, or None for the default backend.
+    :return: The tokenizer. Backends requested by name are shared.
+    """
+    if isinstance(tokenizer, Tokenizer):
+        return tokenizer
+    if tokenizer is None:
+        tokenizer = DEFAULT_TOKENIZER
+
+    try:
+        return _instances[tokenizer]
+    except KeyError:
+        pass
+    try:
+        instance = _instances[tokenizer] = TOKENIZERS[tokenizer]()
+    except KeyError:
+        raise ValueError("Unknown tokenizer {}; expected one of {}".format(
+            tokenizer, ", ".join(sorted(TOKENIZERS)))) from None
+    return instance
@@ -0,0 +1,324 @@
+"""
+Intern tokens as dense integer IDs and store token streams as arrays of those IDs.
+"""
+from array import array
+from collections import namedtuple
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from .scrivener import Scrivening, ScrivenerProject, TaggedToken, iter_tokens
+from .tokenizers import Tokenizer
+
+# array typecode for unsigned 32-bit integers, so that arrays can be handed to numpy without copying
+_UINT32 = 'I' if array('I').itemsize == 4 else 'L'
+
+Location = namedtuple('Location', ['scrivening_id', 'paragraph', 'start', 'end'])
+Location.__doc__ = """
+Where a token is in the manuscript: its scrivening's ID, the index of its paragraph in that scrivening's
+text, and its [start, end) character offsets in that paragraph.
+"""
+
+
+class Vocabulary(object):
+    """
+    Two-way mapping between tokens and dense integer IDs, assigned in order of first appearance.
+    """
+    def __init__(self, tokens: Iterable[str] = ()):
+        self._ids = {}
+        self._tokens = []
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, token):
+        return token in self._ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tokens)
+
+    def add(self, token: str) -> int:
+        """
+        Add a token to the vocabulary if it isn't already there.
+
+        :param token: The token to add.
+        :return: The token's ID.
+        """
+        try:
+            return self._ids[token]
+        except KeyError:
+            token_id = self._ids[token] = len(self._tokens)
+            self._tokens.append(token)
+            return token_id
+
+    def id(self, token: str) -> int:
+        """
+        Get the ID of a token.
+
+        :param token: The token to look up.
+        :return: The token's ID.
+        :raises KeyError: If the token isn't in the vocabulary.
+        """
+        return self._ids[token]
+
+    def get(self, token: str, default: int = None) -> int:
+        return self._ids.get(token, default)
+
+    def token(self, token_id: int) -> str:
+        return self._tokens[token_id]
+
+    def encode(self, tokens: Iterable[str], add: bool = True) -> np.ndarray:
+        """
+        Convert tokens to an array of IDs.
+
+        :param tokens: The tokens to convert.
+        :param add: If True, add unknown tokens to the vocabulary. If False, unknown tokens raise a KeyError.
+        :return: Array of token IDs.
+        """
+        lookup = self.add if add else self.id
+        return _uint32(array(_UINT32, (lookup(token) for token in tokens)))
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        """
+        Convert an array of IDs back to tokens.
+
+        :param ids: The IDs to convert.
+        :return: List of tokens.
+        """
+        tokens = self._tokens
+        return [tokens[token_id] for token_id in np.asarray(ids).tolist()]
+
+    def map(self, func: Callable[[str], str]) -> Tuple['Vocabulary', np.ndarray]:
+        """
+        Apply a function to every token in the vocabulary, such as to case fold or normalize them.
+
+        The function is called once per distinct token, not once per occurrence.
+
+        :param func: Function that converts a token to its mapped form.
+        :return: Tuple of the vocabulary of mapped tokens and an array that converts this vocabulary's IDs to
+        the mapped vocabulary's IDs.
+        """
+        mapped = Vocabulary()
+        return mapped, mapped.encode(func(token) for token in self._tokens)
+
+
+class TokenStream(object):
+    """
+    A sequence of tokens stored as an array of vocabulary IDs, along with where each token came from.
+
+    Tokens from each scrivening are contiguous, and the offsets table records where each scrivening's
+    tokens start and end: the tokens of scrivening_ids[i] are ids[offsets[i]:offsets[i+1]]. Likewise, the
+    tokens of sentence i are ids[sentence_offsets[i]:sentence_offsets[i+1]].
+    """
+    def __init__(self, vocabulary: Vocabulary, ids: np.ndarray, scrivening_ids: list, offsets: np.ndarray,
+                 paragraphs: np.ndarray, starts: np.ndarray, ends: np.ndarray, sentence_offsets: np.ndarray):
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.scrivening_ids = scrivening_ids
+        self.offsets = offsets
+        self.paragraphs = paragraphs
+        self.starts = starts
+        self.ends = ends
+        self.sentence_offsets = sentence_offsets
+
+        self._scrivening_indices = {scrivening_id: index for index, scrivening_id in enumerate(scrivening_ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tokens(self, start: int = 0, end: int = None) -> List[str]:
+        """
+        Get the tokens in the stream as strings.
+
+        :param start: Position of the first token to get.
+        :param end: Position after the last token to get. Defaults to the end of the stream.
+        :return: List of tokens.
+        """
+        return self.vocabulary.decode(self.ids[start:end])
+
+    def scrivening_range(self, scrivening_id) -> Tuple[int, int]:
+        """
+        Find a scrivening's tokens in the stream.
+
+        :param scrivening_id: ID of the scrivening.
+        :return: The [start, end) positions of the scrivening's tokens. If the scrivening has no tokens in the
+        stream, the range is empty.
+        """
+        try:
+            index = self._scrivening_indices[scrivening_id]
+        except KeyError:
+            return 0, 0
+        return int(self.offsets[index]), int(self.offsets[index + 1])
+
+    def _subtree_indices(self, scrivening: Scrivening) -> Tuple[int, int]:
+        """
+        Find the [first, end) indices into scrivening_ids of a scrivening and its children.
+        """
+        subtree_ids = set()
+        pending = [scrivening]
+        while pending:
+            node = pending.pop()
+            subtree_ids.add(node.id)
+            pending.extend(node.children)
+
+        # A scrivening's children follow it in compile order, so its subtree's tokens are contiguous
+        indices = [index for index, scrivening_id in enumerate(self.scrivening_ids) if scrivening_id in subtree_ids]
+        if not indices:
+            return 0, 0
+        return indices[0], indices[-1] + 1
+
+    def subtree_range(self, scrivening: Scrivening) -> Tuple[int, int]:
+        """
+        Find the tokens that came from a scrivening and its children.
+
+        :param scrivening: The scrivening.
+        :return: The [start, end) positions of the tokens. If the scrivening has no tokens in the stream, the
+        range is empty.
+        """
+        first, end = self._subtree_indices(scrivening)
+        if end <= first:
+            return 0, 0
+        return int(self.offsets[first]), int(self.offsets[end])
+
+    def subtree(self, scrivening: Scrivening) -> 'TokenStream':
+        """
+        Get the part of the stream that came from a scrivening and its children.
+
+        :param scrivening: The scrivening.
+        :return: Token stream sharing this stream's vocabulary. Positions in it start from 0.
+        """
+        return self._slice(*self._subtree_indices(scrivening))
+
+    def _slice(self, first: int, end: int) -> 'TokenStream':
+        """
+        Get the part of the stream from scrivening_ids[first] up to but not including scrivening_ids[end].
+        """
+        if end <= first:
+            empty = np.zeros(0, dtype=np.uint32)
+            return TokenStream(self.vocabulary, empty, [], np.zeros(1, dtype=np.int64), empty, empty, empty,
+                               np.zeros(1, dtype=np.int64))
+
+        start, stop = int(self.offsets[first]), int(self.offsets[end])
+        # Sentences can run across scrivenings, so cut them at the ends of the slice
+        inner = self.sentence_offsets[(self.sentence_offsets > start) & (self.sentence_offsets < stop)]
+        return TokenStream(self.vocabulary, self.ids[start:stop], self.scrivening_ids[first:end],
+                           self.offsets[first:end + 1] - start, self.paragraphs[start:stop],
+                           self.starts[start:stop], self.ends[start:stop],
+                           np.concatenate(([start], inner, [stop])).astype(np.int64) - start)
+
+    def scrivening_index(self) -> np.ndarray:
+        """
+        Get the index into scrivening_ids of each token's scrivening.
+
+        :return: Array with one entry per token.
+        """
+        return np.repeat(np.arange(len(self.scrivening_ids), dtype=np.uint32), np.diff(self.offsets))
+
+    def locate(self, position: int) -> Location:
+        """
+        Find where a token came from.
+
+        :param position: Position of the token in the stream.
+        :return: The token's location.
+        """
+        index = int(np.searchsorted(self.offsets, position, side='right')) - 1
+        return Location(self.scrivening_ids[index], int(self.paragraphs[position]), int(self.starts[position]),
+                        int(self.ends[position]))
+
+    def view(self, func: Callable[[str], str]) -> 'TokenStream':
+        """
+        Get a view of the stream with every token mapped through a function, such as to case fold them.
+
+        The view has its own vocabulary and ID array but shares everything else with this stream.
+
+        :param func: Function that converts a token to its mapped form.
+        :return: The mapped token stream.
+        """
+        vocabulary, mapping = self.vocabulary.map(func)
+        return TokenStream(vocabulary, mapping[self.ids], self.scrivening_ids, self.offsets, self.paragraphs,
+                           self.starts, self.ends, self.sentence_offsets)
+
+    def folded(self) -> 'TokenStream':
+        """
+        Get a case-folded view of the stream.
+        """
+        return self.view(str.casefold)
+
+
+def _uint32(values: array) -> np.ndarray:
+    return np.frombuffer(values, dtype=np.uint32) if values else np.zeros(0, dtype=np.uint32)
+
+
+def encode_tokens(tagged_tokens: Iterable[TaggedToken], vocabulary: Vocabulary = None) -> TokenStream:
+    """
+    Convert tagged tokens into a token stream.
+
+    :param tagged_tokens: The tokens, such as from iter_scrivening_tokens.
+    :param vocabulary: Vocabulary to add the tokens to. Defaults to a new one.
+    :return: The token stream.
+    """
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+    add = vocabulary.add
+
+    ids = array(_UINT32)
+    paragraphs = array(_UINT32)
+    starts = array(_UINT32)
+    ends = array(_UINT32)
+    scrivening_ids = []
+    offsets = [0]
+    sentence_offsets = [0]
+
+    current_scrivening = current_sentence = None
+    for position, tagged in enumerate(tagged_tokens):
+        if tagged.scrivening_id != current_scrivening:
+            if position:
+                offsets.append(position)
+            scrivening_ids.append(tagged.scrivening_id)
+            current_scrivening = tagged.scrivening_id
+        if tagged.sentence != current_sentence:
+            if position:
+                sentence_offsets.append(position)
+            current_sentence = tagged.sentence
+
+        ids.append(add(tagged.token))
+        paragraphs.append(tagged.paragraph)
+        starts.append(tagged.start)
+        ends.append(tagged.end)
+
+    if ids:
+        offsets.append(len(ids))
+        sentence_offsets.append(len(ids))
+
+    return TokenStream(vocabulary, _uint32(ids), scrivening_ids, np.array(offsets, dtype=np.int64),
+                       _uint32(paragraphs), _uint32(starts), _uint32(ends),
+                       np.array(sentence_offsets, dtype=np.int64))
+
+
+def encode_scrivening(scrivening: Scrivening, vocabulary: Vocabulary = None, recursive: bool = True,
+                      tokenizer: Union[str, Tokenizer] = None) -> TokenStream:
+    """
+    Tokenize a scrivening into a token stream.
+
+    :param scrivening: The scrivening to tokenize.
+    :param vocabulary: Vocabulary to add the tokens to. Defaults to a new one.
+    :param recursive: If True, include the scrivening's children.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: The token stream.
+    """
+    return encode_tokens(iter_tokens([scrivening], recursive, tokenizer), vocabulary)
+
+
+def encode_project(project: ScrivenerProject, vocabulary: Vocabulary = None,
+                   tokenizer: Union[str, Tokenizer] = None) -> TokenStream:
+    """
+    Tokenize all of a project's scrivenings into one token stream.
+
+    :param project: The project to tokenize.
+    :param vocabulary: Vocabulary to add the tokens to. Defaults to a new one.
+    :param tokenizer: Tokenizer backend or its name. Defaults to the nltk backend.
+    :return: The token stream.
+    """
+    return encode_tokens(iter_tokens(project.scrivenings, tokenizer=tokenizer), vocabulary)
@@ -0,0 +1,171 @@
+"""
+Scan a manuscript for any of a list of phrases, such as clichés or banned words, in a single pass.
+
+The phrases are compiled into an Aho-Corasick automaton over tokens, so scanning takes time proportional to
+the length of the text plus the number of hits, however many phrases there are.
+"""
+from collections import deque, namedtuple
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+
+from .scrivener import Scrivening, ScrivenerProject
+from .tokenizers import Tokenizer, get_tokenizer
+from .vocabulary import Location, TokenStream, Vocabulary, encode_project, encode_scrivening
+
+Hit = namedtuple('Hit', ['phrase', 'location'])
+Hit.__doc__ = """
+An occurrence of a watched phrase: the phrase as it was given to the watch list, and its location.
+"""
+
+
+class WatchList(object):
+    """
+    A compiled list of phrases to watch for. Build it once and use it to scan any number of token streams.
+    """
+    def __init__(self, phrases: Iterable[str], tokenizer: Union[str, Tokenizer] = None, fold_case: bool = True):
+        """
+        :param phrases: The phrases to watch for. Phrases that tokenize the same way as an earlier one are
+        ignored.
+        :param tokenizer: Tokenizer backend or its name, used to split the phrases into tokens. Scanned text
+        should use the same backend. Defaults to the nltk backend.
+        :param fold_case: If True, ignore case.
+        """
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.fold_case = fold_case
+        self.phrases = []
+        self._lengths = []
+        self._symbols = {}  # type: Dict[str, int]
+
+        # The automaton's states are numbered from 0, the root
+        self._goto = [{}]  # type: List[Dict[int, int]]
+        self._fail = [0]
+        self._output = [()]
+
+        seen = set()
+        for phrase in phrases:
+            tokens = self._tokenize(phrase)
+            if tokens and tokens not in seen:
+                seen.add(tokens)
+                self._add(phrase, tokens)
+        self._link()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'WatchList':
+        """
+        Load a watch list from a text file with one phrase per line. Blank lines and lines starting with #
+        are skipped.
+
+        :param path: Path of the file.
+        :param kwargs: Other arguments to WatchList.
+        :return: The compiled watch list.
+        """
+        with open(path, encoding='utf-8') as fh:
+            phrases = [line.strip() for line in fh]
+        return cls((phrase for phrase in phrases if phrase and not phrase.startswith('#')), **kwargs)
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def _tokenize(self, phrase: str) -> tuple:
+        tokens = self.tokenizer.tokenize(phrase)
+        return tuple(token.casefold() for token in tokens) if self.fold_case else tuple(tokens)
+
+    def _add(self, phrase: str, tokens: tuple):
+        state = 0
+        for token in tokens:
+            symbol = self._symbols.setdefault(token, len(self._symbols))
+            next_state = self._goto[state].get(symbol)
+            if next_state is None:
+                next_state = self._goto[state][symbol] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = (len(self.phrases),)
+        self.phrases.append(phrase)
+        self._lengths.append(len(tokens))
+
+    def _link(self):
+        # Breadth-first, so that every state's failure state is linked before the state itself
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for symbol, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and symbol not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(symbol, 0)
+                self._output[child] += self._output[self._fail[child]]
+
+    def _symbol_ids(self, vocabulary: Vocabulary) -> np.ndarray:
+        """
+        Map a vocabulary's token IDs to the automaton's symbols, with -1 for tokens in no phrase.
+        """
+        normalize = str.casefold if self.fold_case else str
+        return np.array([self._symbols.get(normalize(token), -1) for token in vocabulary], dtype=np.int64)
+
+    def scan(self, stream: TokenStream) -> List[Hit]:
+        """
+        Find every occurrence of the watched phrases in a token stream. Phrases don't match across
+        paragraphs or scrivenings, and overlapping matches are all reported.
+
+        :param stream: The token stream, tokenized with the watch list's tokenizer.
+        :return: List of hits in the order they end in the stream.
+        """
+        if not len(stream) or not self.phrases:
+            return []
+
+        symbols = self._symbol_ids(stream.vocabulary)[stream.ids]
+        # Start over at each new paragraph
+        restart = np.ones(len(stream), dtype=bool)
+        restart[1:] = stream.paragraphs[1:] != stream.paragraphs[:-1]
+        restart[stream.offsets[:-1]] = True
+
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for position, (symbol, new_paragraph) in enumerate(zip(symbols.tolist(), restart.tolist())):
+            if new_paragraph or symbol < 0:
+                state = 0
+                if symbol < 0:
+                    continue
+            while True:
+                next_state = goto[state].get(symbol)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if output[state]:
+                matches.extend((position, phrase_index) for phrase_index in output[state])
+
+        hits = []
+        scrivening_index = stream.scrivening_index()
+        for end, phrase_index in matches:
+            start = end - self._lengths[phrase_index] + 1
+            hits.append(Hit(self.phrases[phrase_index], Location(
+                stream.scrivening_ids[scrivening_index[start]], int(stream.paragraphs[start]),
+                int(stream.starts[start]), int(stream.ends[end]))))
+        return hits
+
+    def scan_scrivening(self, scrivening: Scrivening, recursive: bool = True) -> List[Hit]:
+        """
+        Find every occurrence of the watched phrases in a scrivening.
+
+        :param scrivening: The scrivening.
+        :param recursive: If True, include the scrivening's children.
+        :return: List of hits in compile order.
+        """
+        return self.scan(encode_scrivening(scrivening, recursive=recursive, tokenizer=self.tokenizer))
+
+    def scan_project(self, project: ScrivenerProject) -> List[Hit]:
+        """
+        Find every occurrence of the watched phrases in a project.
+
+        :param project: The project.
+        :return: List of hits in compile order.
+        """
+        return self.scan(encode_project(project, tokenizer=self.tokenizer))
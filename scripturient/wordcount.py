@@ -0,0 +1,279 @@
+"""
+Count the words in scrivenings straight from their RTF bytes, without building a document or tokenizing.
+
+The scanner walks the RTF control words and text once, skipping destinations like the font table, pictures
+and field instructions, and decodes text with the same code pages Rtf15Reader would use. A word is a run of
+characters between whitespace or dashes that has at least one letter or digit, which is how Scrivener counts
+words with em dashes treated as separators. Counts match the text Rtf15Reader extracts counted the same way.
+On ordinary prose, Scrivener's own counts should agree to within about 1%. The differences come from its
+options for hyphens and em dashes, and from inline footnotes and comments, which this scanner counts.
+
+Counts are cached by each file's path and mtime, and the cache can be saved between runs.
+"""
+from collections import Counter
+import json
+import os
+import re
+from typing import Dict, List, Tuple, Union
+
+from pyth.plugins.rtf15.reader import CODEPAGES, CODEPAGES_BY_NUMBER
+
+from . import instrument
+from .scrivener import Scrivening, ScrivenerProject, flatten_scrivenings, scrivening_mtime
+
+# Bump when the saved format or the counting rules change so that old caches are ignored
+_FORMAT_VERSION = 1
+
+_RTF_TOKEN_RE = re.compile(
+    rb"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"  # control word
+    rb"|\\'([0-9a-fA-F]{2})"  # escaped byte
+    rb"|\\([^a-zA-Z'])"  # control symbol
+    rb"|([{}])"  # group
+    rb"|([^\\{}\r\n]+)"  # text
+    rb"|[\r\n]+"
+)
+_WORD_CHARACTER_RE = re.compile(r'\w')
+
+# Groups whose text isn't part of the document, as well as any group starting with \*
+_DESTINATIONS = frozenset((
+    b'fonttbl', b'colortbl', b'stylesheet', b'info', b'listtable', b'listoverridetable', b'revtbl', b'filetbl',
+    b'rsidtbl', b'generator', b'mmath', b'docfmt', b'pgdsctbl', b'listtext', b'pict', b'object', b'fldinst',
+    b'header', b'headerl', b'headerr', b'headerf', b'footer', b'footerl', b'footerr', b'footerf',
+    b'themedata', b'colorschememapping', b'latentstyles', b'datastore', b'xmlnstbl',
+))
+# Control words that separate words
+_SEPARATORS = {
+    b'par': '\n', b'line': '\n', b'sect': '\n', b'page': '\n', b'cell': '\n', b'row': '\n', b'tab': '\t',
+    b'emdash': '\u2014', b'endash': '\u2013', b'emspace': ' ', b'enspace': ' ', b'qmspace': ' ',
+}
+# Control words that stand for a character within a word
+_CHARACTERS = {b'lquote': '\u2018', b'rquote': '\u2019', b'ldblquote': '\u201c', b'rdblquote': '\u201d',
+               b'bullet': '\u2022'}
+_ANSI_CHARSETS = {b'ansi': 'cp1252', b'mac': 'mac-roman', b'pc': 'cp437', b'pca': 'cp850'}
+
+
+def _font_charset(number: int) -> str:
+    charset = CODEPAGES.get(number, 'cp1252')
+    # The symbol font maps bytes to symbols, none of which are letters
+    return 'cp1252' if charset == 'symbol' else charset
+
+
+def rtf_text(data: bytes) -> str:
+    """
+    Extract the text of an RTF document for counting words. Paragraph breaks, tabs and dashes become
+    separators, and formatting is dropped.
+
+    :param data: The RTF document's bytes.
+    :return: The text.
+    """
+    pieces = []  # type: List[str]
+    pending = bytearray()
+
+    charset = 'cp1252'
+    fonts = {}  # type: Dict[int, str]
+    font = None
+    skip = False  # Whether the current group's text is ignored
+    first = False  # Whether the next token is the first in its group
+    unicode_skip = 1
+    fallback = 0  # Bytes still to skip after a \u character
+    stack = []  # type: List[Tuple[str, bool, int]]
+
+    def flush():
+        if pending:
+            pieces.append(pending.decode(charset, 'replace'))
+            del pending[:]
+
+    for match in _RTF_TOKEN_RE.finditer(data):
+        word, argument, escaped, symbol, brace, text = match.groups()
+        is_first, first = first, False
+
+        if brace is not None:
+            flush()
+            if brace == b'{':
+                stack.append((charset, skip, unicode_skip))
+                first = True
+            elif stack:
+                charset, skip, unicode_skip = stack.pop()
+            fallback = 0
+
+        elif word is not None:
+            if is_first and word in _DESTINATIONS:
+                skip = True
+            if word == b'f' and argument is not None:
+                font = int(argument)
+                if not skip and font in fonts:
+                    flush()
+                    charset = fonts[font]
+            elif word == b'fcharset' and argument is not None and font is not None:
+                # Font table entries, which are in a skipped group
+                fonts[font] = _font_charset(int(argument))
+            elif skip:
+                continue
+            elif word in _SEPARATORS:
+                flush()
+                pieces.append(_SEPARATORS[word])
+            elif word in _CHARACTERS:
+                flush()
+                pieces.append(_CHARACTERS[word])
+            elif word == b'u' and argument is not None:
+                flush()
+                pieces.append(chr(int(argument) % 0x10000))
+                fallback = unicode_skip
+            elif word == b'uc' and argument is not None:
+                unicode_skip = int(argument)
+            elif word == b'ansicpg' and argument is not None:
+                flush()
+                charset = CODEPAGES_BY_NUMBER.get(int(argument), charset)
+            elif word in _ANSI_CHARSETS:
+                flush()
+                charset = _ANSI_CHARSETS[word]
+
+        elif skip:
+            continue
+
+        elif text is not None:
+            if fallback:
+                skipped = min(fallback, len(text))
+                text, fallback = text[skipped:], fallback - skipped
+            pending += text
+
+        elif escaped is not None:
+            if fallback:
+                fallback -= 1
+            else:
+                pending.append(int(escaped, 16))
+
+        elif symbol is not None:
+            if symbol == b'*':
+                if is_first:
+                    skip = True
+            elif symbol in b'\\{}':
+                pending += symbol
+            elif symbol in b'~\r\n':
+                flush()
+                pieces.append(' ' if symbol == b'~' else '\n')
+
+    flush()
+    return ''.join(pieces)
+
+
+def count_words(text: str) -> int:
+    """
+    Count the words in text: runs of characters between whitespace or dashes with a letter or digit.
+    """
+    # Only distinct runs need checking for letters or digits, and there are far fewer of those
+    runs = Counter(text.replace('\u2014', ' ').replace('\u2013', ' ').split())
+    return sum(count for run, count in runs.items() if _WORD_CHARACTER_RE.search(run))
+
+
+def count_rtf_words(path: str) -> int:
+    """
+    Count the words in an RTF file.
+
+    :param path: Path of the file.
+    :return: Number of words.
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    with instrument.stage('rtf_scan', len(data), 1):
+        return count_words(rtf_text(data))
+
+
+class WordCounter(object):
+    """
+    Word counts of scrivenings, cached by file mtime.
+    """
+    def __init__(self, path: str = None):
+        """
+        :param path: Path to save the cache to. If the file exists, the cache starts with its contents.
+        """
+        self.path = path
+        self.hits = self.misses = 0
+        # Each file's mtime and word count, keyed by path
+        self._counts = {}  # type: Dict[str, Tuple[int, int]]
+        if path is not None:
+            self._load(path)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def count_scrivening(self, scrivening: Scrivening, recursive: bool = False) -> int:
+        """
+        Count the words in a scrivening.
+
+        :param scrivening: The scrivening.
+        :param recursive: If True, include the scrivening's children.
+        :return: Number of words. Scrivenings without a file, like most folders, have none.
+        """
+        if recursive:
+            return sum(self.count_scrivening(part) for part in flatten_scrivenings([scrivening], True))
+
+        mtime = scrivening_mtime(scrivening)
+        cached = self._counts.get(scrivening.file_path)
+        if cached is not None and cached[0] == mtime:
+            self.hits += 1
+            instrument.cache_hit('word_count')
+            return cached[1]
+
+        self.misses += 1
+        instrument.cache_miss('word_count')
+        try:
+            count = count_rtf_words(scrivening.file_path)
+        except FileNotFoundError:
+            count = 0
+        self._counts[scrivening.file_path] = (mtime, count)
+        return count
+
+    def count_project(self, project: ScrivenerProject) -> Dict[object, int]:
+        """
+        Count the words in each of a project's scrivenings.
+
+        :param project: The project.
+        :return: Dictionary of each scrivening's word count, not including its children, keyed by ID.
+        """
+        return {scrivening.id: self.count_scrivening(scrivening)
+                for scrivening in flatten_scrivenings(project.scrivenings, True)}
+
+    def _load(self, path: str):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                saved = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return
+        if saved.get('version') != _FORMAT_VERSION:
+            return
+        self._counts.update((file_path, (mtime, count)) for file_path, mtime, count in saved['files'])
+
+    def save(self, path: str = None):
+        """
+        Save the cache.
+
+        :param path: Path of the file to save to. Defaults to the path the counter was created with.
+        """
+        if path is None:
+            path = self.path
+        if path is None:
+            raise ValueError("No path to save the word count cache to")
+
+        saved = {'version': _FORMAT_VERSION,
+                 'files': [[file_path, mtime, count] for file_path, (mtime, count) in self._counts.items()]}
+        # Write to a temporary file first so that an interrupted save doesn't destroy the old cache
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as fh:
+            json.dump(saved, fh)
+        os.replace(temporary_path, path)
+
+
+def project_word_counts(project: ScrivenerProject, cache: Union[str, WordCounter] = None) -> Dict[object, int]:
+    """
+    Count the words in each of a project's scrivenings.
+
+    :param project: The project.
+    :param cache: Word counter to reuse, or the path of a saved cache, which is updated.
+    :return: Dictionary of each scrivening's word count, not including its children, keyed by ID.
+    """
+    counter = cache if isinstance(cache, WordCounter) else WordCounter(cache)
+    counts = counter.count_project(project)
+    if counter.path is not None and counter.misses:
+        counter.save()
+    return counts
@@ -0,0 +1,45 @@
+"""
+Fixtures shared by the tests: small synthetic projects written with benchmarks.synthetic.
+"""
+import os
+import shutil
+
+import pytest
+
+from benchmarks.synthetic import make_project
+from scripturient.scrivener import ScrivenerProject
+
+
+def write_rtf(path: str, paragraphs):
+    """
+    Replace an RTF file with plain paragraphs, making sure its mtime changes.
+    """
+    mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    body = "\\par\n".join(paragraphs)
+    with open(path, 'w', encoding='ascii') as fh:
+        fh.write("{\\rtf1\\ansi\\ansicpg1252\n{\\fonttbl\\f0\\froman\\fcharset0 Times;}\n\\f0\\fs24 " + body + "}")
+    # Some filesystems only keep whole seconds
+    os.utime(path, ns=(mtime + 2 * 10 ** 9, mtime + 2 * 10 ** 9))
+
+
+@pytest.fixture(scope='session')
+def project_dir(tmp_path_factory) -> str:
+    """
+    A project that tests only read.
+    """
+    return make_project(str(tmp_path_factory.mktemp('project')), chapters=3, scenes=3, words_per_scene=300)
+
+
+@pytest.fixture
+def project(project_dir) -> ScrivenerProject:
+    return ScrivenerProject(project_dir)
+
+
+@pytest.fixture
+def copied_project_dir(project_dir, tmp_path) -> str:
+    """
+    A copy of the project that a test can change.
+    """
+    copy = str(tmp_path / 'copy')
+    shutil.copytree(project_dir, copy)
+    return copy
@@ -0,0 +1,54 @@
+import glob
+import json
+import os
+
+import pytest
+
+from scripturient.cli import main
+from scripturient.scrivener import iter_tokens
+
+
+def test_tokens_match_the_project(project_dir, project, tmp_path, capsys):
+    output = str(tmp_path / 'tokens.jsonl')
+    assert main(['tokens', project_dir, '--output', output, '--jobs', '2']) == 0
+    with open(output, encoding='utf-8') as fh:
+        rows = [json.loads(line) for line in fh]
+    assert rows == [dict(tagged._asdict(), scrivening_id=str(tagged.scrivening_id))
+                    for tagged in iter_tokens(project.scrivenings)]
+    report = json.loads(capsys.readouterr().err)
+    assert report['rows'] == len(rows) and 'encode' not in report['stages']
+
+
+def test_ngrams_with_cache_dir_and_memory_limit(project_dir, tmp_path):
+    output = str(tmp_path / 'ngrams.csv')
+    arguments = ['ngrams', project_dir, '-o', output, '--max-n', '2', '-k', '3', '--timings', os.devnull]
+    assert main(arguments) == 0
+    with open(output, encoding='utf-8') as fh:
+        exact = fh.read()
+    assert main(arguments + ['--cache-dir', str(tmp_path / 'cache'), '--memory-limit', '64M']) == 0
+    with open(output, encoding='utf-8') as fh:
+        assert fh.read() == exact
+
+
+def test_cache_dir_is_only_for_ngrams(project_dir):
+    with pytest.raises(SystemExit):
+        main(['echoes', project_dir, '--cache-dir', 'cache'])
+
+
+def test_unparseable_binder_exits_with_an_error(copied_project_dir, capsys):
+    path = glob.glob(os.path.join(copied_project_dir, '*.scrivx'))[0]
+    with open(path, 'r+b') as fh:
+        fh.truncate(os.path.getsize(path) // 2)
+    assert main(['stats', copied_project_dir]) == 1
+    assert capsys.readouterr().err.startswith('error: XMLSyntaxError')
+
+
+def test_depth_is_not_negative(project_dir, capsys):
+    with pytest.raises(SystemExit):
+        main(['stats', project_dir, '--depth', '-1'])
+    assert 'at least 0' in capsys.readouterr().err
+
+
+def test_repeats_over_the_memory_limit_exit_with_an_error(project_dir, capsys):
+    assert main(['repeats', project_dir, '--memory-limit', '1K', '--timings', os.devnull]) == 1
+    assert 'memory limit' in capsys.readouterr().err
@@ -0,0 +1,61 @@
+from nltk.collocations import BigramAssocMeasures, BigramCollocationFinder, TrigramAssocMeasures, \
+    TrigramCollocationFinder
+import pytest
+
+from scripturient.collocations import MEASURES, score_bigrams, score_by_binder_node, score_trigrams
+from scripturient.scrivener import get_binder_level
+from scripturient.vocabulary import encode_project, encode_scrivening
+
+
+def _scores(collocations, measure):
+    return dict(collocations.top(measure, k=len(collocations)))
+
+
+def _assert_close(scores, expected):
+    assert set(scores) == set(expected)
+    for ngram, score in expected.items():
+        assert scores[ngram] == pytest.approx(score, rel=1e-6, abs=1e-6)
+
+
+@pytest.fixture
+def scene_stream(project):
+    # One scrivening, since nltk's finders don't know where scrivenings end
+    return encode_scrivening(project.scrivenings[0].children[0].children[0], recursive=False).folded()
+
+
+@pytest.mark.parametrize('window', [2, 4])
+def test_bigrams_match_nltk(scene_stream, window):
+    finder = BigramCollocationFinder.from_words(scene_stream.tokens(), window_size=window)
+    collocations = score_bigrams(scene_stream, window=window)
+    for measure in MEASURES:
+        expected = dict(finder.score_ngrams(getattr(BigramAssocMeasures, measure)))
+        _assert_close(_scores(collocations, measure), expected)
+
+
+def test_trigrams_match_nltk(scene_stream):
+    finder = TrigramCollocationFinder.from_words(scene_stream.tokens())
+    collocations = score_trigrams(scene_stream)
+    for measure in ('pmi', 'likelihood_ratio', 'student_t'):
+        expected = dict(finder.score_ngrams(getattr(TrigramAssocMeasures, measure)))
+        _assert_close(_scores(collocations, measure), expected)
+
+
+def test_filters(scene_stream):
+    collocations = score_bigrams(scene_stream, min_count=2, words_only=True, exclude=['the'])
+    for (first, second), _ in collocations.top(k=len(collocations)):
+        assert 'the' not in (first, second) and first.isalnum() and second.isalnum()
+    assert all(collocations.counts >= 2)
+
+    with pytest.raises(ValueError):
+        collocations.top('dice')
+    with pytest.raises(ValueError):
+        score_bigrams(scene_stream, window=1)
+
+
+def test_score_by_binder_node(project):
+    stream = encode_project(project).folded()
+    chapters = get_binder_level(project.scrivenings[:1], 1)
+    scored = score_by_binder_node(stream, chapters, n=3, min_count=2)
+    assert [node for node, _ in scored] == chapters
+    for chapter, collocations in scored:
+        assert collocations.top(k=5) == score_trigrams(stream.subtree(chapter), min_count=2).top(k=5)
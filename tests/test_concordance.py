@@ -0,0 +1,57 @@
+import pytest
+
+from scripturient.concordance import Concordance, concordance, format_lines
+from scripturient.scrivener import flatten_scrivenings
+from scripturient.vocabulary import encode_project
+
+
+def _brute_force(stream, phrase):
+    """
+    Every position where a phrase starts within one paragraph, from a scan of the case-folded tokens.
+    """
+    tokens = stream.folded().tokens()
+    scrivenings = stream.scrivening_index().tolist()
+    paragraphs = stream.paragraphs.tolist()
+    found = []
+    for start in range(len(tokens) - len(phrase) + 1):
+        end = start + len(phrase) - 1
+        if tokens[start:end + 1] == phrase and (scrivenings[start], paragraphs[start]) == \
+                (scrivenings[end], paragraphs[end]):
+            found.append(start)
+    return found
+
+
+def test_find_matches_brute_force(project):
+    index = Concordance(project)
+    stream = index.stream
+    tokens = stream.folded().tokens()
+    for phrase in [tokens[start:start + n] for n in (1, 2, 4) for start in range(0, len(tokens) - n, 151)]:
+        assert index.find(phrase).tolist() == _brute_force(stream, phrase)
+    assert len(index.find(['no-such-token'])) == 0
+
+
+def test_lines_show_the_text(project):
+    stream = encode_project(project)
+    index = Concordance(project, stream)
+    phrase = 'took a deep breath'
+    lines = list(index.lines(phrase, width=3))
+    assert lines == list(concordance(project, phrase, width=3))
+    assert len(lines) == len(index.find(phrase)) > 0
+
+    scrivenings = {scrivening.id: scrivening for scrivening in flatten_scrivenings(project.scrivenings)}
+    for line in lines:
+        assert line.keyword.casefold() == phrase
+        location = line.location
+        text = scrivenings[location.scrivening_id].text()[location.paragraph]
+        assert text[location.start:location.end] == line.keyword
+        before, after = text[:location.start].rstrip(), text[location.end:].lstrip()
+        assert before.endswith(line.left) and after.startswith(line.right)
+        assert len(line.left.split()) <= 3 and len(line.right.split()) <= 3
+
+    for formatted, line in zip(format_lines(lines, chars=20), lines):
+        assert formatted[21:].startswith(line.keyword)
+
+    assert list(index.lines(phrase, width=0))[0].left == ''
+    with pytest.raises(ValueError):
+        index.lines_at([0], 1, width=-1)
+    assert list(Concordance(project, fold_case=False).lines(phrase.upper())) == []
@@ -0,0 +1,167 @@
+import glob
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from scripturient.daemon import AnalysisDaemon, DaemonClient, DaemonError, DaemonServer, parse_address
+from scripturient.index import PhraseIndex
+from scripturient.scrivener import ScrivenerProject
+from .conftest import write_rtf
+
+
+@pytest.fixture
+def daemon():
+    daemon = AnalysisDaemon(refresh_interval=None)
+    yield daemon
+    daemon.close()
+
+
+@pytest.fixture
+def address(tmp_path, daemon):
+    server = DaemonServer(str(tmp_path / 'daemon.sock'), daemon)
+    server.start()
+    yield server.address
+    server.shutdown()
+
+
+def _truncate_binder(project_dir: str) -> bytes:
+    path = glob.glob(os.path.join(project_dir, '*.scrivx'))[0]
+    with open(path, 'rb') as fh:
+        binder = fh.read()
+    with open(path, 'wb') as fh:
+        fh.write(binder[:len(binder) // 2])
+    return binder
+
+
+def test_parse_address():
+    assert parse_address(':8765') == ('127.0.0.1', 8765)
+    assert parse_address('localhost:8765') == ('localhost', 8765)
+    assert parse_address('/tmp/scripturient.sock') == '/tmp/scripturient.sock'
+
+
+def test_handle_errors(daemon):
+    assert daemon.handle({'command': 'ping'}) == {'ok': True, 'result': 'pong'}
+    assert not daemon.handle({'command': 'nonsense'})['ok']
+    assert not daemon.handle({'phrase': 'no command'})['ok']
+    assert not daemon.handle(['not', 'an', 'object'])['ok']
+    response = daemon.handle({'command': 'count', 'project': '/no/such/project', 'phrase': 'x'})
+    assert not response['ok'] and response['error']
+    response = daemon.handle({'command': 'ping', 'unexpected': 1})
+    assert not response['ok'] and response['error'].startswith("Bad arguments")
+    response = daemon.handle({'command': 'count'})
+    assert not response['ok'] and response['error'].startswith("Bad arguments")
+
+
+def test_type_errors_inside_commands_are_not_bad_arguments(daemon, project):
+    response = daemon.handle({'command': 'count', 'project': project.project_dir, 'phrase': 5})
+    assert not response['ok'] and response['error'].startswith("TypeError")
+
+
+def test_oversized_requests_close_the_connection(address, monkeypatch):
+    monkeypatch.setattr('scripturient.daemon._MAX_REQUEST_SIZE', 64)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(10)
+        connection.connect(address)
+        # The tail of the line is valid JSON, and mustn't be taken for a request of its own
+        connection.sendall(b'{"command": "ping", "padding": "' + b'x' * 100 + b'"}{"command": "ping"}\n')
+        with connection.makefile('rb') as fh:
+            response = json.loads(fh.readline().decode('utf-8'))
+            assert not response['ok'] and '64 bytes' in response['error']
+            assert fh.readline() == b''
+
+
+def test_queries_over_a_socket(address, project):
+    index = PhraseIndex()
+    index.update(project)
+    with DaemonClient(address, timeout=60) as client:
+        assert client.request('ping') == 'pong'
+        loaded = client.request('load', project=project.project_dir)
+        assert loaded['tokens'] == len(index)
+        assert client.count(project.project_dir, 'took a deep breath') == len(index.find('took a deep breath'))
+        occurrences = client.occurrences(project.project_dir, 'took a deep breath', limit=2)
+        assert len(occurrences) == 2 and set(occurrences[0]) == {'scrivening_id', 'paragraph', 'start', 'end'}
+        assert len(client.echoes(project.project_dir, limit=3)) == 3
+        assert client.stats(project.project_dir)['words'] > 0
+        with pytest.raises(DaemonError):
+            client.stats(project.project_dir, scrivening='no such scrivening')
+        # The connection survives errors
+        assert client.request('ping') == 'pong'
+
+
+def test_malformed_requests_get_errors(address):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(60)
+        connection.connect(address)
+        stream = connection.makefile('rwb')
+        stream.write(b'{"command": \n{"command": "ping"}\n')
+        stream.flush()
+        assert json.loads(stream.readline())['ok'] is False
+        assert json.loads(stream.readline()) == {'ok': True, 'result': 'pong'}
+
+
+def test_refresh_picks_up_changes(daemon, copied_project_dir):
+    project = ScrivenerProject(copied_project_dir)
+    assert daemon.handle({'command': 'count', 'project': copied_project_dir, 'phrase': 'zebra'})['result'] == 0
+    write_rtf(project.scrivenings[0].children[0].children[0].file_path, ["A zebra.", "Another zebra."])
+    assert daemon.refresh() == 1
+    assert daemon.handle({'command': 'count', 'project': copied_project_dir, 'phrase': 'zebra'})['result'] == 2
+
+
+def test_unparseable_binder_is_an_error_not_a_crash(daemon, copied_project_dir):
+    assert daemon.handle({'command': 'load', 'project': copied_project_dir})['ok']
+    binder = _truncate_binder(copied_project_dir)
+    path = glob.glob(os.path.join(copied_project_dir, '*.scrivx'))[0]
+    os.utime(path, ns=(time.time_ns() + 10 ** 9,) * 2)
+
+    assert daemon.refresh() == 0
+    response = daemon.handle({'command': 'refresh', 'project': copied_project_dir})
+    assert not response['ok'] and 'XMLSyntaxError' in response['error']
+    # The last good version of the project is still served
+    assert daemon.handle({'command': 'count', 'project': copied_project_dir, 'phrase': 'the'})['ok']
+
+    with open(path, 'wb') as fh:
+        fh.write(binder)
+    assert daemon.handle({'command': 'refresh', 'project': copied_project_dir})['ok']
+
+
+def test_refresher_survives_an_unparseable_binder(copied_project_dir):
+    daemon = AnalysisDaemon(refresh_interval=0.01)
+    try:
+        daemon.project(copied_project_dir)
+        _truncate_binder(copied_project_dir)
+        time.sleep(0.2)
+        assert daemon._refresher.is_alive()
+    finally:
+        daemon.close()
+
+
+def test_loading_a_broken_project_is_an_error(daemon, copied_project_dir):
+    _truncate_binder(copied_project_dir)
+    response = daemon.handle({'command': 'load', 'project': copied_project_dir})
+    assert not response['ok'] and 'XMLSyntaxError' in response['error']
+
+
+def test_server_only_replaces_sockets(tmp_path, daemon):
+    path = str(tmp_path / 'not-a-socket')
+    with open(path, 'w') as fh:
+        fh.write('keep me')
+    with pytest.raises(FileExistsError):
+        DaemonServer(path, daemon)
+    with open(path) as fh:
+        assert fh.read() == 'keep me'
+
+    # A socket left behind by a server that didn't shut down is replaced
+    path = str(tmp_path / 'stale.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = DaemonServer(path, daemon)
+    server.start()
+    try:
+        with DaemonClient(path, timeout=60) as client:
+            assert client.request('ping') == 'pong'
+    finally:
+        server.shutdown()
@@ -0,0 +1,71 @@
+from collections import defaultdict
+from itertools import combinations
+import re
+
+import pytest
+
+from scripturient.duplicates import ParagraphShingles, find_near_duplicates, lsh_parameters
+from scripturient.scrivener import ScrivenerProject
+from scripturient.vocabulary import encode_project
+
+from .conftest import write_rtf
+
+
+def _naive_similarities(stream, shingle_size=3, min_words=10):
+    """
+    Jaccard similarity of every pair of paragraphs, from sets of word tuples.
+    """
+    words = defaultdict(list)
+    tokens = stream.folded().tokens()
+    for position, scrivening in enumerate(stream.scrivening_index().tolist()):
+        if re.search(r'\w', tokens[position]):
+            words[stream.scrivening_ids[scrivening], int(stream.paragraphs[position])].append(tokens[position])
+    shingles = {paragraph: {tuple(found[start:start + shingle_size]) for start in range(len(found) - shingle_size + 1)}
+                for paragraph, found in words.items() if len(found) >= min_words}
+    return {(a, b): len(shingles[a] & shingles[b]) / len(shingles[a] | shingles[b])
+            for a, b in combinations(shingles, 2)}
+
+
+@pytest.fixture
+def duplicated_project(copied_project_dir):
+    project = ScrivenerProject(copied_project_dir)
+    draft = project.scrivenings[0]
+    original = draft.children[0].children[0]
+    copy = draft.children[2].children[1]
+    paragraphs = original.text()
+    # A reworked copy: one word changed in the first paragraph, the second left as it was
+    first = paragraphs[0].split(' ')
+    first[len(first) // 2] = 'zebra'
+    write_rtf(copy.file_path, [' '.join(first), paragraphs[1]])
+    return ScrivenerProject(copied_project_dir), original, copy
+
+
+def test_finds_reworked_copies(duplicated_project):
+    project, original, copy = duplicated_project
+    stream = encode_project(project)
+    duplicates = find_near_duplicates(stream, threshold=0.6)
+    found = {(duplicate.first, duplicate.second): duplicate.similarity for duplicate in duplicates}
+
+    assert ((original.id, 1), (copy.id, 1)) in found
+    assert found[(original.id, 0), (copy.id, 0)] < 1
+    assert [duplicate.similarity for duplicate in duplicates] == sorted(found.values(), reverse=True)
+
+    # Every reported similarity is exact, and no pair well above the threshold is missed
+    naive = _naive_similarities(stream)
+    for pair, similarity in found.items():
+        assert similarity == pytest.approx(naive[pair])
+        assert similarity >= 0.6
+    assert {pair for pair, similarity in naive.items() if similarity >= 0.8} <= set(found)
+
+    assert all(first[0] != second[0] for first, second, _ in find_near_duplicates(stream, 0.6, same_scrivening=False))
+    assert find_near_duplicates(project, threshold=0.6) == duplicates
+
+
+def test_shingles_and_parameters(project):
+    shingles = ParagraphShingles.from_stream(encode_project(project).folded(), min_words=10 ** 6)
+    assert len(shingles) == 0 and find_near_duplicates(encode_project(project), min_words=10 ** 6) == []
+
+    bands, rows = lsh_parameters(0.8, 128)
+    assert bands * rows == 128 and (1 / bands) ** (1 / rows) <= 0.8
+    with pytest.raises(ValueError):
+        lsh_parameters(0, 128)
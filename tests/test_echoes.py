@@ -0,0 +1,57 @@
+import pytest
+
+from scripturient.echoes import DEFAULT_STOPWORDS, iter_echoes
+from scripturient.ngrams import excluded_ids
+from scripturient.vocabulary import encode_project
+
+
+def _brute_force(stream, window, cross_scrivenings):
+    """
+    Echoes of single words, comparing each word with the last appearance of the same word.
+    """
+    not_words = excluded_ids(stream.vocabulary, words_only=True)
+    scrivening_index = stream.scrivening_index()
+    last_seen = {}
+    echoes = []
+    word = -1
+    for position, token_id in enumerate(stream.ids.tolist()):
+        if not_words[token_id]:
+            continue
+        word += 1
+        token = stream.vocabulary.token(token_id)
+        if token.casefold() in DEFAULT_STOPWORDS:
+            continue
+        if token_id in last_seen:
+            previous, previous_word = last_seen[token_id]
+            same_scrivening = scrivening_index[previous] == scrivening_index[position]
+            if word - previous_word <= window and (cross_scrivenings or same_scrivening):
+                echoes.append(((token,), word - previous_word, int(stream.starts[previous]),
+                               int(stream.starts[position])))
+        last_seen[token_id] = position, word
+    return echoes
+
+
+@pytest.mark.parametrize('window, cross_scrivenings', [(10, False), (50, False), (50, True)])
+def test_single_words_match_brute_force(project, window, cross_scrivenings):
+    stream = encode_project(project).folded()
+    echoes = [(echo.phrase, echo.distance, echo.first.start, echo.second.start)
+              for echo in iter_echoes(stream, window, cross_scrivenings=cross_scrivenings)]
+    assert echoes
+    assert echoes == _brute_force(stream, window, cross_scrivenings)
+
+
+def test_phrases_come_longest_first(project):
+    stream = encode_project(project).folded()
+    echoes = list(iter_echoes(stream, 200, min_length=2, max_length=4))
+    assert echoes
+    for echo in echoes:
+        assert 2 <= len(echo.phrase) <= 4
+        assert echo.distance >= len(echo.phrase)
+    keys = [(echo.second.scrivening_id, echo.second.paragraph, echo.second.start, -len(echo.phrase))
+            for echo in echoes]
+    assert keys == sorted(keys, key=lambda key: (stream.scrivening_ids.index(key[0]),) + key[1:])
+
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        list(iter_echoes(None, window=0))
@@ -0,0 +1,72 @@
+import os
+
+from scripturient.index import PhraseIndex, index_path, open_index
+from scripturient.scrivener import ScrivenerProject, flatten_scrivenings
+from scripturient.vocabulary import encode_scrivening
+
+from .conftest import write_rtf
+
+
+def _brute_force(streams, phrase):
+    """
+    Every occurrence of a phrase, found by scanning each scrivening's case-folded tokens.
+    """
+    found = []
+    for scrivening_id, stream in streams.items():
+        tokens = stream.tokens()
+        found.extend((scrivening_id, start) for start in range(len(tokens) - len(phrase) + 1)
+                     if tokens[start:start + len(phrase)] == phrase)
+    return found
+
+
+def test_find_matches_brute_force(project):
+    index = PhraseIndex()
+    index.update(project)
+    streams = {scrivening.id: encode_scrivening(scrivening, recursive=False).folded()
+               for scrivening in flatten_scrivenings(project.scrivenings)}
+    tokens = encode_scrivening(project.scrivenings[0]).folded().tokens()
+
+    # Phrases of several lengths taken from the text, plus ones that aren't in it
+    phrases = [tokens[start:start + n] for n in (1, 2, 3, 5) for start in range(0, len(tokens) - n, 97)]
+    phrases += [['no-such-token'], [tokens[0], 'no-such-token']]
+    for phrase in phrases:
+        found = index.find(phrase)
+        assert found == _brute_force(streams, phrase)
+
+        locations = index.find_locations(phrase)
+        assert len(locations) == len(found)
+        for (scrivening_id, start), location in zip(found, locations):
+            stream = streams[scrivening_id]
+            end = start + len(phrase) - 1
+            assert location == (scrivening_id, stream.paragraphs[start], stream.starts[start], stream.ends[end])
+
+    assert index.find([]) == []
+    assert index.find(' '.join(phrases[0]).upper()) == index.find(phrases[0])
+
+
+def test_update_reindexes_changed_scrivenings(copied_project_dir):
+    project = ScrivenerProject(copied_project_dir)
+    index = PhraseIndex()
+    assert index.update(project) == len(flatten_scrivenings(project.scrivenings))
+    assert index.update(project) == 0
+
+    scene = project.scrivenings[0].children[0].children[0]
+    write_rtf(scene.file_path, ['A zebra crossed the road.'])
+    project = ScrivenerProject(copied_project_dir)
+    assert index.update(project) == 1
+    assert index.find('zebra crossed') == [(scene.id, 1)]
+
+
+def test_open_index_saves_to_the_cache(project, tmp_path):
+    path = index_path(str(tmp_path), project.project_dir)
+    assert path == index_path(str(tmp_path), project.project_dir + os.sep)
+    files = set(os.listdir(project.project_dir))
+
+    index = open_index(project, path)
+    assert os.path.exists(path) and set(os.listdir(project.project_dir)) == files
+    mtime = os.stat(path).st_mtime_ns
+
+    reopened = open_index(project, path)
+    assert os.stat(path).st_mtime_ns == mtime
+    assert reopened.find('the') == index.find('the')
+    assert not open_index(project, path, fold_case=False).fold_case
@@ -0,0 +1,107 @@
+import json
+import os
+import re
+
+from scripturient import instrument
+from scripturient.scrivener import ScrivenerProject
+
+
+def test_no_hooks_means_a_shared_null_stage():
+    assert not instrument.enabled()
+    assert instrument.stage('a') is instrument.stage('b')
+
+
+def test_recorder_adds_up_stages_and_cache_lookups():
+    with instrument.Recorder() as recorder:
+        assert instrument.enabled()
+        for _ in range(3):
+            with instrument.stage('outer', bytes_read=10, documents=1):
+                with instrument.stage('inner'):
+                    pass
+        instrument.cache_hit('cache')
+        instrument.cache_hit('cache')
+        instrument.cache_miss('cache')
+    assert not instrument.enabled()
+
+    report = recorder.report()
+    assert list(report.stages) == ['inner', 'outer', 'cache']
+    outer = report.stages['outer']
+    assert (outer.calls, outer.bytes_read, outer.documents) == (3, 30, 3)
+    assert outer.wall_seconds >= report.stages['inner'].wall_seconds >= 0
+    cache = report.stages['cache']
+    assert (cache.calls, cache.cache_hits, cache.cache_misses) == (0, 2, 1)
+    assert cache.cache_hit_rate == 2 / 3
+    assert outer.cache_hit_rate is None
+
+    # The report is a snapshot
+    instrument.record('outer')
+    assert report.stages['outer'].calls == 3
+
+
+def test_stage_is_recorded_when_it_raises():
+    with instrument.Recorder() as recorder:
+        try:
+            with instrument.stage('failing'):
+                raise RuntimeError
+        except RuntimeError:
+            pass
+    assert recorder.report().stages['failing'].calls == 1
+
+
+def test_project_reading_reports_parsing_and_text_cache(project_dir):
+    scene = ScrivenerProject(project_dir).scrivenings[0].children[0].children[0]
+    with instrument.Recorder() as recorder:
+        scene.text()
+        scene.text()
+    stages = recorder.report().stages
+    rtf_path = scene.file_path
+    assert stages['rtf_parse'].calls == 1
+    assert stages['rtf_parse'].bytes_read == os.path.getsize(rtf_path)
+    assert stages['plaintext'].documents == 1
+    assert (stages['text_cache'].cache_hits, stages['text_cache'].cache_misses) == (1, 1)
+
+
+def test_json_round_trips_the_totals():
+    with instrument.Recorder() as recorder:
+        instrument.record('stage', wall_seconds=1.5, cpu_seconds=0.5, bytes_read=7, documents=2)
+    metrics = json.loads(recorder.report().to_json())
+    assert metrics['stages']['stage'] == {
+        'calls': 1, 'wall_seconds': 1.5, 'cpu_seconds': 0.5, 'bytes_read': 7, 'documents': 2,
+        'cache_hits': 0, 'cache_misses': 0, 'cache_hit_rate': None,
+    }
+    assert metrics['peak_memory_bytes'] >= 0
+
+
+# A sample line: a metric name, optional labels, and a number
+_SAMPLE = re.compile(r'^([a-z_]+)(\{(?:[a-z_]+="(?:[^"\\]|\\.)*",?)*\})? (-?[0-9.e+-]+)$')
+
+
+def test_prometheus_output_is_well_formed(tmp_path):
+    with instrument.Recorder() as recorder:
+        instrument.record('parse', wall_seconds=2.0, documents=3)
+        instrument.cache_miss('parse')
+    report = recorder.report()
+    text = report.to_prometheus({'project': 'say "hi"\\\n'})
+
+    assert text.endswith('\n')
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            assert re.match(r'^# (HELP [a-z_]+ .+|TYPE [a-z_]+ (counter|gauge))$', line)
+            continue
+        match = _SAMPLE.match(line)
+        assert match, line
+        samples[match.group(1) + (match.group(2) or '')] = float(match.group(3))
+
+    labels = '{project="say \\"hi\\"\\\\\\n",stage="parse"}'
+    assert samples['scripturient_stage_calls_total' + labels] == 1
+    assert samples['scripturient_stage_wall_seconds_total' + labels] == 2.0
+    assert samples['scripturient_stage_documents_total' + labels] == 3
+    assert samples['scripturient_cache_misses_total' + labels] == 1
+    assert 'scripturient_peak_memory_bytes{project="say \\"hi\\"\\\\\\n"}' in samples
+
+    path = str(tmp_path / 'metrics.prom')
+    report.write_prometheus(path)
+    with open(path, encoding='utf-8') as fh:
+        assert fh.read() == report.to_prometheus()
+    assert os.listdir(str(tmp_path)) == ['metrics.prom']
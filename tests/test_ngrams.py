@@ -0,0 +1,57 @@
+from collections import Counter
+import re
+
+import pytest
+
+from scripturient.ngrams import count_ngrams, top_ngrams
+from scripturient.scrivener import TaggedToken
+from scripturient.vocabulary import encode_project, encode_tokens
+
+
+def _naive_counts(scrivenings, n, excluded=frozenset()):
+    counts = Counter()
+    for tokens in scrivenings:
+        for start in range(len(tokens) - n + 1):
+            ngram = tuple(tokens[start:start + n])
+            if not excluded.intersection(ngram):
+                counts[ngram] += 1
+    return counts
+
+
+def _scrivening_tokens(stream):
+    tokens = stream.tokens()
+    return [tokens[start:end] for start, end in zip(stream.offsets[:-1], stream.offsets[1:])]
+
+
+def test_counts_match_counter(project):
+    stream = encode_project(project)
+    scrivenings = _scrivening_tokens(stream)
+    for n, counts in count_ngrams(stream, max_n=4).items():
+        assert dict(counts.top()) == _naive_counts(scrivenings, n)
+
+        # Most frequent first, ties broken by first appearance
+        top = counts.top()
+        assert [count for _, count in top] == sorted((count for _, count in top), reverse=True)
+
+
+def test_options_match_counter(project):
+    stream = encode_project(project)
+    scrivenings = _scrivening_tokens(stream)
+
+    punctuation = frozenset(token for token in stream.vocabulary if not re.search(r'\w', token))
+    for n, counts in count_ngrams(stream, max_n=3, min_n=2, words_only=True, exclude=['the']).items():
+        assert dict(counts.top()) == _naive_counts(scrivenings, n, punctuation | {'the'})
+
+    crossing = count_ngrams(stream, max_n=3, min_n=3, cross_scrivenings=True, min_count=2)[3]
+    expected = _naive_counts([stream.tokens()], 3)
+    assert dict(crossing.top()) == {ngram: count for ngram, count in expected.items() if count >= 2}
+
+
+def test_ties_and_edges():
+    tagged = [TaggedToken(token, 0, 0, offset, offset + 1, 0) for offset, token in enumerate('b a b a c'.split())]
+    stream = encode_tokens(tagged)
+    assert top_ngrams(stream, max_n=2, k=2) == {1: [(('b',), 2), (('a',), 2)], 2: [(('b', 'a'), 2), (('a', 'b'), 1)]}
+    assert len(count_ngrams(stream, max_n=9, min_n=9)[9]) == 0
+    assert count_ngrams(encode_tokens([]), max_n=2)[2].top() == []
+    with pytest.raises(ValueError):
+        count_ngrams(stream, max_n=1, min_n=2)
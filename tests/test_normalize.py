@@ -0,0 +1,24 @@
+import pytest
+
+from scripturient.normalize import Normalizer
+
+
+def test_saved_cache_is_keyed_by_step_names(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    normalizer = Normalizer(['casefold', ('strip-s', lambda token: token.rstrip('s'))], path=path)
+    assert normalizer.normalize_tokens(['Cats', 'cats', 'Dogs']) == ['cat', 'cat', 'dog']
+    normalizer.save()
+
+    assert len(Normalizer(['casefold', ('strip-s', lambda token: token)], path=path)) == 3
+    assert len(Normalizer(['casefold', ('upper', str.upper)], path=path)) == 0
+
+
+def test_unnamed_steps_are_not_saved(tmp_path):
+    normalizer = Normalizer([lambda token: token.upper()])
+    assert normalizer('a') == 'A'
+    with pytest.raises(ValueError):
+        normalizer.save(str(tmp_path / 'cache.json'))
+    with pytest.raises(ValueError):
+        Normalizer([lambda token: token], path=str(tmp_path / 'cache.json'))
+    with pytest.raises(ValueError):
+        Normalizer([('porter', str.upper)])
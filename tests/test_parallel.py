@@ -0,0 +1,32 @@
+from scripturient.parallel import iter_project_tokens_parallel, iter_scrivening_tokens_parallel, \
+    tokenize_scrivening_parallel
+from scripturient.scrivener import iter_tokens, iter_scrivening_tokens, tokenize_scrivening
+
+
+def test_parallel_matches_serial(project):
+    draft = project.scrivenings[0]
+    serial = list(iter_scrivening_tokens(draft))
+    assert list(iter_scrivening_tokens_parallel(draft, jobs=2, batch_size=7)) == serial
+    assert tokenize_scrivening_parallel(draft, jobs=2) == tokenize_scrivening(draft)
+
+
+def test_parallel_matches_serial_with_loaded_text(project):
+    # Scrivenings whose text is loaded are split into batches of paragraphs rather than whole files
+    draft = project.scrivenings[0]
+    for chapter in draft.children:
+        chapter.children[0].text()
+    assert list(iter_scrivening_tokens_parallel(draft, jobs=2, batch_size=3)) == list(iter_scrivening_tokens(draft))
+
+
+def test_project_uses_one_stream(project):
+    serial = list(iter_tokens(project.scrivenings))
+    assert list(iter_project_tokens_parallel(project, jobs=2)) == serial
+    assert list(iter_project_tokens_parallel(project, jobs=1)) == serial
+
+
+def test_closing_early_cancels_pending_shards(project):
+    serial = list(iter_tokens(project.scrivenings))
+    tokens = iter_project_tokens_parallel(project, jobs=2)
+    first = [next(tokens) for _ in range(5)]
+    tokens.close()
+    assert first == serial[:5]
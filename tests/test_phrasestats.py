@@ -0,0 +1,40 @@
+from collections import Counter
+import os
+
+from scripturient.phrasestats import PhraseStatistics
+from scripturient.scrivener import ScrivenerProject, flatten_scrivenings, iter_scrivening_tokens
+from .conftest import write_rtf
+
+
+def _recount(project: ScrivenerProject, n: int) -> Counter:
+    counts = Counter()
+    for scrivening in flatten_scrivenings(project.scrivenings):
+        tokens = [tagged.token.casefold() for tagged in iter_scrivening_tokens(scrivening, recursive=False)]
+        counts.update(tuple(tokens[start:start + n]) for start in range(len(tokens) - n + 1))
+    return counts
+
+
+def test_incremental_counts_match_recount(copied_project_dir):
+    stats = PhraseStatistics(max_n=3)
+    project = ScrivenerProject(copied_project_dir)
+    assert stats.update(project) == len(flatten_scrivenings(project.scrivenings))
+    assert stats.update(project) == 0
+
+    scenes = flatten_scrivenings(project.scrivenings[0].children[0].children)
+    write_rtf(scenes[0].file_path, ["Took a deep breath.", "She took a deep breath again, and again."])
+    os.remove(scenes[1].file_path)
+
+    project = ScrivenerProject(copied_project_dir)
+    assert stats.update(project) == 2
+    for n in range(1, 4):
+        assert stats.counts(n) == dict(_recount(project, n))
+    assert stats.count(['took', 'a', 'deep']) == _recount(project, 3)[('took', 'a', 'deep')]
+    assert stats.verify(project)
+
+
+def test_top_is_most_frequent_first(project):
+    stats = PhraseStatistics(max_n=2)
+    stats.update(project)
+    top = stats.top(2, k=5)
+    assert len(top) == 5
+    assert [count for _, count in top] == sorted(_recount(project, 2).values(), reverse=True)[:5]
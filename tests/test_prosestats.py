@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from scripturient.prosestats import ProseStats, binder_stats, project_stats, scrivening_stats, subtree_stats
+from scripturient.scrivener import ScrivenerProject, flatten_scrivenings, get_binder_level
+
+from .conftest import write_rtf
+
+
+@pytest.fixture
+def known_scene(copied_project_dir):
+    project = ScrivenerProject(copied_project_dir)
+    scene = project.scrivenings[0].children[0].children[0]
+    write_rtf(scene.file_path, ['He said, "Come here." She did not.', '* * *', 'The end.'])
+    return ScrivenerProject(copied_project_dir).scrivenings[0].children[0].children[0]
+
+
+def test_counts_by_hand(known_scene):
+    stats = scrivening_stats(known_scene, 'regex')
+    assert stats.sentence_lengths.tolist() == [4, 3, 2]
+    assert stats.sentence_dialogue.tolist() == [2, 0, 0]
+    assert stats.paragraph_lengths.tolist() == [7, 2]
+    assert stats.syllables == 9
+    assert (stats.words, stats.sentences, stats.paragraphs) == (9, 3, 2)
+    assert stats.dialogue_ratio == pytest.approx(2 / 9)
+    assert stats.flesch_reading_ease == pytest.approx(206.835 - 1.015 * 3 - 84.6)
+    assert stats.flesch_kincaid_grade == pytest.approx(0.39 * 3 + 11.8 - 15.59)
+    assert stats.sentence_length_histogram(3).tolist() == [0, 0, 1, 2]
+    assert stats.pacing_curve(2).tolist() == [3.5, 2.5]
+    assert stats.pacing_curve(2, 'dialogue').tolist() == [2 / 7, 0]
+    assert len(stats.pacing_curve(4)) == 0
+    with pytest.raises(ValueError):
+        stats.pacing_curve(2, 'syllables')
+
+
+def test_cache_follows_the_file(known_scene):
+    stats = scrivening_stats(known_scene, 'regex')
+    assert scrivening_stats(known_scene, 'regex') is stats
+    assert scrivening_stats(known_scene, 'nltk') is not stats
+
+    write_rtf(known_scene.file_path, ['Short.'])
+    known_scene.invalidate()
+    assert scrivening_stats(known_scene, 'regex').words == 1
+
+
+def test_combined_stats(project):
+    parts = [scrivening_stats(scrivening) for scrivening in flatten_scrivenings(project.scrivenings)]
+    whole = project_stats(project)
+    assert whole.words == sum(part.words for part in parts) > 0
+    assert whole.sentence_lengths.tolist() == np.concatenate([part.sentence_lengths for part in parts]).tolist()
+    assert whole.summary()['words'] == whole.words
+
+    chapters = get_binder_level(project.scrivenings[:1], 1)
+    assert [stats.words for stats in binder_stats(chapters)] == [subtree_stats(chapter).words for chapter in chapters]
+    assert sum(stats.words for stats in binder_stats(chapters)) <= whole.words
+    assert ProseStats.combine([]).words == 0
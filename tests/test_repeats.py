@@ -0,0 +1,56 @@
+from collections import defaultdict
+import random
+
+import pytest
+
+from scripturient.repeats import SuffixArray, find_repeated_phrases, iter_repeated_phrases
+from scripturient.scrivener import TaggedToken
+from scripturient.vocabulary import encode_tokens
+
+
+def _stream(scrivenings):
+    return encode_tokens(TaggedToken(token, scrivening_id, 0, offset, offset + 1, 0)
+                         for scrivening_id, tokens in enumerate(scrivenings)
+                         for offset, token in enumerate(tokens))
+
+
+def _brute_force(scrivenings, min_length, min_count):
+    """
+    Every maximal repeated phrase, found by listing every occurrence of every phrase.
+    """
+    occurrences = defaultdict(list)
+    for scrivening_id, tokens in enumerate(scrivenings):
+        for start in range(len(tokens)):
+            for end in range(start + min_length, len(tokens) + 1):
+                occurrences[tuple(tokens[start:end])].append((scrivening_id, start))
+
+    found = set()
+    for phrase, places in occurrences.items():
+        if len(places) < min_count:
+            continue
+        # A scrivening's start and end are unlike anything else, so each counts as a different neighbour
+        before = {scrivenings[s][o - 1] if o else ('start', s, o) for s, o in places}
+        after = {scrivenings[s][o + len(phrase)] if o + len(phrase) < len(scrivenings[s]) else ('end', s, o)
+                 for s, o in places}
+        if len(before) > 1 and len(after) > 1:
+            found.add((phrase, tuple(sorted(places))))
+    return found
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('min_length, min_count', [(1, 2), (2, 2), (3, 3)])
+def test_suffix_array_matches_brute_force(seed, min_length, min_count):
+    rng = random.Random(seed)
+    scrivenings = [[rng.choice('abcd') for _ in range(rng.randint(0, 60))] for _ in range(4)]
+    suffix_array = SuffixArray(_stream(scrivenings))
+    found = {(phrase.tokens, tuple(phrase.occurrences))
+             for phrase in iter_repeated_phrases(suffix_array, min_length, min_count)}
+    assert found == _brute_force(scrivenings, min_length, min_count)
+
+
+def test_find_repeated_phrases_in_project(project):
+    phrases = find_repeated_phrases(project, min_length=4)
+    assert phrases
+    assert all(len(phrase.tokens) >= 4 and phrase.count == len(phrase.occurrences) >= 2 for phrase in phrases)
+    lengths = [len(phrase.tokens) for phrase in phrases]
+    assert lengths == sorted(lengths, reverse=True)
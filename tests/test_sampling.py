@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from scripturient.ngrams import count_ngrams
+from scripturient.prosestats import project_stats
+from scripturient.sampling import ScriveningSample, estimate_phrase_frequencies, estimate_prose_stats
+
+
+def test_full_sample_is_exact(project):
+    sample = ScriveningSample.from_project(project, fraction=1, seed=0)
+    assert sample.fraction == 1
+    estimates = estimate_prose_stats(sample)
+    stats = project_stats(project)
+    for name in ('words', 'sentences', 'paragraphs', 'syllables'):
+        assert estimates[name].value == pytest.approx(getattr(stats, name))
+        assert estimates[name].stderr == 0
+    assert estimates['mean_sentence_length'].value == pytest.approx(stats.mean_sentence_length)
+    assert estimates['dialogue_ratio'].value == pytest.approx(stats.dialogue_ratio)
+
+    stream, _ = sample.encode()
+    expected = count_ngrams(stream.folded(), max_n=2)
+    for n, phrases in estimate_phrase_frequencies(sample, max_n=2, k=5).items():
+        assert [(phrase, round(estimate.value)) for phrase, estimate in phrases] == expected[n].top(5)
+
+
+def test_allocation(project):
+    sample = ScriveningSample.from_project(project, fraction=0.3, depth=2, min_per_stratum=1, seed=3)
+    assert sample.scrivenings == [sample.population[index] for index in sample.sampled.tolist()]
+    assert sorted(sample.sampled.tolist()) == sample.sampled.tolist()
+    for stratum in np.unique(sample.strata).tolist():
+        assert np.count_nonzero(sample.strata[sample.sampled] == stratum) >= 1
+    assert 0 < sample.fraction < 1
+
+    again = ScriveningSample.from_project(project, fraction=0.3, depth=2, min_per_stratum=1, seed=3)
+    assert again.sampled.tolist() == sample.sampled.tolist()
+    with pytest.raises(ValueError):
+        ScriveningSample.from_project(project, fraction=0)
+
+
+def test_intervals_cover_the_truth(project):
+    words = project_stats(project).words
+    covered = 0
+    for seed in range(20):
+        sample = ScriveningSample.from_project(project, fraction=0.5, depth=1, seed=seed)
+        estimate = estimate_prose_stats(sample)['words']
+        assert estimate.low <= estimate.value <= estimate.high
+        covered += estimate.low <= words <= estimate.high
+    assert covered >= 14
@@ -0,0 +1,32 @@
+from scripturient.scrivener import flatten_scrivenings, get_binder_level, iter_scrivening_tokens, \
+    tokenize_scrivening
+
+
+def test_streaming_matches_tokenize_scrivening(project):
+    nodes = project.scrivenings + get_binder_level(project.scrivenings, 1) + get_binder_level(project.scrivenings, 2)
+    for scrivening in nodes:
+        streamed = [tagged.token for tagged in iter_scrivening_tokens(scrivening)]
+        assert streamed == tokenize_scrivening(scrivening)
+
+
+def test_streaming_tags_locations(project):
+    draft = project.scrivenings[0]
+    tokens = list(iter_scrivening_tokens(draft))
+    # Folders have no text of their own
+    texts = {scrivening.id: scrivening.text() for scrivening in flatten_scrivenings([draft])
+             if scrivening.id in {tagged.scrivening_id for tagged in tokens}}
+    assert tokens
+    sentences = [tagged.sentence for tagged in tokens]
+    assert sentences == sorted(sentences)
+    for tagged in tokens:
+        paragraph = texts[tagged.scrivening_id][tagged.paragraph]
+        assert 0 <= tagged.start < tagged.end <= len(paragraph)
+        if tagged.token.isalnum():
+            assert paragraph[tagged.start:tagged.end] == tagged.token
+
+
+def test_flatten_scrivenings_is_compile_order(project):
+    flat = flatten_scrivenings(project.scrivenings)
+    assert [scrivening.id for scrivening in flat[:2]] == [project.scrivenings[0].id,
+                                                           project.scrivenings[0].children[0].id]
+    assert flatten_scrivenings(project.scrivenings, recursive=False) == project.scrivenings
@@ -0,0 +1,102 @@
+import csv
+import gzip
+import json
+import os
+
+import numpy as np
+import pytest
+
+from scripturient.echoes import Echo
+from scripturient.sinks import CsvSink, JsonLinesSink, NpyColumnSink, as_dict, open_sink, write_results
+from scripturient.vocabulary import Location
+
+ECHOES = [Echo(('door',), 3, Location('101', 0, 4, 8), Location('101', 0, 20, 24)),
+          Echo(('deep', 'breath'), 12, Location('101', 1, 0, 9), Location('102', 0, 5, 16))]
+
+
+def test_as_dict_converts_nested_namedtuples():
+    assert as_dict(ECHOES[0]) == {'phrase': ['door'], 'distance': 3,
+                                  'first': {'scrivening_id': '101', 'paragraph': 0, 'start': 4, 'end': 8},
+                                  'second': {'scrivening_id': '101', 'paragraph': 0, 'start': 20, 'end': 24}}
+    with pytest.raises(ValueError):
+        as_dict(['not', 'a', 'record'])
+
+
+@pytest.mark.parametrize('name', ['echoes.jsonl', 'echoes.jsonl.gz'])
+def test_json_lines_append(tmp_path, name):
+    path = str(tmp_path / name)
+    assert write_results(ECHOES[:1], path) == 1
+    with JsonLinesSink(path, append=True, buffer_size=1) as sink:
+        sink.write_many(ECHOES[1:])
+        assert sink.rows == 1
+    opener = gzip.open if name.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as fh:
+        assert [json.loads(line) for line in fh] == [as_dict(echo) for echo in ECHOES]
+
+
+@pytest.mark.parametrize('name', ['echoes.csv', 'echoes.csv.gz'])
+def test_csv_append_writes_one_header(tmp_path, name):
+    path = str(tmp_path / name)
+    write_results(ECHOES[:1], path)
+    write_results(ECHOES[1:], path, append=True)
+    opener = gzip.open if name.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as fh:
+        rows = list(csv.DictReader(fh))
+    assert [row['phrase'] for row in rows] == ['door', 'deep breath']
+    assert [row['second_scrivening_id'] for row in rows] == ['101', '102']
+
+
+def test_csv_append_keeps_existing_columns(tmp_path):
+    path = str(tmp_path / 'rows.csv')
+    write_results([{'a': 1, 'b': 2}], path)
+    with CsvSink(path, append=True) as sink:
+        sink.write({'b': 4, 'c': 5})
+    with open(path, newline='') as fh:
+        assert list(csv.reader(fh)) == [['a', 'b'], ['1', '2'], ['', '4']]
+
+
+def test_open_sink_chooses_format(tmp_path):
+    with open_sink(str(tmp_path / 'a.csv.gz')) as sink:
+        assert isinstance(sink, CsvSink)
+    with open_sink(str(tmp_path / 'a.json')) as sink:
+        assert isinstance(sink, JsonLinesSink)
+    with pytest.raises(ValueError):
+        sink.write({'a': 1})
+
+
+def test_npy_columns_append(tmp_path):
+    directory = str(tmp_path / 'keys')
+    with NpyColumnSink(directory, {'key': 'int64', 'weight': 'float32'}) as sink:
+        sink.write_columns(key=np.arange(5), weight=np.ones(5))
+        sink.write({'key': 5, 'weight': 0.5})
+    with NpyColumnSink(directory, {'key': 'int64', 'weight': 'float32'}, append=True) as sink:
+        sink.write_columns(key=np.arange(6, 9), weight=np.zeros(3))
+    assert np.load(os.path.join(directory, 'key.npy')).tolist() == list(range(9))
+    assert np.load(os.path.join(directory, 'weight.npy')).dtype == np.float32
+
+    with pytest.raises(ValueError):
+        NpyColumnSink(directory, {'key': 'int32'}, append=True)
+    with pytest.raises(ValueError):
+        with NpyColumnSink(str(tmp_path / 'other'), {'key': 'int64'}) as sink:
+            sink.write_columns(key=np.arange(3), weight=np.arange(3))
+
+
+def test_npy_columns_recover_from_an_interrupted_run(tmp_path):
+    directory = str(tmp_path / 'keys')
+    path = os.path.join(directory, 'key.npy')
+    with NpyColumnSink(directory, {'key': 'int64'}) as sink:
+        sink.write_columns(key=np.arange(3))
+    with open(path, 'rb') as fh:
+        header = fh.read(128)
+    with NpyColumnSink(directory, {'key': 'int64'}, append=True) as sink:
+        sink.write_columns(key=np.arange(3, 7))
+
+    # As if the second run was killed before rewriting the header, partway through writing a row
+    with open(path, 'r+b') as fh:
+        fh.write(header)
+        fh.seek(0, os.SEEK_END)
+        fh.write(b'\x01\x02\x03')
+
+    with NpyColumnSink(directory, {'key': 'int64'}, append=True) as sink:
+        sink.write_columns(key=np.array([7]))
+    assert np.load(path).tolist() == list(range(8))
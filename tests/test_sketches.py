@@ -0,0 +1,113 @@
+from collections import Counter
+import re
+
+import numpy as np
+import pytest
+
+from scripturient.scrivener import flatten_scrivenings
+from scripturient.sketches import CountMinSketch, HeavyHitters, HyperLogLog, VocabularySketches
+from scripturient.vocabulary import encode_project, encode_scrivening
+
+
+def _phrase_counts(streams, n):
+    counts = Counter()
+    for stream in streams:
+        tokens = stream.tokens()
+        for start, end in zip(stream.offsets[:-1].tolist(), stream.offsets[1:].tolist()):
+            counts.update(tuple(tokens[position:position + n]) for position in range(start, end - n + 1))
+    return counts
+
+
+def _check_top(hitters, streams, k):
+    for n, top in hitters.top(k).items():
+        exact = _phrase_counts(streams, n)
+        for hitter in top:
+            assert exact[hitter.phrase] <= hitter.count <= exact[hitter.phrase] + hitter.error
+        # Every phrase clearly more frequent than the last one reported is reported
+        reported = {hitter.phrase for hitter in top}
+        cutoff = top[-1].count + top[-1].error
+        assert all(phrase in reported for phrase, count in exact.items() if count > cutoff)
+
+
+def test_count_min_sketch_never_underestimates():
+    keys = np.random.default_rng(1).integers(0, 500, size=5000).astype(np.uint64)
+    sketch = CountMinSketch(epsilon=0.01, delta=0.01)
+    sketch.add(keys)
+    exact = np.bincount(keys.astype(np.int64), minlength=500)
+    estimates = sketch.estimate(np.arange(500, dtype=np.uint64))
+    assert np.all(estimates >= exact)
+    assert np.mean(estimates <= exact + sketch.error) >= 0.99
+
+
+def test_heavy_hitters_match_exact_counts(project):
+    stream = encode_project(project)
+    hitters = HeavyHitters(k=5, min_n=2, max_n=4)
+    hitters.update(stream)
+    _check_top(hitters, [stream], 5)
+
+
+def test_update_project_counts_each_scrivening(project):
+    hitters = HeavyHitters(k=5, min_n=2, max_n=3)
+    hitters.update_project(project)
+    streams = [encode_scrivening(scrivening, recursive=False)
+               for scrivening in flatten_scrivenings(project.scrivenings)]
+    _check_top(hitters, streams, 5)
+
+
+def test_merge(project):
+    draft = project.scrivenings[0]
+    halves = [encode_scrivening(chapter) for chapter in draft.children]
+    whole = HeavyHitters(k=5, min_n=2, max_n=3)
+    merged = HeavyHitters(k=5, min_n=2, max_n=3)
+    for stream in halves:
+        whole.update(stream)
+        part = HeavyHitters(k=5, min_n=2, max_n=3)
+        part.update(stream)
+        merged.merge(part)
+    assert merged.top() == whole.top()
+
+    with pytest.raises(ValueError, match='capacity'):
+        merged.merge(HeavyHitters(k=5, min_n=2, max_n=3, capacity=10))
+
+
+def test_hyperloglog_estimate():
+    keys = np.random.default_rng(2).integers(0, 2 ** 63, size=20000, dtype=np.int64).astype(np.uint64)
+    sketch = HyperLogLog(precision=12)
+    sketch.add(keys[:10000])
+    sketch.add(keys[:10000])
+    assert abs(sketch.estimate() - 10000) <= 4 * sketch.error * 10000
+
+    other = HyperLogLog(precision=12)
+    other.add(keys[5000:])
+    sketch.merge(other)
+    assert abs(sketch.estimate() - 20000) <= 4 * sketch.error * 20000
+
+    small = HyperLogLog(precision=12)
+    small.add(keys[:50])
+    assert round(small.estimate()) == 50
+    assert HyperLogLog().estimate() == 0
+
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.estimate() == sketch.estimate()
+    with pytest.raises(ValueError):
+        sketch.merge(HyperLogLog(precision=12, seed=1))
+
+
+def test_vocabulary_sketches(project, tmp_path):
+    sketches = VocabularySketches(precision=14)
+    assert sketches.update(project) == len(flatten_scrivenings(project.scrivenings))
+    assert sketches.update(project) == 0
+
+    draft = project.scrivenings[0]
+    stream = encode_scrivening(draft).folded()
+    words = [token for token in stream.tokens() if re.search(r'\w', token)]
+    assert sketches.tokens(draft) == len(words)
+    assert abs(sketches.distinct(draft) - len(set(words))) <= 0.05 * len(set(words))
+    assert 0 < sketches.type_token_ratio(draft) <= 1
+
+    path = str(tmp_path / 'sketches.npz')
+    sketches.save(path)
+    loaded = VocabularySketches.load(path)
+    assert loaded.distinct(draft) == sketches.distinct(draft)
+    with pytest.raises(KeyError):
+        VocabularySketches().distinct(draft)
@@ -0,0 +1,84 @@
+from collections import Counter
+import os
+
+import pytest
+
+from scripturient.ngrams import excluded_ids
+from scripturient.scrivener import ScrivenerProject, flatten_scrivenings, iter_scrivening_tokens
+from scripturient.store import AnalysisStore, open_store
+from scripturient.vocabulary import encode_tokens
+from .conftest import write_rtf
+
+
+def _count(scrivenings, n):
+    """
+    Count the phrases of each scrivening on its own, as the store does.
+    """
+    counts = Counter()
+    tokens = 0
+    for scrivening in scrivenings:
+        stream = encode_tokens(iter_scrivening_tokens(scrivening, recursive=False))
+        tokens += len(stream)
+        folded = stream.folded()
+        excluded = excluded_ids(folded.vocabulary, words_only=True)
+        words = folded.vocabulary.decode(folded.ids)
+        valid = [not excluded[token_id] for token_id in folded.ids.tolist()]
+        counts.update(' '.join(words[start:start + n]) for start in range(len(words) - n + 1)
+                      if all(valid[start:start + n]))
+    return counts, tokens
+
+
+def _top(counts, k):
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+@pytest.fixture
+def store(tmp_path, project):
+    with AnalysisStore(str(tmp_path / 'store.sqlite')) as store:
+        store.update(project, max_n=2)
+        yield store
+
+
+def test_subtree_queries_match_counts(store, project):
+    for chapter in project.scrivenings[0].children:
+        subtree = flatten_scrivenings([chapter])
+        for n in (1, 2):
+            counts, tokens = _count(subtree, n)
+            assert store.top_phrases(project.project_dir, n, chapter.id, k=10) == _top(counts, 10)
+        assert store.stats(project.project_dir, chapter.id)['tokens'] == tokens
+        phrase, count = _top(counts, 1)[0]
+        assert store.phrase_count(project.project_dir, phrase, chapter.id) == count
+
+
+def test_project_and_single_scrivening_queries(store, project):
+    everything = flatten_scrivenings(project.scrivenings)
+    counts, tokens = _count(everything, 1)
+    assert store.top_phrases(project.project_dir, 1, k=5) == _top(counts, 5)
+    assert store.stats(project.project_dir)['tokens'] == tokens
+
+    chapter = project.scrivenings[0].children[0]
+    scene = chapter.children[0]
+    assert store.stats(project.project_dir, chapter.id, recursive=False)['tokens'] == \
+        _count([chapter], 1)[1]
+    assert store.top_phrases(project.project_dir, 1, scene.id, recursive=False, k=3) == \
+        _top(_count([scene], 1)[0], 3)
+    with pytest.raises(KeyError):
+        store.stats(project.project_dir, 'no such scrivening')
+
+
+def test_update_only_reanalyzes_changed_scrivenings(copied_project_dir, tmp_path):
+    project = ScrivenerProject(copied_project_dir)
+    path = str(tmp_path / 'store.sqlite')
+    open_store(project, path).close()
+    with AnalysisStore(path) as store:
+        assert store.update(project) == 0
+        scene = project.scrivenings[0].children[0].children[0]
+        write_rtf(scene.file_path, ["A quiet room."])
+        assert store.update(ScrivenerProject(copied_project_dir)) == 1
+        assert store.phrase_count(copied_project_dir, 'quiet room', scene.id) == 1
+        assert store.stats(copied_project_dir, scene.id)['words'] == 3
+
+
+def test_settings_change_replaces_results(store, project):
+    store.update(project, max_n=1, fold_case=False)
+    assert store.top_phrases(os.path.abspath(project.project_dir), 2) == []
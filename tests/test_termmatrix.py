@@ -0,0 +1,74 @@
+from collections import Counter
+import math
+
+import numpy as np
+import pytest
+
+from scripturient.scrivener import get_binder_level
+from scripturient.termmatrix import build_term_matrix, project_term_matrix
+from scripturient.vocabulary import encode_project
+
+
+def _dense(matrix):
+    return [{matrix.terms[column]: value for column, value in zip(*map(np.ndarray.tolist, matrix.row(row)))}
+            for row in range(len(matrix.nodes))]
+
+
+def _counts(stream, node, n):
+    counts = Counter()
+    sub = stream.subtree(node)
+    tokens = sub.tokens()
+    for start, end in zip(sub.offsets[:-1].tolist(), sub.offsets[1:].tolist()):
+        terms = tokens[start:end] if n == 1 else \
+            [tuple(tokens[position:position + n]) for position in range(start, end - n + 1)]
+        counts.update(terms)
+    return counts
+
+
+@pytest.mark.parametrize('n', [1, 2])
+def test_counts_match_counter(project, n):
+    stream = encode_project(project).folded()
+    chapters = get_binder_level(project.scrivenings[:1], 1)
+    matrix = build_term_matrix(stream, chapters, n)
+    assert matrix.shape[0] == len(chapters)
+    assert _dense(matrix) == [_counts(stream, chapter, n) for chapter in chapters]
+
+    dense = matrix.to_dense()
+    assert matrix.row_totals().tolist() == dense.sum(axis=1).tolist()
+    assert matrix.column_totals().tolist() == dense.sum(axis=0).tolist()
+    assert matrix.document_frequencies().tolist() == (dense > 0).sum(axis=0).tolist()
+
+
+def test_weightings(project):
+    matrix = project_term_matrix(project, depth=1, words_only=True, exclude=['the'])
+    assert 'the' not in {term for row in _dense(matrix) for term in row}
+    dense = matrix.to_dense().astype(np.float64)
+
+    assert np.allclose(matrix.relative_frequencies().to_dense().sum(axis=1)[dense.sum(axis=1) > 0], 1)
+
+    idf = np.log((1 + len(dense)) / (1 + (dense > 0).sum(axis=0))) + 1
+    weighted = dense * idf
+    norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+    assert np.allclose(matrix.tfidf().to_dense(), np.divide(weighted, norms, out=np.zeros_like(weighted),
+                                                            where=norms > 0))
+    assert np.allclose(matrix.tfidf(normalize=False).to_dense(), weighted)
+
+
+def test_keyness(project):
+    matrix = project_term_matrix(project, depth=2)
+    dense = matrix.to_dense().astype(np.float64)
+    scores = matrix.keyness()
+    row, column = 0, int(matrix.row(0)[0][0])
+
+    # Dunning's log-likelihood of the first entry, worked out by hand
+    a, b = dense[row, column], dense[:, column].sum() - dense[row, column]
+    c, d = dense[row].sum(), dense.sum() - dense[row].sum()
+    expected_a, expected_b = c * (a + b) / (c + d), d * (a + b) / (c + d)
+    g2 = 2 * (a * math.log(a / expected_a) + (b * math.log(b / expected_b) if b else 0))
+    assert abs(scores.data[0]) == pytest.approx(g2)
+    assert (scores.data[0] > 0) == (a / c >= b / d)
+
+    top = matrix.over_represented(k=3, min_count=2)
+    assert len(top) == len(matrix.nodes) and all(len(terms) <= 3 for terms in top)
+    for terms in top:
+        assert [score for _, score in terms] == sorted((score for _, score in terms), reverse=True)
@@ -0,0 +1,67 @@
+import os
+
+import nltk
+import pytest
+
+from scripturient.scrivener import flatten_scrivenings
+from scripturient.tokenizers import NltkTokenizer, RegexTokenizer, get_tokenizer
+
+TEXT = 'He said "hello." Mr. Smith didn\'t answer... She left -- quickly. Was it 3:30? Yes!'
+
+
+def test_nltk_matches_word_tokenize():
+    tokenizer = NltkTokenizer()
+    assert tokenizer.tokenize(TEXT) == nltk.word_tokenize(TEXT)
+
+    for start, end in tokenizer.sentence_spans(TEXT):
+        sentence = TEXT[start:end]
+        spans = tokenizer.word_spans(sentence)
+        assert [token for token, _, _ in spans] == nltk.word_tokenize(sentence)
+        for token, token_start, token_end in spans:
+            if token not in ('``', "''"):
+                assert sentence[token_start:token_end] == token
+
+
+def test_nltk_missing_model():
+    with pytest.raises(LookupError, match='punkt'):
+        NltkTokenizer('no-such-language').load()
+
+
+def test_regex_sentences():
+    tokenizer = RegexTokenizer()
+    text = 'Mr. Smith met Dr. J. R. Jones in the U.S. on Monday. "Why?" he asked! It cost 3.50 dollars.'
+    assert [text[start:end] for start, end in tokenizer.sentence_spans(text)] == [
+        'Mr. Smith met Dr. J. R. Jones in the U.S. on Monday.', '"Why?"', 'he asked!', 'It cost 3.50 dollars.']
+    assert tokenizer.sentence_spans('  \n ') == []
+
+
+def test_regex_matches_treebank_on_prose(project):
+    # Sentences are split differently, so compare the word tokenization of the same sentences
+    regex, treebank = get_tokenizer('regex'), NltkTokenizer()
+    for scrivening in flatten_scrivenings(project.scrivenings):
+        if not os.path.exists(scrivening.file_path):
+            # Folders have no text
+            continue
+        for paragraph in scrivening.text():
+            for start, end in regex.sentence_spans(paragraph):
+                sentence = paragraph[start:end]
+                spans = regex.word_spans(sentence)
+                assert spans == treebank.word_spans(sentence)
+                for token, token_start, token_end in spans:
+                    if token not in ('``', "''"):
+                        assert sentence[token_start:token_end] == token
+
+
+def test_regex_treebank_rules():
+    tokenizer = RegexTokenizer()
+    assert tokenizer.tokenize('"I can\'t," she said -- "won\'t you?"') == \
+        ['``', 'I', 'ca', "n't", ',', "''", 'she', 'said', '--', '``', 'wo', "n't", 'you', '?', "''"]
+    assert tokenizer.tokenize("The dogs' bowls... cost $5, at 10:30.") == \
+        ['The', 'dogs', "'", 'bowls', '...', 'cost', '$', '5', ',', 'at', '10:30', '.']
+
+
+def test_get_tokenizer():
+    assert get_tokenizer('regex') is get_tokenizer('regex')
+    assert get_tokenizer(None).name == 'nltk'
+    with pytest.raises(ValueError, match='Unknown tokenizer'):
+        get_tokenizer('whitespace')
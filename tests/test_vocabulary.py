@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from scripturient.scrivener import flatten_scrivenings, iter_tokens
+from scripturient.vocabulary import Vocabulary, encode_project, encode_scrivening
+
+
+def test_vocabulary_round_trip():
+    vocabulary = Vocabulary(['the', 'cat'])
+    ids = vocabulary.encode(['the', 'dog', 'the', 'cat'])
+    assert ids.tolist() == [0, 2, 0, 1]
+    assert vocabulary.decode(ids) == ['the', 'dog', 'the', 'cat']
+    assert vocabulary.token(2) == 'dog' and vocabulary.id('cat') == 1
+    assert list(vocabulary) == ['the', 'cat', 'dog']
+
+    with pytest.raises(KeyError):
+        vocabulary.encode(['bird'], add=False)
+    assert 'bird' not in vocabulary
+
+    mapped, mapping = Vocabulary(['The', 'the', 'Cat']).map(str.lower)
+    assert list(mapped) == ['the', 'cat'] and mapping.tolist() == [0, 0, 1]
+
+
+def test_project_stream_matches_tokens(project):
+    tagged = list(iter_tokens(project.scrivenings))
+    stream = encode_project(project)
+
+    assert stream.tokens() == [token.token for token in tagged]
+    assert stream.paragraphs.tolist() == [token.paragraph for token in tagged]
+    assert stream.starts.tolist() == [token.start for token in tagged]
+    assert stream.ends.tolist() == [token.end for token in tagged]
+    assert [stream.scrivening_ids[index] for index in stream.scrivening_index()] == \
+        [token.scrivening_id for token in tagged]
+    assert np.diff(stream.sentence_offsets).sum() == len(stream)
+    assert len(stream.sentence_offsets) - 1 == len({token.sentence for token in tagged})
+
+    position = len(stream) // 2
+    location = stream.locate(position)
+    assert (location.scrivening_id, location.paragraph, location.start, location.end) == \
+        (tagged[position].scrivening_id, tagged[position].paragraph, tagged[position].start, tagged[position].end)
+
+
+def test_subtree_matches_encoding_the_scrivening(project):
+    stream = encode_project(project)
+    chapter = project.scrivenings[0].children[1]
+    subtree = stream.subtree(chapter)
+    assert subtree.tokens() == encode_scrivening(chapter).tokens()
+    assert subtree.tokens() == stream.tokens(*stream.subtree_range(chapter))
+
+    scene = chapter.children[0]
+    start, end = stream.scrivening_range(scene.id)
+    assert stream.tokens(start, end) == encode_scrivening(scene, recursive=False).tokens()
+    assert stream.scrivening_range('missing') == (0, 0)
+
+
+def test_folded_view(project):
+    stream = encode_project(project)
+    folded = stream.folded()
+    assert folded.tokens() == [token.casefold() for token in stream.tokens()]
+    assert len(folded.vocabulary) <= len(stream.vocabulary)
+    assert folded.offsets is stream.offsets
+    assert {scrivening.id for scrivening in flatten_scrivenings(project.scrivenings)} >= set(stream.scrivening_ids)
@@ -0,0 +1,59 @@
+import os
+import re
+
+from scripturient.ngrams import top_ngrams
+from scripturient.scrivener import flatten_scrivenings
+from scripturient.vocabulary import encode_project
+from scripturient.watchlist import WatchList
+
+
+def _naive_hits(project, phrases):
+    """
+    Every occurrence of each phrase, found by searching each paragraph's text for it as a whole-word,
+    case-insensitive substring. A word can end where a contraction's clitic starts, as in "did|n't".
+    """
+    hits = set()
+    for scrivening in flatten_scrivenings(project.scrivenings):
+        if not os.path.exists(scrivening.file_path):
+            continue
+        for index, paragraph in enumerate(scrivening.text()):
+            for phrase in phrases:
+                pattern = r"(?<![\w'])" + r'\s+'.join(map(re.escape, phrase.split())) + \
+                    r"(?=n't|'(?:s|d|m|ll|re|ve)\b|[^\w']|$)"
+                hits.update((phrase, scrivening.id, index, match.start(), match.end())
+                            for match in re.finditer(pattern, paragraph, re.IGNORECASE))
+    return hits
+
+
+def test_scan_matches_substring_search(project):
+    # Overlapping phrases of several lengths from the text, all of them words. Single letters are left out,
+    # since the tokenizer can take "a." at the end of a paragraph as an initial.
+    stream = encode_project(project).folded()
+    phrases = [' '.join(ngram) for n, top in top_ngrams(stream, max_n=3, k=15, words_only=True).items()
+               for ngram, _ in top if all(token.isalpha() and len(token) > 1 for token in ngram)]
+    phrases.append('NOT IN the manuscript')
+    watch_list = WatchList(phrases + [phrase.upper() for phrase in phrases])
+    assert watch_list.phrases == phrases and len(phrases) > 20
+
+    hits = watch_list.scan_project(project)
+    assert len(hits) == len({tuple(hit) for hit in hits})
+    assert {(hit.phrase,) + tuple(hit.location) for hit in hits} == _naive_hits(project, phrases)
+
+    # Hits are in the order they end
+    ends = [(stream.scrivening_ids.index(hit.location.scrivening_id), hit.location.paragraph, hit.location.end)
+            for hit in hits]
+    assert ends == sorted(ends)
+
+
+def test_case_and_scope(project, tmp_path):
+    path = tmp_path / 'watch.txt'
+    path.write_text('# clichés\n\nThe\n', encoding='utf-8')
+    chapter = project.scrivenings[0].children[0]
+
+    folded = WatchList.from_file(str(path))
+    exact = WatchList.from_file(str(path), fold_case=False)
+    assert len(folded) == 1
+    assert all(hit.location.scrivening_id in {scene.id for scene in chapter.children}
+               for hit in folded.scan_scrivening(chapter))
+    assert len(exact.scan_project(project)) < len(folded.scan_project(project))
+    assert WatchList([]).scan_project(project) == []
@@ -0,0 +1,63 @@
+import os
+import re
+
+import pytest
+
+from pyth.plugins.rtf15.reader import Rtf15Reader
+from scripturient.plaintextify import Plaintextifier
+from scripturient.scrivener import ScrivenerProject, flatten_scrivenings, iter_tokens
+from scripturient.wordcount import WordCounter, count_rtf_words, count_words, rtf_text
+
+from .conftest import write_rtf
+
+
+def _reader_words(path):
+    with open(path, 'rb') as fh:
+        return count_words('\n'.join(Plaintextifier.convert(Rtf15Reader.read(fh))))
+
+
+def _scrivenings_with_text(project):
+    return [scrivening for scrivening in flatten_scrivenings(project.scrivenings)
+            if os.path.exists(scrivening.file_path)]
+
+
+def test_matches_rtf15reader(project):
+    for scrivening in _scrivenings_with_text(project):
+        assert count_rtf_words(scrivening.file_path) == _reader_words(scrivening.file_path)
+
+
+def test_close_to_tokenized_count(project):
+    # Words as the tokenizer sees them, with clitics like n't and 's counted as part of the word before
+    tokenized = sum(1 for tagged in iter_tokens(project.scrivenings) if re.search(r'\w', tagged.token) and
+                    not tagged.token.startswith("'") and tagged.token.casefold() != "n't")
+    counted = sum(WordCounter().count_project(project).values())
+    assert counted == pytest.approx(tokenized, rel=0.01)
+
+
+def test_rtf_features(copied_project_dir):
+    project = ScrivenerProject(copied_project_dir)
+    path = _scrivenings_with_text(project)[1].file_path
+    # An escaped byte, a dash between words, skipped destinations, and a Unicode character
+    write_rtf(path, [r"Caf\'e9 au lait\emdash twice", r"{\*\comment hidden}{\fldinst HYPERLINK}one \u8220?two"])
+    with open(path, 'rb') as fh:
+        assert rtf_text(fh.read()).split() == ['Café', 'au', 'lait—twice', 'one', '“two']
+    assert count_rtf_words(path) == _reader_words(path) == 6
+    assert count_words('a -- b — c – d ...') == 4
+
+
+def test_cache(copied_project_dir, tmp_path):
+    project = ScrivenerProject(copied_project_dir)
+    cache = str(tmp_path / 'counts.json')
+    counter = WordCounter(cache)
+    counts = counter.count_project(project)
+    assert counter.misses == len(counts) and counter.hits == 0
+    counter.save()
+
+    scene = _scrivenings_with_text(project)[1]
+    write_rtf(scene.file_path, ['Three short words'])
+    reloaded = WordCounter(cache)
+    assert len(reloaded) == len(counts)
+    assert reloaded.count_project(project) == dict(counts, **{scene.id: 3})
+    assert reloaded.misses == 1
+    with pytest.raises(ValueError):
+        WordCounter().save()